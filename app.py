@@ -1,7 +1,15 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from database.sql_client import init_db
+from database.sql_client import init_db, init_engine
 from database.sql_client import db_session
+from rest_api.cache import init_cache
+from rest_api.coalesce import init_coalescing
+from rest_api.compression import init_compression
+from rest_api.delivery_slots import init_delivery_slots
+from rest_api.instrumentation import init_instrumentation
+from rest_api.json_backend import init_json
+from rest_api.reports import init_reports
+from rest_api.sharding import init_sharding
 
 db = SQLAlchemy()
 
@@ -9,7 +17,16 @@ db = SQLAlchemy()
 def create_app(app_config='app_config.py'):
     app = Flask(__name__)
     app.config.from_pyfile(app_config)
+    init_engine(app.config)
     init_db()
+    init_sharding(app)
+    init_cache(app)
+    init_coalescing(app)
+    init_delivery_slots(app)
+    init_json(app)
+    init_reports(app)
+    init_instrumentation(app)
+    init_compression(app)
     db.init_app(app)
 
     @app.teardown_appcontext
@@ -18,13 +35,55 @@ def create_app(app_config='app_config.py'):
 
     with app.app_context():
         from routes import views
-        from rest_api.grocery_items import SingleGroceryItemAPI
-        from rest_api.grocery_lists import SingleGroceryListAPI
-        from rest_api.customers import SingleCustomerAPI
+        from rest_api.grocery_items import BulkGroceryItemAPI, SearchGroceryItemAPI, SingleGroceryItemAPI
+        from rest_api.grocery_lists import BulkGroceryListAPI, SingleGroceryListAPI
+        from rest_api.customers import CustomerExportAPI, SingleCustomerAPI
+        from rest_api.aggregates import CustomerSpendAPI, RevenueByTypeAPI
+        from rest_api.multi_get import MultiGetAPI
+        from rest_api.delivery_slots import DeliverySlotAPI
+        from rest_api.reports import ReportAPI, ReportResultAPI
+        from rest_api.change_feed import ChangeFeedAPI
+        from database.loaders import CUSTOMER_GRAPH, GROCERY_ITEM_GRAPH, GROCERY_LIST_GRAPH
+        from database.models import Customer, GroceryItem, GroceryList
         app.register_blueprint(views.views_bp)
         grocery_item_api = SingleGroceryItemAPI.as_view('grocery_item')
         grocery_list_api = SingleGroceryListAPI.as_view('grocery_list')
         customer_api = SingleCustomerAPI.as_view('customer')
+        app.add_url_rule(
+            '/api/grocery_item/bulk',
+            view_func=BulkGroceryItemAPI.as_view('grocery_item_bulk'),
+            methods=['POST']
+        )
+        app.add_url_rule(
+            '/api/grocery_list/bulk',
+            view_func=BulkGroceryListAPI.as_view('grocery_list_bulk'),
+            methods=['POST', 'DELETE']
+        )
+        app.add_url_rule(
+            '/api/grocery_list/slots',
+            view_func=DeliverySlotAPI.as_view('grocery_list_slots'),
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/api/grocery_item/search',
+            view_func=SearchGroceryItemAPI.as_view('grocery_item_search'),
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/api/grocery_item/multi_get',
+            view_func=MultiGetAPI.as_view('grocery_item_multi_get', 'grocery_item', GroceryItem, GROCERY_ITEM_GRAPH),
+            methods=['POST']
+        )
+        app.add_url_rule(
+            '/api/grocery_list/multi_get',
+            view_func=MultiGetAPI.as_view('grocery_list_multi_get', 'grocery_list', GroceryList, GROCERY_LIST_GRAPH),
+            methods=['POST']
+        )
+        app.add_url_rule(
+            '/api/customer/multi_get',
+            view_func=MultiGetAPI.as_view('customer_multi_get', 'customer', Customer, CUSTOMER_GRAPH),
+            methods=['POST']
+        )
         app.add_url_rule(
             '/api/grocery_item/<string:item_id>',
             view_func=grocery_item_api,
@@ -33,7 +92,7 @@ def create_app(app_config='app_config.py'):
         app.add_url_rule(
             '/api/grocery_item',
             view_func=grocery_item_api,
-            methods=['POST']
+            methods=['GET', 'POST']
         )
         app.add_url_rule(
             '/api/grocery_list/<string:item_id>',
@@ -43,7 +102,7 @@ def create_app(app_config='app_config.py'):
         app.add_url_rule(
             '/api/grocery_list',
             view_func=grocery_list_api,
-            methods=['POST']
+            methods=['GET', 'POST']
         )
         app.add_url_rule(
             '/api/customer/<string:item_id>',
@@ -53,6 +112,42 @@ def create_app(app_config='app_config.py'):
         app.add_url_rule(
             '/api/customer',
             view_func=customer_api,
-            methods=['POST']
+            methods=['GET', 'POST']
+        )
+        app.add_url_rule(
+            '/api/customer/<string:item_id>/export',
+            view_func=CustomerExportAPI.as_view('customer_export'),
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/api/aggregates/customer_spend',
+            view_func=CustomerSpendAPI.as_view('customer_spend'),
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/api/aggregates/revenue_by_type',
+            view_func=RevenueByTypeAPI.as_view('revenue_by_type'),
+            methods=['GET']
+        )
+        report_api = ReportAPI.as_view('report')
+        app.add_url_rule(
+            '/api/reports/<string:job_id>',
+            view_func=report_api,
+            methods=['GET', 'DELETE']
+        )
+        app.add_url_rule(
+            '/api/reports',
+            view_func=report_api,
+            methods=['GET', 'POST']
+        )
+        app.add_url_rule(
+            '/api/reports/<string:job_id>/result',
+            view_func=ReportResultAPI.as_view('report_result'),
+            methods=['GET']
+        )
+        app.add_url_rule(
+            '/api/changes',
+            view_func=ChangeFeedAPI.as_view('changes'),
+            methods=['GET']
         )
         return app
@@ -1,2 +1,76 @@
 SQLALCHEMY_TRACK_MODIFICATIONS = False
-SQLALCHEMY_DATABASE_URI = 'sqlite:///grocery_delivery_db.sqlite3?check_same_thread=False'
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = 'sqlite:///grocery_delivery_db.sqlite3?check_same_thread=False'
+# Pool sizing, used for file based SQLite and for server databases such as Postgres
+DATABASE_POOL_SIZE = 5
+DATABASE_MAX_OVERFLOW = 10
+DATABASE_POOL_TIMEOUT = 30
+# Applied to every new SQLite connection, also for configs that leave them out. WAL lets readers run alongside the
+# single writer, NORMAL only fsyncs at checkpoints under WAL, and busy_timeout makes a writer wait for the lock instead
+# of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+# URIs of further databases customers are sharded over, SQLALCHEMY_DATABASE_URI is shard 0. Each customer lives on
+# shard crc32(id) % shard count, changing the list needs `python -m database.rebalance`. Where grocery lists and
+# items addressed by id live is cached for up to SHARD_LOCATION_ENTRIES ids.
+DATABASE_SHARDS = []
+SHARD_LOCATION_ENTRIES = 100000
+BULK_INSERT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 200
+BULK_DELETE_BATCH_SIZE = 1000
+# Coalesce PATCHes of the same grocery list arriving within this many ms into one commit, 0 disables it
+PATCH_COALESCE_WINDOW_MS = 0
+# Responses of POSTs sent with an Idempotency-Key are replayed for this many seconds, a key left pending by a
+# request that died can be reused after IDEMPOTENCY_PENDING_TIMEOUT, expired keys are purged every N claims
+IDEMPOTENCY_TTL = 86400
+IDEMPOTENCY_PENDING_TIMEOUT = 60
+IDEMPOTENCY_PURGE_EVERY = 1000
+# Delivery slot index: bucket size in seconds, reload after this many seconds so writes of other worker processes
+# show up (0 never reloads), and deliveries per bucket used to report each slot's remaining capacity (0 disables it)
+DELIVERY_SLOT_SECONDS = 900
+DELIVERY_INDEX_MAX_AGE = 0
+DELIVERY_SLOT_CAPACITY = 0
+# Report jobs (exports and aggregations) run in REPORT_WORKERS processes started with REPORT_START_METHOD, at most
+# REPORT_MAX_PENDING jobs queue up and the newest REPORT_MAX_JOBS finished ones are kept. Results are written to
+# REPORT_DIRECTORY, None uses a new temporary directory.
+REPORT_WORKERS = 2
+REPORT_MAX_PENDING = 20
+REPORT_MAX_JOBS = 100
+REPORT_DIRECTORY = None
+REPORT_START_METHOD = 'spawn'
+# Change feed on /api/changes: a long poll waits at most CHANGE_FEED_MAX_WAIT seconds and re-reads the log every
+# CHANGE_FEED_POLL_INTERVAL for writes of other processes, an event stream lasts CHANGE_FEED_STREAM_SECONDS with a
+# keepalive every CHANGE_FEED_HEARTBEAT_SECONDS. Every CHANGE_FEED_PURGE_EVERY feed requests, rows older than
+# CHANGE_LOG_RETENTION seconds are dropped and rows older than CHANGE_LOG_COMPACT_AFTER are compacted to the last
+# change of each record.
+CHANGE_FEED_MAX_WAIT = 30
+CHANGE_FEED_POLL_INTERVAL = 1.0
+CHANGE_FEED_STREAM_SECONDS = 300
+CHANGE_FEED_HEARTBEAT_SECONDS = 15
+CHANGE_FEED_PURGE_EVERY = 1000
+CHANGE_LOG_RETENTION = 604800
+CHANGE_LOG_COMPACT_AFTER = 3600
+# Grocery item search ranks the matches in windows of this many, newest first, and pages from one window to the next
+SEARCH_MAX_CANDIDATES = 200
+# Read-through cache for single record GETs: 'lru' (per process), 'redis' (shared, needs CACHE_URL) or 'null'
+CACHE_BACKEND = 'lru'
+CACHE_MAX_ENTRIES = 10000
+CACHE_TTL = 300
+# JSON serializer: 'auto' (orjson when installed), 'orjson' or 'stdlib'
+JSON_BACKEND = 'auto'
+# gzip / br / zstd response compression negotiated from Accept-Encoding (br and zstd need the brotli and zstandard
+# packages), preferred in this order. Smaller bodies are sent as they are. Compressed bodies are cached by digest.
+COMPRESSION_ENABLED = True
+COMPRESSION_ENCODINGS = ('zstd', 'br', 'gzip')
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CACHE_ENTRIES = 256
+COMPRESSION_CACHE_BYTES = 16 * 1024 * 1024
+# Request metrics served on /metrics, Server-Timing headers and the grocery.slow_queries log
+INSTRUMENTATION_ENABLED = True
+SERVER_TIMING_ENABLED = True
+SLOW_QUERY_THRESHOLD_MS = 200
@@ -0,0 +1,182 @@
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from database.sql_client import create_async_engine_from_config, shard_count
+from rest_api import async_reads
+from rest_api.instrumentation import instrument_engine
+
+log = logging.getLogger('grocery.asgi')
+
+# Async serving mode: `uvicorn asgi:create_asgi_app --factory`. GET on the
+# customer, grocery list and grocery item routes is answered on the event loop
+# with an async engine, so a request waiting on the database holds no thread.
+# Every other route (writes, bulk, export, aggregates, metrics) runs the
+# regular Flask app on a bounded thread pool, the writes keep a single
+# implementation and the `python -m flask run` path is unchanged. With
+# DATABASE_SHARDS set every route runs the Flask app, the async engine only
+# knows shard 0.
+ASYNC_ENDPOINTS = {'customer', 'grocery_list', 'grocery_item'}
+DEFAULT_SYNC_WORKERS = 16
+STREAM_BUFFER = 8
+
+
+def environ_from_scope(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    # The body is read in full, which also covers chunked requests without a length.
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+class AsyncApp:
+
+    def __init__(self, flask_app, async_engine, sync_workers=DEFAULT_SYNC_WORKERS):
+        self.flask_app = flask_app
+        self.async_engine = async_engine
+        self.session_factory = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(sync_workers, thread_name_prefix='grocery-sync')
+        self.async_endpoints = ASYNC_ENDPOINTS if shard_count() == 1 else set()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+        environ = environ_from_scope(scope, await read_body(receive))
+        try:
+            endpoint, values = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint, values = None, {}
+        if endpoint in self.async_endpoints and environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            await self.call_async(endpoint, values, environ, send)
+        else:
+            await self.call_sync(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+        await self.async_engine.dispose()
+
+    async def call_async(self, endpoint, values, environ, send):
+        # Same request lifecycle as Flask's full_dispatch_request, so the
+        # before/after request hooks (instrumentation) see these requests too.
+        with self.flask_app.request_context(environ):
+            try:
+                response = self.flask_app.preprocess_request()
+                if response is None:
+                    response = await async_reads.get(self.session_factory, endpoint, **values)
+                response = self.flask_app.process_response(self.flask_app.make_response(response))
+            except Exception as err:
+                response = self.flask_app.handle_exception(err)
+            body = b'' if environ['REQUEST_METHOD'] == 'HEAD' else response.get_data()
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': encode_headers(response.headers.items())})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def call_sync(self, environ, send):
+        # The WSGI app and its response iterator run on one pool thread, the
+        # request context and scoped session are thread local and a streamed
+        # response (customer export) must be iterated where it was created.
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(STREAM_BUFFER)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def put(chunk):
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        def run():
+            try:
+                iterable = self.flask_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if chunk:
+                            put(chunk)
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            finally:
+                put(None)
+
+        future = loop.run_in_executor(self.executor, run)
+        chunk = await chunks.get()
+        if not started:
+            await future
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': encode_headers(started['headers'])})
+        try:
+            while chunk is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await chunks.get()
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # A client that went away must not leave the pool thread blocked on a full queue.
+            while chunk is not None:
+                chunk = await chunks.get()
+            try:
+                await future
+            except Exception:
+                log.exception('Streaming %s %s failed', environ['REQUEST_METHOD'], environ['PATH_INFO'])
+
+
+def create_asgi_app(app_config='app_config.py'):
+    flask_app = create_app(app_config)
+    async_engine = create_async_engine_from_config(flask_app.config)
+    if 'request_metrics' in flask_app.extensions:
+        instrument_engine(async_engine.sync_engine)
+    return AsyncApp(flask_app, async_engine, flask_app.config.get('ASGI_SYNC_WORKERS', DEFAULT_SYNC_WORKERS))
@@ -0,0 +1,120 @@
+"""REST API benchmark suite.
+
+Seeds a throwaway SQLite database with customers x lists x items, drives every
+route registered by create_app through the Flask test client and/or a real WSGI
+server, prints p50/p95/p99 latency, throughput and queries per request for each
+endpoint, and writes the results to JSON. Pass ``--baseline`` with the JSON of an
+earlier run to flag endpoints whose p95 latency regressed.
+
+Run from the repository root: ``python -m benchmarks --customers 200 --output results.json``
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app import create_app
+from benchmarks.api import RequestBuilder, TestClientDriver, WSGIServerDriver, run
+from benchmarks.seed import seed
+from database import sql_client
+
+DRIVERS = {'client': TestClientDriver, 'wsgi': WSGIServerDriver}
+
+
+def write_config(directory):
+    # The benchmark runs with the regular app_config.py settings against its own database.
+    path = os.path.join(directory, 'benchmark_config.py')
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app_config.py')) as source:
+        settings = source.read()
+    database = os.path.join(directory, 'benchmark.sqlite3')
+    with open(path, 'w') as config:
+        config.write(f"{settings}\nSQLALCHEMY_DATABASE_URI = 'sqlite:///{database}?check_same_thread=False'\n")
+    return path
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results, baseline, threshold):
+    previous = {(r['mode'], r['method'], r['rule']): r for r in baseline['results'] if not r.get('skipped')}
+    for result in results:
+        before = previous.get((result['mode'], result['method'], result['rule']))
+        if result.get('skipped') or not before or not before['p95_ms']:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms']
+        if change > threshold:
+            yield result, before, change
+
+
+def print_results(results):
+    print(f"{'mode':<7}{'method':<8}{'rule':<40}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+          f"{'queries':>9}  statuses")
+    for result in results:
+        if result.get('skipped'):
+            print(f"{result['mode']:<7}{result['method']:<8}{result['rule']:<40}  skipped")
+            continue
+        print(f"{result['mode']:<7}{result['method']:<8}{result['rule']:<40}{result['p50_ms']:>9.2f}"
+              f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['throughput_rps']:>9.0f}"
+              f"{result['queries_per_request']:>9.1f}  {result['statuses']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--lists-per-customer', type=int, default=5)
+    parser.add_argument('--items-per-list', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route and method')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--modes', nargs='+', choices=sorted(DRIVERS), default=['client', 'wsgi'])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='p95 increase reported as a regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(write_config(directory))
+        started = time.perf_counter()
+        dataset = seed(sql_client.engine, args.customers, args.lists_per_customer, args.items_per_list)
+        deletions = args.requests * len(args.modes)
+        disposable = {'customer': seed(sql_client.engine, deletions, 1, 0).customer_ids,
+                      'grocery_list': seed(sql_client.engine, 1, deletions, 0).list_ids,
+                      'grocery_item': seed(sql_client.engine, 1, 1, deletions).item_ids}
+        seed_seconds = time.perf_counter() - started
+        builder = RequestBuilder(dataset, disposable)
+        results = []
+        for mode in args.modes:
+            with DRIVERS[mode](app) as driver:
+                results.extend(run(app, driver, builder, args.requests, args.concurrency))
+        sql_client.engine.dispose()
+
+    print_results(results)
+    report = {
+        'meta': {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(), 'revision': git_revision(),
+                 'python': sys.version.split()[0], 'dataset': dataset.sizes(), 'seed_seconds': seed_seconds,
+                 'requests': args.requests, 'concurrency': args.concurrency},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = list(regressions(results, json.load(baseline_file), args.threshold))
+        for result, before, change in found:
+            print(f"REGRESSION {result['mode']} {result['method']} {result['rule']}: p95 "
+                  f"{before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms (+{change:.0%})")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""Drive every route registered by create_app and record latency, throughput and query counts.
+
+Each (rule, method) pair gets a request built from the seeded dataset and is sent
+``requests`` times through either the Flask test client or a real WSGI server
+running in a background thread. DELETE requests consume records seeded just for
+them so the main dataset stays intact for the other routes.
+"""
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.seed import ITEM_NAMES, ITEM_TYPES
+from database import sql_client
+
+RESOURCES = ('customer', 'grocery_list', 'grocery_item')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def resource_of(endpoint):
+    for resource in RESOURCES:
+        if endpoint == resource or endpoint.startswith(resource + '_'):
+            return resource
+    return None
+
+
+class RequestBuilder:
+    # Builds one request for a route. Returns None when the route can not be
+    # exercised with the data at hand, the route is then reported as skipped.
+
+    def __init__(self, dataset, disposable, rng=None):
+        self.dataset = dataset
+        self.disposable = disposable
+        self.rng = rng or random.Random(1)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def record_id(self, resource):
+        pool = {'customer': self.dataset.customer_ids, 'grocery_list': self.dataset.list_ids,
+                'grocery_item': self.dataset.item_ids}[resource]
+        with self.lock:
+            return self.rng.choice(pool)
+
+    def disposable_id(self, resource):
+        with self.lock:
+            pool = self.disposable[resource]
+            return pool.pop() if pool else None
+
+    def item(self):
+        with self.lock:
+            return {'name': self.rng.choice(ITEM_NAMES), 'type': self.rng.choice(ITEM_TYPES),
+                    'price_per_unit': self.rng.randint(1, 2000), 'quantity': self.rng.randint(1, 12)}
+
+    def body(self, resource, method, endpoint):
+        unique = next(self.counter)
+        if endpoint.endswith('_bulk'):
+            if resource == 'grocery_item':
+                return [self.item() for _ in range(100)]
+            return [{'desired_delivery': time.time() + 3600, 'grocery_items': [self.item(), self.item()]}
+                    for _ in range(20)]
+        if resource == 'customer':
+            if method == 'POST':
+                return {'username': f'bench-{time.time()}-{unique}', 'password': 'secret', 'grocery_lists': []}
+            return {'email': f'bench-{unique}@example.com'}
+        if resource == 'grocery_list':
+            if method == 'POST':
+                return {'customer_id': self.record_id('customer'), 'desired_delivery': time.time() + 3600,
+                        'grocery_items': [self.item(), self.item()]}
+            return {'desired_delivery': time.time() + 7200}
+        if method == 'POST':
+            return self.item()
+        return {'name': self.rng.choice(ITEM_NAMES)}
+
+    def build(self, rule, method):
+        endpoint = rule.endpoint
+        resource = resource_of(endpoint)
+        values = {}
+        for argument in rule.arguments:
+            if argument != 'item_id' or resource is None:
+                return None
+            values[argument] = self.disposable_id(resource) if method == 'DELETE' else self.record_id(resource)
+            if values[argument] is None:
+                return None
+        path = rule.build(values, append_unknown=False)[1]
+        if method == 'GET' and not rule.arguments and resource:
+            path += '?limit=50'
+        body = self.body(resource, method, endpoint) if method in ('POST', 'PATCH') and resource else None
+        return {'method': method, 'path': path, 'body': body}
+
+
+class TestClientDriver:
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def send(self, request):
+        client = self.app.test_client()
+        response = client.open(request['path'], method=request['method'], json=request['body'])
+        response.get_data()
+        return response.status_code
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class WSGIServerDriver:
+    name = 'wsgi'
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+    def send(self, request):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=60)
+        headers = {}
+        body = None
+        if request['body'] is not None:
+            body = json.dumps(request['body'])
+            headers['Content-Type'] = 'application/json'
+        connection.request(request['method'], request['path'], body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response.status
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def _callback(self, *args):
+        with self.lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._callback)
+
+
+def routes(app):
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: (rule.rule, rule.endpoint)):
+        if rule.endpoint == 'static':
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            yield rule, method
+
+
+def measure(driver, requests, concurrency):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def send(request):
+        started = time.perf_counter()
+        status = driver.send(request)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    with QueryCounter(sql_client.engine) as counter:
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as executor:
+                list(executor.map(send, requests))
+        else:
+            for request in requests:
+                send(request)
+        wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(requests),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'throughput_rps': len(requests) / wall,
+        'queries_per_request': counter.count / len(requests),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+    }
+
+
+def run(app, driver, builder, requests, concurrency):
+    results = []
+    for rule, method in routes(app):
+        planned = [builder.build(rule, method) for _ in range(requests)]
+        planned = [request for request in planned if request is not None]
+        result = {'mode': driver.name, 'endpoint': rule.endpoint, 'rule': rule.rule, 'method': method}
+        if not planned:
+            results.append({**result, 'skipped': True})
+            continue
+        results.append({**result, **measure(driver, planned, concurrency)})
+    return results
@@ -0,0 +1,119 @@
+"""Concurrent-client throughput of the sync Flask app and the ASGI entry point.
+
+Seeds a throwaway database, then sends the same mix of single record and
+collection GETs to both modes at each ``--concurrency`` level. The sync mode
+calls the WSGI app from a pool of ``--sync-threads`` threads, like a threaded
+server with a fixed number of workers. The async mode runs every client as a
+task on one event loop against asgi.AsyncApp. Both are driven in process, so
+the numbers compare the serving models rather than an HTTP server. The record
+cache is off unless ``--cache`` is given, so every request reaches the database.
+
+Needs aiosqlite. Run from the repository root:
+``python -m benchmarks.async_throughput --customers 200 --requests 2000 --concurrency 1 16 64``
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from asgi import create_asgi_app
+from benchmarks.__main__ import write_config
+from benchmarks.seed import seed
+from database import sql_client
+
+
+def request_paths(dataset, requests, rng):
+    paths = []
+    for _ in range(requests):
+        kind = rng.random()
+        if kind < 0.4:
+            paths.append((f'/api/grocery_list/{rng.choice(dataset.list_ids)}', ''))
+        elif kind < 0.7:
+            paths.append((f'/api/grocery_item/{rng.choice(dataset.item_ids)}', ''))
+        elif kind < 0.9:
+            paths.append((f'/api/customer/{rng.choice(dataset.customer_ids)}', ''))
+        else:
+            paths.append(('/api/grocery_list', 'limit=20'))
+    return paths
+
+
+def run_sync(flask_app, paths, concurrency, threads):
+    def send(path):
+        environ = EnvironBuilder(path=path[0], query_string=path[1]).get_environ()
+        iterable, status, _ = run_wsgi_app(flask_app, environ, buffered=True)
+        b''.join(iterable)
+        return int(status.split(' ', 1)[0])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(min(concurrency, threads)) as executor:
+        statuses = list(executor.map(send, paths))
+    return time.perf_counter() - started, statuses
+
+
+def run_async(loop, asgi_app, paths, concurrency):
+    async def send(path, limit):
+        scope = {'type': 'http', 'method': 'GET', 'path': path[0], 'query_string': path[1].encode(),
+                 'headers': [], 'http_version': '1.1'}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def collect(message):
+            messages.append(message)
+
+        async with limit:
+            await asgi_app(scope, receive, collect)
+        return messages[0]['status']
+
+    async def drive():
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[send(path, limit) for path in paths])
+
+    started = time.perf_counter()
+    statuses = loop.run_until_complete(drive())
+    return time.perf_counter() - started, statuses
+
+
+def report(mode, concurrency, elapsed, statuses):
+    errors = sum(1 for status in statuses if status >= 500)
+    print(f'{mode:<6}{concurrency:>12}{len(statuses) / elapsed:>12.0f}{elapsed * 1000 / len(statuses):>12.2f}'
+          f'{errors:>8}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--lists-per-customer', type=int, default=5)
+    parser.add_argument('--items-per-list', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--sync-threads', type=int, default=16)
+    parser.add_argument('--cache', action='store_true', help='keep the record cache on')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = write_config(directory)
+        if not args.cache:
+            with open(config, 'a') as config_file:
+                config_file.write("CACHE_BACKEND = 'null'\n")
+        asgi_app = create_asgi_app(config)
+        dataset = seed(sql_client.engine, args.customers, args.lists_per_customer, args.items_per_list)
+        paths = request_paths(dataset, args.requests, random.Random(0))
+        # One loop for the whole run, as in a server: the async pool belongs to it.
+        loop = asyncio.new_event_loop()
+        print(f"{'mode':<6}{'concurrency':>12}{'req/s':>12}{'ms/req':>12}{'errors':>8}")
+        for concurrency in args.concurrency:
+            report('sync', concurrency, *run_sync(asgi_app.flask_app, paths, concurrency, args.sync_threads))
+            report('async', concurrency, *run_async(loop, asgi_app, paths, concurrency))
+        loop.run_until_complete(asgi_app.close())
+        loop.close()
+        sql_client.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
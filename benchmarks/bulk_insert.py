@@ -0,0 +1,52 @@
+"""Compare grocery item insert throughput of the single-row and bulk endpoints.
+
+Run from the repository root: ``python -m benchmarks.bulk_insert --rows 5000``
+"""
+import argparse
+import json
+import random
+import time
+
+from app import create_app
+
+
+def make_items(count):
+    return [{'name': f'item-{index}', 'type': random.choice(['fruit', 'dairy', 'bakery']),
+             'price_per_unit': random.randint(1, 1000), 'quantity': random.randint(1, 10)}
+            for index in range(count)]
+
+
+def single_row(client, items):
+    for item in items:
+        client.post('/api/grocery_item', json=item)
+
+
+def bulk(client, items, batch_size):
+    body = '\n'.join(json.dumps(item) for item in items)
+    client.post(f'/api/grocery_item/bulk?batch_size={batch_size}', data=body,
+                content_type='application/x-ndjson')
+
+
+def measure(label, rows, run):
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<24} {rows:>8} rows {elapsed:>8.2f}s {rows / elapsed:>12.0f} rows/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--config', default='app_config.py')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    client = app.test_client()
+    measure('single row', args.rows, lambda: single_row(client, make_items(args.rows)))
+    for size in args.batch_sizes:
+        measure(f'bulk batch_size={size}', args.rows, lambda: bulk(client, make_items(args.rows), size))
+
+
+if __name__ == '__main__':
+    main()
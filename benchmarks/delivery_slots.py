@@ -0,0 +1,115 @@
+"""Delivery slot queries on a large schedule.
+
+Seeds ``--lists`` grocery lists whose desired_delivery is spread over the next
+``--days`` days, loads the delivery slot index and times ``--queries`` random
+windows per query shape:
+
+* ``index``: DeliverySlotIndex.window() on its own
+* ``endpoint``: GET /api/grocery_list/slots through the Flask test client
+* ``sql``: the same window read from grocery_lists with its desired_delivery
+  index, grouped into slots in Python
+
+It also reports the load time of the index and the cost of moving one list to
+another slot.
+
+Run from the repository root: ``python -m benchmarks.delivery_slots --lists 1000000``
+"""
+import argparse
+import math
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+
+from app import create_app
+from benchmarks.__main__ import write_config
+from database import sql_client
+from database.models import GroceryList, generate_uuid
+from rest_api.delivery_slots import get_slot_index
+
+BATCH_SIZE = 10000
+SHAPES = {'30 min, ids': (1800, 900, False), '30 min, counts': (1800, 900, True), '1 day, counts': (86400, 900, True),
+          '1 day hourly, counts': (86400, 3600, True)}
+
+
+def seed(engine, count, days, rng):
+    now = time.time()
+    with engine.begin() as connection:
+        for start in range(0, count, BATCH_SIZE):
+            connection.execute(GroceryList.__table__.insert(), [
+                {'id': generate_uuid(), 'desired_delivery': now + rng.random() * days * 86400, 'total_price': 0,
+                 'created_at': now, 'updated_at': now}
+                for _ in range(min(BATCH_SIZE, count - start))])
+    return now
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return (time.perf_counter() - started) * 1000
+
+
+def sql_window(start, end, slot_seconds, counts_only):
+    table = GroceryList.__table__
+    slots = {}
+    rows = sql_client.db_session.execute(select(table.c.id, table.c.desired_delivery)
+                                         .where(table.c.desired_delivery >= start, table.c.desired_delivery < end)
+                                         .order_by(table.c.desired_delivery))
+    for list_id, delivery in rows:
+        slot = slots.setdefault(math.floor(delivery / slot_seconds), {'count': 0, 'grocery_list_ids': []})
+        slot['count'] += 1
+        if not counts_only:
+            slot['grocery_list_ids'].append(list_id)
+    return slots
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lists', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args(argv)
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(write_config(directory))
+        started = time.perf_counter()
+        now = seed(sql_client.engine, args.lists, args.days, rng)
+        print(f'{args.lists} lists seeded in {time.perf_counter() - started:.1f}s')
+        client = app.test_client()
+        with app.app_context():
+            load_ms = timed(get_slot_index)
+            index = get_slot_index()
+            print(f'index loaded in {load_ms:.0f} ms, {len(index.buckets)} buckets')
+            print(f"{'query':<22}{'index p50':>10}{'p99 ms':>8}{'endpoint':>10}{'p99 ms':>8}{'sql p50':>10}"
+                  f"{'p99 ms':>8}")
+            for shape, (length, slot_seconds, counts_only) in SHAPES.items():
+                starts = [now + rng.random() * (args.days * 86400 - length) for _ in range(args.queries)]
+                query = {'slot_seconds': slot_seconds}
+                if counts_only:
+                    query['counts_only'] = 'true'
+                results = [
+                    [timed(lambda: index.window(start, start + length, slot_seconds, not counts_only))
+                     for start in starts],
+                    [timed(lambda: client.get('/api/grocery_list/slots',
+                                              query_string={'from': start, 'to': start + length, **query}))
+                     for start in starts],
+                    [timed(lambda: sql_window(start, start + length, slot_seconds, counts_only)) for start in starts],
+                ]
+                print(f'{shape:<22}' + ''.join(f'{p50:>10.3f}{p99:>8.3f}' for p50, p99 in map(percentiles, results)))
+            list_ids = rng.sample(list(index.deliveries), min(args.queries, len(index)))
+            moves = [timed(lambda: index.set(list_id, now + rng.random() * args.days * 86400)) for list_id in list_ids]
+            print(f"reschedule one list: p50 {percentiles(moves)[0] * 1000:.1f} us, "
+                  f"p99 {percentiles(moves)[1] * 1000:.1f} us")
+        sql_client.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
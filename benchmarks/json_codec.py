@@ -0,0 +1,95 @@
+"""Encode and decode cost of large customer documents per JSON backend.
+
+Builds one customer with ``--lists`` lists of ``--items`` items in memory and
+times, for each backend, jsonify of the customer's as_dict() document (what a
+GET returns) and verify_and_pull_json of the same document sent as a request
+body with a text/plain Content-Type. The ``legacy`` row is the previous request
+parsing: request.json, then json.loads of the body when that gave nothing.
+Building the document with as_dict() is timed once on its own, it does not
+depend on the backend.
+
+Run from the repository root: ``python -m benchmarks.json_codec --lists 50 --items 40``
+"""
+import argparse
+import json
+import time
+
+from flask import Flask, jsonify, make_response, request
+
+from database.models import Customer, GroceryItem, GroceryList
+from rest_api.json_backend import json_backend, orjson
+from rest_api.utils import verify_and_pull_json
+
+
+def customer_document(lists, items):
+    customer = Customer(id='customer', username='bench', password='secret', email='bench@example.com',
+                        address='1 Main St', created_at=1.0, updated_at=2.0)
+    for list_index in range(lists):
+        grocery_list = GroceryList(id=f'list-{list_index}', customer_id='customer', desired_delivery=3.0,
+                                   total_price=0, created_at=1.0, updated_at=2.0)
+        grocery_list.grocery_items = [
+            GroceryItem(id=f'item-{list_index}-{index}', name='milk', type='dairy', price_per_unit=199, quantity=2,
+                        created_at=1.0, updated_at=2.0)
+            for index in range(items)]
+        customer.grocery_lists.append(grocery_list)
+    return customer
+
+
+def legacy_verify_and_pull_json(request):
+    payload = request.json
+    if not payload:
+        try:
+            return "success", json.loads(request.data)
+        except json.JSONDecodeError as err:
+            return "error", make_response(jsonify(status="error", message="JSON parse error: {}".format(err)), 406)
+    return "success", payload
+
+
+def best_of(repeat, number, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return min(timings) * 1000
+
+
+def measure(app, document, body, parse, number, repeat):
+    with app.app_context():
+        encode_ms = best_of(repeat, number, lambda: jsonify(status='success', data=document).get_data())
+
+        def decode():
+            with app.test_request_context(data=body, content_type='text/plain'):
+                parse(request)
+
+        decode_ms = best_of(repeat, number, decode)
+    return encode_ms, decode_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    customer = customer_document(args.lists, args.items)
+    document = customer.as_dict()
+    body = json.dumps(document).encode()
+    backends = [('legacy', 'stdlib', legacy_verify_and_pull_json), ('stdlib', 'stdlib', verify_and_pull_json)]
+    if orjson is not None:
+        backends.append(('orjson', 'orjson', verify_and_pull_json))
+    print(f'document: {args.lists} lists x {args.items} items, {len(body) / 1024:.0f} KiB, as_dict() '
+          f'{best_of(args.repeat, args.number, customer.as_dict):.2f} ms')
+    print(f"{'backend':<10}{'encode ms':>12}{'decode ms':>12}")
+    for name, backend, parse in backends:
+        app = Flask(__name__)
+        app.json_encoder, app.json_decoder = json_backend({'JSON_BACKEND': backend})
+        encode_ms, decode_ms = measure(app, document, body, parse, args.number, args.repeat)
+        print(f'{name:<10}{encode_ms:>12.2f}{decode_ms:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Payload size and response time of a heavy customer document.
+
+Seeds one customer with ``--lists`` grocery lists of ``--items-per-list`` items
+drawn from a catalog of ``--catalog`` items, so most items appear in several
+lists, and GETs /api/customer/<id> ``--requests`` times per variant: the nested
+document as before, ``?depth=1``, ``?shape=normalized``, each uncompressed and
+with every encoding installed. The record cache is warm, so the times are
+serialization plus compression. ``cold`` is the p50 with the compressed body
+cache turned off, ``p50`` with it on. Like the main suite, results can be
+written with ``--output`` and compared against an earlier run with
+``--baseline``, which reports variants whose bytes or p50 grew.
+
+Run from the repository root: ``python -m benchmarks.payload --output payload.json``
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from app import create_app
+from benchmarks.__main__ import git_revision, write_config
+from benchmarks.seed import ITEM_NAMES, ITEM_TYPES
+from database import sql_client
+from database.models import Customer, GroceryItem, GroceryList, generate_uuid, grocery_list_item_table
+from rest_api.compression import COMPRESSORS
+
+SHAPES = {'nested': {}, 'depth=1': {'depth': 1}, 'normalized': {'shape': 'normalized'}}
+
+
+def seed(engine, lists, items_per_list, catalog, rng):
+    now = time.time()
+    customer_id = generate_uuid()
+    item_ids = [generate_uuid() for _ in range(catalog)]
+    list_ids = [generate_uuid() for _ in range(lists)]
+    with engine.begin() as connection:
+        connection.execute(Customer.__table__.insert(), [{
+            'id': customer_id, 'username': 'heavy', 'password': 'secret', 'email': 'heavy@example.com',
+            'address': '1 Main St', 'created_at': now, 'updated_at': now}])
+        connection.execute(GroceryItem.__table__.insert(), [
+            {'id': item_id, 'name': rng.choice(ITEM_NAMES), 'type': rng.choice(ITEM_TYPES),
+             'price_per_unit': rng.randint(1, 2000), 'quantity': rng.randint(1, 12), 'created_at': now,
+             'updated_at': now} for item_id in item_ids])
+        connection.execute(GroceryList.__table__.insert(), [
+            {'id': list_id, 'customer_id': customer_id, 'desired_delivery': now, 'total_price': 0,
+             'created_at': now, 'updated_at': now} for list_id in list_ids])
+        connection.execute(grocery_list_item_table.insert(), [
+            {'grocery_list_id': list_id, 'grocery_item_id': item_id}
+            for list_id in list_ids for item_id in rng.sample(item_ids, min(items_per_list, catalog))])
+    return customer_id
+
+
+def p50_ms(requests, function):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def measure(app, customer_id, requests):
+    client = app.test_client()
+    compression = app.extensions['compression']
+    cache = compression.cache
+    url = f'/api/customer/{customer_id}'
+    results = []
+    for shape, args in SHAPES.items():
+        for encoding in ('identity',) + tuple(compression.encodings):
+            def get():
+                return client.get(url, query_string=args, headers={'Accept-Encoding': encoding})
+
+            response = get()
+            assert response.status_code == 200, response.status_code
+            compression.cache = None
+            cold = p50_ms(requests, get)
+            compression.cache = cache
+            results.append({'name': f'{shape} {encoding}', 'bytes': len(response.get_data()), 'cold_ms': cold,
+                            'p50_ms': p50_ms(requests, get)})
+    return results
+
+
+def regressions(results, baseline, threshold):
+    previous = {result['name']: result for result in baseline['results']}
+    for result in results:
+        before = previous.get(result['name'])
+        for key in ('bytes', 'p50_ms'):
+            if before and before[key] and (result[key] - before[key]) / before[key] > threshold:
+                yield result, before, key
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lists', type=int, default=200)
+    parser.add_argument('--items-per-list', type=int, default=25)
+    parser.add_argument('--catalog', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='increase reported as a regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(write_config(directory))
+        customer_id = seed(sql_client.engine, args.lists, args.items_per_list, args.catalog, random.Random(0))
+        results = measure(app, customer_id, args.requests)
+        sql_client.engine.dispose()
+    print(f"{'':<24}{'bytes':>10}{'cold ms':>10}{'p50 ms':>10}")
+    for result in results:
+        print(f"{result['name']:<24}{result['bytes']:>10}{result['cold_ms']:>10.2f}{result['p50_ms']:>10.2f}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'meta': {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                                'revision': git_revision(), 'python': sys.version.split()[0],
+                                'encodings': sorted(COMPRESSORS), 'lists': args.lists,
+                                'items_per_list': args.items_per_list, 'catalog': args.catalog},
+                       'results': results}, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = list(regressions(results, json.load(baseline_file), args.threshold))
+        for result, before, key in found:
+            print(f"REGRESSION {result['name']}: {key} {before[key]:.1f} -> {result[key]:.1f}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Relationship load latency before and after the index migrations.
+
+Seeds a database with the original (unindexed) schema, times eager loading of
+customer graphs and grocery lists, applies database.migrations.upgrade and times
+the same loads again. ``--rows`` is the number of grocery_list_item links; every
+list holds 10 items and every customer owns 10 lists.
+
+Run from the repository root: ``python -m benchmarks.relationship_load --rows 10000 100000 1000000``
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database.loaders import CUSTOMER_GRAPH, GROCERY_LIST_GRAPH
+from database.migrations import upgrade
+from database.models import Customer, GroceryList
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE customers (id VARCHAR PRIMARY KEY, username VARCHAR UNIQUE, password VARCHAR NOT NULL, '
+    'email VARCHAR, address VARCHAR, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_lists (id VARCHAR PRIMARY KEY, customer_id VARCHAR REFERENCES customers (id), '
+    'desired_delivery FLOAT, total_price INTEGER, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_items (id VARCHAR PRIMARY KEY, price_per_unit INTEGER, quantity INTEGER, '
+    'name VARCHAR, type VARCHAR, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_list_item (grocery_list_id VARCHAR REFERENCES grocery_lists (id), '
+    'grocery_item_id VARCHAR REFERENCES grocery_items (id))',
+]
+ITEMS_PER_LIST = 10
+LISTS_PER_CUSTOMER = 10
+
+
+def seed(path, rows):
+    list_count = max(rows // ITEMS_PER_LIST, 1)
+    customer_count = max(list_count // LISTS_PER_CUSTOMER, 1)
+    connection = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        connection.execute(statement)
+    now = time.time()
+    connection.executemany('INSERT INTO customers (id, username, password, created_at) VALUES (?, ?, ?, ?)',
+                           ((f'c{n}', f'user{n}', 'secret', now) for n in range(customer_count)))
+    connection.executemany('INSERT INTO grocery_lists (id, customer_id, desired_delivery, created_at) '
+                           'VALUES (?, ?, ?, ?)',
+                           ((f'l{n}', f'c{n % customer_count}', now + n, now) for n in range(list_count)))
+    connection.executemany('INSERT INTO grocery_items (id, price_per_unit, quantity, name, type, created_at) '
+                           'VALUES (?, ?, ?, ?, ?, ?)',
+                           ((f'i{n}', n % 500, 1, f'item{n}', 'type', now) for n in range(rows)))
+    connection.executemany('INSERT INTO grocery_list_item VALUES (?, ?)',
+                           ((f'l{n // ITEMS_PER_LIST}', f'i{n}') for n in range(rows)))
+    connection.commit()
+    connection.close()
+    return customer_count, list_count
+
+
+def time_loads(engine, model, options, ids):
+    timings = []
+    for record_id in ids:
+        with Session(engine) as session:
+            started = time.perf_counter()
+            session.query(model).options(*options).filter(model.id == record_id).first().as_dict()
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(rows, samples):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'relationship_load.sqlite3')
+        customer_count, list_count = seed(path, rows)
+        engine = create_engine(f'sqlite:///{path}')
+        customer_ids = [f'c{random.randrange(customer_count)}' for _ in range(samples)]
+        list_ids = [f'l{random.randrange(list_count)}' for _ in range(samples)]
+        results = {}
+        for label in ('before', 'after'):
+            if label == 'after':
+                upgrade(engine)
+            results[label] = (time_loads(engine, Customer, CUSTOMER_GRAPH, customer_ids),
+                              time_loads(engine, GroceryList, GROCERY_LIST_GRAPH, list_ids))
+        engine.dispose()
+    for label, (customer_ms, list_ms) in results.items():
+        print(f'{rows:>9} rows {label:<7} customer graph p50 {customer_ms:>9.3f} ms'
+              f'   grocery list p50 {list_ms:>9.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000])
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.samples)
+
+
+if __name__ == '__main__':
+    main()
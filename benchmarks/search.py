@@ -0,0 +1,123 @@
+"""Latency of the grocery item search endpoint on a large catalog.
+
+Seeds ``--items`` grocery items whose names are two to four words drawn from a
+generated vocabulary (word frequencies follow a long tail, like a real
+catalog), then sends ``--queries`` searches through the Flask test client:
+prefixes of 2 to 6 letters of one word, and a whole word followed by a prefix.
+Reports p50 / p99 per query shape after ``--warmup`` untimed searches, for
+the whole request and for its SQL alone (the ``db`` Server-Timing entry).
+``--bm25`` also times ranking every match with FTS5's bm25 (ORDER BY rank)
+instead of the candidate ranking.
+
+Run from the repository root: ``python -m benchmarks.search --items 1000000``
+"""
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from app import create_app
+from benchmarks.__main__ import write_config
+from benchmarks.seed import ITEM_TYPES
+from database import sql_client
+from database.models import GroceryItem, generate_uuid
+from database.search import SEARCH_TABLE, has_search_index, match_expression, query_words
+
+SYLLABLES = ['ba', 'ko', 'mi', 'lu', 'ra', 'te', 'so', 'ne', 'fa', 'di', 'po', 'ge', 'ka', 'zu', 'vi', 'lo', 'ma',
+             'ri', 'tu', 'se', 'chi', 'ken', 'mil', 'bre', 'ad']
+BATCH_SIZE = 10000
+
+
+def vocabulary(rng, size):
+    return sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(size)})
+
+
+def seed(engine, count, words, rng):
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    now = time.time()
+    with engine.begin() as connection:
+        for start in range(0, count, BATCH_SIZE):
+            connection.execute(GroceryItem.__table__.insert(), [
+                {'id': generate_uuid(), 'name': ' '.join(rng.choices(words, weights, k=rng.randint(2, 4))),
+                 'type': rng.choice(ITEM_TYPES), 'price_per_unit': rng.randint(1, 2000), 'quantity': 1,
+                 'created_at': now, 'updated_at': now}
+                for _ in range(min(BATCH_SIZE, count - start))])
+
+
+def queries(words, count, rng):
+    shapes = {f'prefix {length}': [] for length in range(2, 7)}
+    shapes['word + prefix'] = []
+    for _ in range(count):
+        word = rng.choice(words)
+        length = rng.randint(2, 6)
+        shapes[f'prefix {length}'].append(word[:length])
+        shapes['word + prefix'].append(f'{rng.choice(words)} {word[:3]}')
+    return shapes
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def time_endpoint(client, query):
+    # Wall time of the request and the SQL time it reports.
+    started = time.perf_counter()
+    response = client.get('/api/grocery_item/search', query_string={'q': query, 'limit': 20})
+    elapsed = (time.perf_counter() - started) * 1000
+    assert response.status_code == 200, response.get_data(as_text=True)
+    db_time = re.search(r'db;dur=([\d.]+)', response.headers.get('Server-Timing', ''))
+    return elapsed, float(db_time.group(1)) if db_time else 0.0
+
+
+def time_bm25(connection, query):
+    statement = text(f'SELECT grocery_items.* FROM {SEARCH_TABLE} JOIN grocery_items '
+                     f'ON grocery_items.rowid = {SEARCH_TABLE}.rowid WHERE {SEARCH_TABLE} MATCH :match '
+                     f'ORDER BY rank LIMIT 20')
+    started = time.perf_counter()
+    connection.execute(statement, {'match': match_expression(query_words(query))}).fetchall()
+    return (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=6000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--bm25', action='store_true')
+    args = parser.parse_args(argv)
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(write_config(directory))
+        words = vocabulary(rng, args.vocabulary)
+        started = time.perf_counter()
+        seed(sql_client.engine, args.items, words, rng)
+        with sql_client.engine.connect() as connection:
+            backend = 'fts5' if has_search_index(connection) else 'like'
+        print(f'{args.items} items seeded in {time.perf_counter() - started:.1f}s, search backend: {backend}')
+        client = app.test_client()
+        for query in queries(words, args.warmup, random.Random(1))['word + prefix']:
+            time_endpoint(client, query)
+        print(f"{'query':<16}{'p50 ms':>10}{'p99 ms':>10}{'db p50':>10}{'db p99':>10}"
+              + (f"{'bm25 p50':>10}{'bm25 p99':>10}" if args.bm25 else ''))
+        for shape, shape_queries in queries(words, args.queries, rng).items():
+            timings = [time_endpoint(client, query) for query in shape_queries]
+            line = f'{shape:<16}' + ''.join(f'{value:>10.2f}' for value in
+                                            percentiles([timing[0] for timing in timings])
+                                            + percentiles([timing[1] for timing in timings]))
+            if args.bm25 and backend == 'fts5':
+                with sql_client.engine.connect() as connection:
+                    bm25 = [time_bm25(connection, query) for query in shape_queries]
+                line += ''.join(f'{value:>10.2f}' for value in percentiles(bm25))
+            print(line)
+        sql_client.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
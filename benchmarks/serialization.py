@@ -0,0 +1,88 @@
+"""Per-object serialization cost of grocery items.
+
+Seeds ``--items`` grocery items in a throwaway SQLite database and reports, per
+object, the cost of:
+
+* ``reflection``: the previous as_dict(), walking __table__.columns per object
+* ``registry``: as_dict() through the precomputed serializer
+* ``projection``: a ``?fields=id,name,price_per_unit`` plan
+* ``orm load+dump`` / ``core load+dump``: fetching the items and serializing them,
+  as ORM objects through the identity map or as plain Core rows
+
+Run from the repository root: ``python -m benchmarks.serialization --items 10000``
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from database.models import GroceryItem
+from database.serializers import serializer_for
+from database.sql_client import Base
+
+
+def reflection_as_dict(record):
+    return {c.name: getattr(record, c.name) for c in record.__table__.columns}
+
+
+def seed(engine, count):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(GroceryItem.__table__.insert(),
+                           [{'id': f'i{n}', 'price_per_unit': n % 500, 'quantity': 1 + n % 9, 'name': f'item{n}',
+                             'type': 'type', 'created_at': 1000.0 + n, 'updated_at': 1000.0 + n}
+                            for n in range(count)])
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(count, repeat):
+    serializer = serializer_for(GroceryItem)
+    projection = serializer.plan('id,name,price_per_unit')
+    full = serializer.plan()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'serialization.sqlite3')}")
+        seed(engine, count)
+        with Session(engine) as session:
+            items = session.query(GroceryItem).all()
+            results = [
+                ('reflection', best_of(repeat, lambda: [reflection_as_dict(item) for item in items])),
+                ('registry', best_of(repeat, lambda: [item.as_dict() for item in items])),
+                ('projection', best_of(repeat, lambda: [projection.dump(item) for item in items])),
+            ]
+
+        def orm():
+            with Session(engine) as session:
+                [full.dump(item) for item in session.scalars(select(GroceryItem))]
+
+        def core():
+            with engine.connect() as connection:
+                [full.dump_row(row) for row in connection.execute(select(*full.row_columns(GroceryItem.__table__)))]
+
+        results += [('orm load+dump', best_of(repeat, orm)), ('core load+dump', best_of(repeat, core))]
+        engine.dispose()
+    print(f"{'':<16}{'total ms':>10}{'us/object':>11}")
+    for label, seconds in results:
+        print(f'{label:<16}{seconds * 1000:>10.2f}{seconds * 1e6 / count:>11.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    run(args.items, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Write throughput of grocery list POSTs as customers are sharded over more databases.
+
+For each shard count in ``--shards`` a fresh set of SQLite files is seeded with
+``--customers`` customers, spread over the shards by their id. ``--workers``
+processes (standing in for gunicorn workers) then each POST ``--writes``
+grocery lists, with one item each, for random customers through the app, one
+request and commit at a time. Every shard is a file with its own writer lock,
+so writes of customers on different shards no longer wait for each other.
+Reports committed writes per second and the speedup over the first shard
+count, failed writes are requests that did not get a 201 (e.g. "database is
+locked" after the busy timeout).
+
+Run from the repository root: ``python -m benchmarks.sharding --shards 1 2 4 --workers 4``
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app import create_app
+from benchmarks.__main__ import write_config
+from database import sql_client
+from database.models import Customer, generate_uuid
+
+
+def shard_config(directory, shards):
+    path = write_config(directory)
+    uris = [f"sqlite:///{os.path.join(directory, f'shard_{shard}.sqlite3')}?check_same_thread=False"
+            for shard in range(1, shards)]
+    with open(path, 'a') as config:
+        config.write(f"DATABASE_SHARDS = {uris!r}\n")
+    return path
+
+
+def seed(customers):
+    now = time.time()
+    customer_ids = [generate_uuid() for _ in range(customers)]
+    for customer_id in customer_ids:
+        with sql_client.shard_engine(sql_client.shard_for(customer_id)).begin() as connection:
+            connection.execute(Customer.__table__.insert(), [{
+                'id': customer_id, 'username': customer_id, 'password': 'secret', 'email': 'bench@example.com',
+                'address': '1 Main St', 'created_at': now, 'updated_at': now}])
+    return customer_ids
+
+
+def worker(config, customer_ids, writes, seed_value, results):
+    client = create_app(config).test_client()
+    rng = random.Random(seed_value)
+    committed = failed = 0
+    started = time.time()
+    for _ in range(writes):
+        response = client.post('/api/grocery_list', json={
+            'customer_id': rng.choice(customer_ids), 'desired_delivery': started + 3600,
+            'grocery_items': [{'name': 'milk', 'type': 'dairy', 'price_per_unit': 120, 'quantity': 1}]})
+        if response.status_code == 201:
+            committed += 1
+        else:
+            failed += 1
+    results.put((committed, failed, started, time.time()))
+
+
+def run(shards, workers, writes, customers):
+    with tempfile.TemporaryDirectory() as directory:
+        config = shard_config(directory, shards)
+        create_app(config)
+        customer_ids = seed(customers)
+        sql_client.init_shards({})
+        sql_client.engine.dispose()
+        # Spawned, the workers must not share the parent's SQLite connections.
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(config, customer_ids, writes, index, results))
+                     for index in range(workers)]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    # Timed from the first worker's first request, process start up is left out.
+    elapsed = max(total[3] for total in totals) - min(total[2] for total in totals)
+    committed = sum(total[0] for total in totals)
+    return {'shards': shards, 'committed': committed, 'failed': sum(total[1] for total in totals),
+            'seconds': elapsed, 'writes_per_second': committed / elapsed if elapsed else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=200, help='grocery lists posted per worker')
+    parser.add_argument('--customers', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    results = [run(shards, args.workers, args.writes, args.customers) for shards in args.shards]
+    print(f"{'shards':>6}{'committed':>11}{'failed':>8}{'seconds':>9}{'writes/s':>10}{'speedup':>9}")
+    for result in results:
+        speedup = result['writes_per_second'] / results[0]['writes_per_second'] if results[0]['committed'] else 0.0
+        print(f"{result['shards']:>6}{result['committed']:>11}{result['failed']:>8}{result['seconds']:>9.2f}"
+              f"{result['writes_per_second']:>10.0f}{speedup:>8.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Cold start of the application and wall time of the test suite.
+
+Starts ``--runs`` fresh interpreters that import ``app`` and call create_app,
+once against a new database file (schema created) and once against a database
+already at the latest schema version, and reports the import and create_app
+times. ``--tests`` also times ``--test-runs`` runs of the pytest suite. Like the
+main suite, results can be written with ``--output`` and compared against an
+earlier run with ``--baseline``.
+
+Run from the repository root: ``python -m benchmarks.startup --tests --output startup.json``
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.__main__ import git_revision, write_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (time.perf_counter() - imported) * 1000}))
+"""
+
+
+def start(config):
+    completed = subprocess.run([sys.executable, '-c', START, config], cwd=ROOT, capture_output=True, text=True,
+                               check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def measure_starts(runs):
+    samples = {'fresh database': [], 'existing database': []}
+    with tempfile.TemporaryDirectory() as directory:
+        existing = write_config(directory)
+        start(existing)
+        for run in range(runs):
+            fresh_directory = os.path.join(directory, str(run))
+            os.mkdir(fresh_directory)
+            samples['fresh database'].append(start(write_config(fresh_directory)))
+            samples['existing database'].append(start(existing))
+    results = []
+    for name, timings in samples.items():
+        for phase in ('import_ms', 'create_app_ms'):
+            values = [timing[phase] for timing in timings]
+            results.append({'name': f"{name} {phase[:-3]}", 'p50_ms': statistics.median(values),
+                            'max_ms': max(values)})
+    return results
+
+
+def measure_tests(runs):
+    values = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider'], cwd=ROOT,
+                                   capture_output=True, text=True)
+        if completed.returncode:
+            raise SystemExit(f'The test suite failed:\n{completed.stdout}')
+        values.append((time.perf_counter() - started) * 1000)
+    return [{'name': 'test suite', 'p50_ms': statistics.median(values), 'max_ms': max(values)}]
+
+
+def regressions(results, baseline, threshold):
+    previous = {result['name']: result for result in baseline['results']}
+    for result in results:
+        before = previous.get(result['name'])
+        if before and before['p50_ms'] and (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] > threshold:
+            yield result, before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--tests', action='store_true', help='also time the pytest suite')
+    parser.add_argument('--test-runs', type=int, default=3)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='p50 increase reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = measure_starts(args.runs)
+    if args.tests:
+        results += measure_tests(args.test_runs)
+    print(f"{'':<32}{'p50 ms':>10}{'max ms':>10}")
+    for result in results:
+        print(f"{result['name']:<32}{result['p50_ms']:>10.1f}{result['max_ms']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'meta': {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                                'revision': git_revision(), 'python': sys.version.split()[0]},
+                       'results': results}, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = list(regressions(results, json.load(baseline_file), args.threshold))
+        for result, before in found:
+            print(f"REGRESSION {result['name']}: p50 {before['p50_ms']:.1f} ms -> {result['p50_ms']:.1f} ms")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Concurrent write throughput with the default engine and the tuned SQLite profile.
+
+Starts ``--workers`` processes (standing in for gunicorn workers), each running
+``--threads`` threads that insert grocery items one transaction at a time, and
+reports committed writes per second and how many writes failed with
+"database is locked".
+
+Run from the repository root: ``python -m benchmarks.write_concurrency --workers 4 --threads 4``
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from database.migrations import upgrade
+from database.models import GroceryItem, generate_uuid
+from database.sql_client import create_engine_from_config
+
+
+def build_engine(profile, uri):
+    if profile == 'default':
+        return create_engine(uri, connect_args={'check_same_thread': False})
+    return create_engine_from_config({'SQLALCHEMY_DATABASE_URI': uri})
+
+
+def write(engine, writes, counts, lock):
+    committed = locked = 0
+    for _ in range(writes):
+        try:
+            with engine.begin() as connection:
+                connection.execute(GroceryItem.__table__.insert(),
+                                   {'id': generate_uuid(), 'name': 'bench', 'price_per_unit': 1, 'quantity': 1})
+            committed += 1
+        except OperationalError as err:
+            if 'locked' not in str(err):
+                raise
+            locked += 1
+    with lock:
+        counts[0] += committed
+        counts[1] += locked
+
+
+def worker(profile, uri, threads, writes, results):
+    engine = build_engine(profile, uri)
+    counts, lock = [0, 0], threading.Lock()
+    pool = [threading.Thread(target=write, args=(engine, writes, counts, lock)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(tuple(counts))
+
+
+def run(profile, workers, threads, writes):
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{os.path.join(directory, 'write_concurrency.sqlite3')}"
+        upgrade(build_engine(profile, uri))
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(profile, uri, threads, writes, results))
+                     for _ in range(workers)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+    committed = sum(total[0] for total in totals)
+    locked = sum(total[1] for total in totals)
+    print(f'{profile:<8} {committed:>7} committed {locked:>6} locked {elapsed:>7.2f}s '
+          f'{committed / elapsed:>9.0f} writes/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=200, help='writes per thread')
+    args = parser.parse_args()
+    for profile in ('default', 'tuned'):
+        run(profile, args.workers, args.threads, args.writes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from sqlalchemy import Column, Float, Index, Integer, String, Table, delete, event, exists, func, insert, select
+
+from database.sql_client import Base, LazySession, db_session
+
+# Append-only log of committed writes for downstream consumers. Every handler
+# that inserts, changes or deletes customers, grocery lists or grocery items
+# appends one row per record in the transaction of the write, so a change is
+# logged exactly when it commits. seq only grows (AUTOINCREMENT never reuses a
+# number, even after the newest rows are purged) and SQLite's single writer
+# commits rows in seq order, a consumer reading past its last seq misses
+# nothing. Each shard keeps its own log next to its records.
+change_log_table = Table('change_log', Base.metadata,
+                         Column('seq', Integer, primary_key=True),
+                         Column('resource', String(32), nullable=False),
+                         Column('record_id', String, nullable=False),
+                         Column('operation', String(8), nullable=False),
+                         Column('created_at', Float, nullable=False),
+                         Index('ix_change_log_resource_record_id_seq', 'resource', 'record_id', 'seq'),
+                         Index('ix_change_log_created_at', 'created_at'),
+                         sqlite_autoincrement=True)
+# The highest seq dropped by retention. Compaction leaves gaps in seq but keeps
+# the last change of every record, only a cursor below this missed changes.
+change_log_expiry_table = Table('change_log_expiry', Base.metadata,
+                                Column('expired_through', Integer, nullable=False))
+OPERATIONS = ('insert', 'update', 'upsert', 'delete')
+# The resource logged for the rows of each table, used for bulk writes.
+RESOURCE_TABLES = {'customers': 'customer', 'grocery_lists': 'grocery_list', 'grocery_items': 'grocery_item'}
+# Notified after a commit that logged changes, long polls of this process wake up on it.
+logged = threading.Condition()
+
+
+def change_rows(operation, resource, record_ids, now=None):
+    now = now or time.time()
+    return [{'resource': resource, 'record_id': record_id, 'operation': operation, 'created_at': now}
+            for record_id in dict.fromkeys(record_ids) if record_id]
+
+
+def mark_logged():
+    db_session.info['changes_logged'] = True
+
+
+def log_changes(operation, resource, *record_ids):
+    rows = change_rows(operation, resource, record_ids)
+    if rows:
+        db_session.execute(insert(change_log_table), rows)
+        mark_logged()
+
+
+@event.listens_for(LazySession, 'after_commit')
+def notify_readers(session):
+    if session.info.pop('changes_logged', False):
+        with logged:
+            logged.notify_all()
+
+
+@event.listens_for(LazySession, 'after_soft_rollback')
+def forget_logged(session, previous_transaction):
+    session.info.pop('changes_logged', None)
+
+
+def read_changes(after, limit, resources=None):
+    table = change_log_table
+    statement = select(table).where(table.c.seq > after).order_by(table.c.seq).limit(limit)
+    if resources:
+        statement = statement.where(table.c.resource.in_(resources))
+    return db_session.execute(statement).all()
+
+
+def sequence_bounds():
+    # The oldest seq still kept and the newest one, None for an empty log.
+    table = change_log_table
+    return tuple(db_session.execute(select(func.min(table.c.seq), func.max(table.c.seq))).one())
+
+
+def expired_through():
+    return db_session.execute(select(change_log_expiry_table.c.expired_through)).scalar() or 0
+
+
+def purge_changes(retention, compact_after, now=None):
+    # Drops rows older than retention, and rows older than compact_after that
+    # a newer row of the same record supersedes, so a consumer far behind
+    # still gets the last change of every record.
+    now = now or time.time()
+    table = change_log_table
+    newer = table.alias('newer')
+    superseded = exists(select(newer.c.seq).where(newer.c.resource == table.c.resource,
+                                                  newer.c.record_id == table.c.record_id,
+                                                  newer.c.seq > table.c.seq))
+    through = db_session.execute(select(func.max(table.c.seq)).where(table.c.created_at < now - retention)).scalar()
+    if through is not None and through > expired_through():
+        db_session.execute(delete(change_log_expiry_table))
+        db_session.execute(insert(change_log_expiry_table).values(expired_through=through))
+    expired = db_session.execute(delete(table).where(table.c.created_at < now - retention)).rowcount
+    compacted = db_session.execute(delete(table).where(table.c.created_at < now - compact_after, superseded)).rowcount
+    db_session.commit()
+    return expired, compacted
@@ -0,0 +1,34 @@
+from sqlalchemy import delete, select
+
+from database.loaders import chunked
+from database.models import Customer, GroceryItem, GroceryList, grocery_list_item_table
+from database.sql_client import db_session
+
+# Set-based deletes. The ORM cascade loads every child list and its item links
+# and deletes them one row at a time, these run a few DELETE ... WHERE
+# statements in the caller's transaction instead. Association rows go first,
+# then the lists, then the customer, the order the foreign keys need. Items are
+# shared between lists and are never deleted with them, an item deleted on its
+# own takes its links out of every list first.
+
+
+def delete_grocery_lists(list_ids):
+    deleted = 0
+    for chunk in chunked(list_ids):
+        db_session.execute(delete(grocery_list_item_table)
+                           .where(grocery_list_item_table.c.grocery_list_id.in_(chunk)))
+        deleted += db_session.execute(delete(GroceryList.__table__)
+                                      .where(GroceryList.__table__.c.id.in_(chunk))).rowcount
+    return deleted
+
+
+def delete_customer(customer_id):
+    lists = select(GroceryList.id).where(GroceryList.customer_id == customer_id)
+    db_session.execute(delete(grocery_list_item_table).where(grocery_list_item_table.c.grocery_list_id.in_(lists)))
+    db_session.execute(delete(GroceryList.__table__).where(GroceryList.__table__.c.customer_id == customer_id))
+    return db_session.execute(delete(Customer.__table__).where(Customer.__table__.c.id == customer_id)).rowcount
+
+
+def delete_grocery_item(item_id):
+    db_session.execute(delete(grocery_list_item_table).where(grocery_list_item_table.c.grocery_item_id == item_id))
+    return db_session.execute(delete(GroceryItem.__table__).where(GroceryItem.__table__.c.id == item_id)).rowcount
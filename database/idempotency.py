@@ -0,0 +1,83 @@
+import hashlib
+import time
+
+from sqlalchemy import Column, Float, Index, Integer, LargeBinary, String, Table, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database.sql_client import Base, db_session, using_shard
+
+# Responses of POSTs sent with an Idempotency-Key. A row is claimed with an
+# INSERT before the handler runs, the primary key decides which of several
+# concurrent duplicates wins, without any lock held across requests. The row
+# stays pending (no status_code) until the handler's response is stored.
+# Rows expire after their TTL, a pending row whose request died is taken over
+# once it is older than the pending timeout. Keys live on shard 0 whatever
+# shard the request itself is routed to.
+idempotency_key_table = Table('idempotency_keys', Base.metadata,
+                              Column('key', String(255), primary_key=True),
+                              Column('fingerprint', String(32), nullable=False),
+                              Column('status_code', Integer),
+                              Column('body', LargeBinary),
+                              Column('created_at', Float, nullable=False),
+                              Column('expires_at', Float, nullable=False),
+                              Index('ix_idempotency_keys_expires_at', 'expires_at'))
+
+
+def fingerprint(method, path, body):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (method.encode(), path.encode(), body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def pending_since(before):
+    table = idempotency_key_table
+    return table.c.status_code.is_(None) & (table.c.created_at <= before)
+
+
+def claim(key, request_fingerprint, ttl, pending_timeout, now=None):
+    # Returns None when this request owns the key, otherwise the stored row.
+    with using_shard(0):
+        return _claim(key, request_fingerprint, ttl, pending_timeout, now or time.time())
+
+
+def _claim(key, request_fingerprint, ttl, pending_timeout, now):
+    table = idempotency_key_table
+    values = {'fingerprint': request_fingerprint, 'status_code': None, 'body': None, 'created_at': now,
+              'expires_at': now + ttl}
+    try:
+        db_session.execute(insert(table).values(key=key, **values))
+        db_session.commit()
+        return None
+    except IntegrityError:
+        db_session.rollback()
+    abandoned = pending_since(now - pending_timeout)
+    taken_over = db_session.execute(update(table).where(table.c.key == key)
+                                    .where(or_(table.c.expires_at <= now, abandoned)).values(**values)).rowcount
+    db_session.commit()
+    if taken_over:
+        return None
+    return db_session.execute(select(table).where(table.c.key == key)).first()
+
+
+def complete(key, status_code, body):
+    table = idempotency_key_table
+    with using_shard(0):
+        db_session.execute(update(table).where(table.c.key == key).values(status_code=status_code, body=body))
+        db_session.commit()
+
+
+def release(key):
+    db_session.rollback()
+    with using_shard(0):
+        db_session.execute(delete(idempotency_key_table).where(idempotency_key_table.c.key == key))
+        db_session.commit()
+
+
+def purge_expired(now=None):
+    table = idempotency_key_table
+    with using_shard(0):
+        deleted = db_session.execute(delete(table).where(table.c.expires_at <= (now or time.time()))).rowcount
+        db_session.commit()
+    return deleted
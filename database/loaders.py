@@ -0,0 +1,61 @@
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from database.models import Customer, GroceryList, GroceryItem, grocery_list_item_table
+from database.sql_client import db_session
+
+# Eager loading strategies per endpoint. A customer can own many lists, so the
+# lists and their items are each fetched with one extra IN query (selectinload)
+# rather than a join that would multiply the customer row. Grocery lists use
+# selectinload for their items as well: joinedload over the secondary table
+# becomes a LEFT OUTER JOIN against a nested join, which SQLite materializes by
+# scanning all of grocery_list_item.
+CUSTOMER_GRAPH = (selectinload(Customer.grocery_lists).selectinload(GroceryList.grocery_items),)
+GROCERY_LIST_GRAPH = (selectinload(GroceryList.grocery_items),)
+GROCERY_ITEM_GRAPH = ()
+
+
+def _load(model, options, item_id, refresh=False):
+    query = model.query.options(*options).filter(model.id == item_id)
+    if refresh:
+        # Objects are expired on commit, re-populate them in one pass instead of
+        # letting as_dict() lazy load every relationship again.
+        query = query.populate_existing()
+    return query.first()
+
+
+def load_customer(item_id, refresh=False):
+    return _load(Customer, CUSTOMER_GRAPH, item_id, refresh)
+
+
+def load_grocery_list(item_id, refresh=False):
+    return _load(GroceryList, GROCERY_LIST_GRAPH, item_id, refresh)
+
+
+def load_grocery_item(item_id, refresh=False):
+    return _load(GroceryItem, GROCERY_ITEM_GRAPH, item_id, refresh)
+
+
+def chunked(values, size=500):
+    # SQLite limits the number of bound parameters per statement.
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def grocery_list_ids_containing(item_ids):
+    list_ids = set()
+    for chunk in chunked(item_ids):
+        rows = db_session.execute(select(grocery_list_item_table.c.grocery_list_id)
+                                  .where(grocery_list_item_table.c.grocery_item_id.in_(chunk)))
+        list_ids.update(row[0] for row in rows)
+    return list_ids
+
+
+def customer_ids_owning(list_ids):
+    customer_ids = set()
+    for chunk in chunked(list_ids):
+        rows = db_session.execute(select(GroceryList.customer_id)
+                                  .where(GroceryList.id.in_(chunk), GroceryList.customer_id.isnot(None)))
+        customer_ids.update(row[0] for row in rows)
+    return customer_ids
@@ -0,0 +1,146 @@
+import weakref
+
+from sqlalchemy import Column, Integer, Table, inspect, text
+
+
+from database.changes import change_log_expiry_table, change_log_table
+from database.idempotency import idempotency_key_table
+from database.models import grocery_list_item_table
+from database.search import create_search_index
+from database.sql_client import Base
+from database.totals import recompute_statement
+from database.usernames import username_table
+
+# Ordered schema migrations. A fresh database is built by create_all from the
+# current models and stamped with the latest version. An existing database is
+# brought forward by running every migration newer than its stored version,
+# since create_all never alters tables that already exist. A database already
+# at head is left alone after reading its version, without create_all's
+# per-table reflection, and an engine is only checked once per process.
+schema_version_table = Table('schema_version', Base.metadata,
+                             Column('version', Integer, nullable=False))
+
+MIGRATIONS = []
+upgraded_engines = weakref.WeakSet()
+
+
+def migration(version):
+    def register(upgrade):
+        MIGRATIONS.append((version, upgrade))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return upgrade
+    return register
+
+
+def head():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def model_index(name):
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(name)
+
+
+def create_indexes(connection, *names):
+    for name in names:
+        model_index(name).create(connection, checkfirst=True)
+
+
+@migration(1)
+def add_created_at_indexes(connection):
+    create_indexes(connection, 'ix_customers_created_at_id', 'ix_grocery_lists_created_at_id',
+                   'ix_grocery_items_created_at_id')
+
+
+@migration(2)
+def add_relationship_indexes(connection):
+    create_indexes(connection, 'ix_grocery_lists_customer_id_created_at_id', 'ix_grocery_lists_desired_delivery',
+                   'ix_grocery_items_type_created_at_id')
+    if inspect(connection).get_pk_constraint('grocery_list_item')['constrained_columns']:
+        return
+    # Neither SQLite nor a portable ALTER can add a primary key in place, so the
+    # association table is rebuilt. Duplicate and half-empty links are dropped.
+    connection.execute(text('ALTER TABLE grocery_list_item RENAME TO grocery_list_item_old'))
+    grocery_list_item_table.create(connection)
+    connection.execute(text('INSERT INTO grocery_list_item (grocery_list_id, grocery_item_id) '
+                            'SELECT DISTINCT grocery_list_id, grocery_item_id FROM grocery_list_item_old '
+                            'WHERE grocery_list_id IS NOT NULL AND grocery_item_id IS NOT NULL'))
+    connection.execute(text('DROP TABLE grocery_list_item_old'))
+
+
+@migration(3)
+def backfill_list_totals(connection):
+    # total_price used to be whatever the client sent, compute it from the items.
+    connection.execute(recompute_statement())
+
+
+@migration(4)
+def add_search_index(connection):
+    # Skipped where FTS5 is missing, the search then uses LIKE on grocery_items.
+    create_search_index(connection, rebuild=True)
+
+
+@migration(5)
+def add_idempotency_keys(connection):
+    idempotency_key_table.create(connection, checkfirst=True)
+
+
+@migration(6)
+def add_change_log(connection):
+    change_log_table.create(connection, checkfirst=True)
+
+
+@migration(7)
+def add_change_log_expiry(connection):
+    change_log_expiry_table.create(connection, checkfirst=True)
+
+
+@migration(8)
+def add_customer_usernames(connection):
+    # Filled by database.rebalance when customers are spread over shards.
+    username_table.create(connection, checkfirst=True)
+
+
+def current_version(connection):
+    version = connection.execute(schema_version_table.select()).scalar()
+    return version or 0
+
+
+def stamp(connection, version):
+    connection.execute(schema_version_table.delete())
+    connection.execute(schema_version_table.insert().values(version=version))
+
+
+def stored_version(connection):
+    if not inspect(connection).has_table(schema_version_table.name):
+        return None
+    return current_version(connection)
+
+
+def migrate(connection):
+    fresh = not inspect(connection).has_table('customers')
+    Base.metadata.create_all(bind=connection)
+    if fresh:
+        stamp(connection, head())
+        return head()
+    version = current_version(connection)
+    for migration_version, upgrade_schema in MIGRATIONS:
+        if migration_version > version:
+            upgrade_schema(connection)
+            stamp(connection, migration_version)
+            version = migration_version
+    return version
+
+
+def upgrade(engine):
+    if engine in upgraded_engines:
+        return head()
+    with engine.begin() as connection:
+        version = stored_version(connection)
+        if version != head():
+            version = migrate(connection)
+    upgraded_engines.add(engine)
+    return version
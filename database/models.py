@@ -1,13 +1,18 @@
 import uuid
 import time
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 
+from database.serializers import dump, register
 from database.sql_client import Base
 
 def generate_uuid():
     return str(uuid.uuid4())
 
+
+def current_timestamp():
+    return round(time.time())
+
 class Customer(Base):
     __tablename__ = 'customers'
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -15,19 +20,21 @@ class Customer(Base):
     password = Column(String, nullable=False)
     email = Column(String)
     address = Column(String)
-    created_at = Column(Float, default=round(time.time()))
-    updated_at = Column(Float)
+    created_at = Column(Float, default=current_timestamp)
+    updated_at = Column(Float, default=time.time, onupdate=time.time)
     grocery_lists = relationship("GroceryList", cascade='all, delete-orphan')
 
+    __table_args__ = (Index('ix_customers_created_at_id', 'created_at', 'id'),)
+
     def as_dict(self):
-        return {**{c.name: getattr(self, c.name) for c in self.__table__.columns},
-                **{'grocery_lists': [g_list.as_dict() for g_list in self.grocery_lists]}}
+        return dump(self)
 
 
 
 grocery_list_item_table = Table('grocery_list_item', Base.metadata,
-                                Column('grocery_list_id', ForeignKey('grocery_lists.id')),
-                                Column('grocery_item_id', ForeignKey('grocery_items.id')))
+                                Column('grocery_list_id', ForeignKey('grocery_lists.id'), primary_key=True),
+                                Column('grocery_item_id', ForeignKey('grocery_items.id'), primary_key=True),
+                                Index('ix_grocery_list_item_grocery_item_id', 'grocery_item_id'))
 
 
 class GroceryList(Base):
@@ -35,14 +42,17 @@ class GroceryList(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     customer_id = Column(String, ForeignKey('customers.id'))
     desired_delivery = Column(Float)
-    total_price = Column(Integer)
-    created_at = Column(Float, default=round(time.time()))
-    updated_at = Column(Float)
+    total_price = Column(Integer, default=0)
+    created_at = Column(Float, default=current_timestamp)
+    updated_at = Column(Float, default=time.time, onupdate=time.time)
     grocery_items = relationship("GroceryItem", secondary=grocery_list_item_table)
 
+    __table_args__ = (Index('ix_grocery_lists_created_at_id', 'created_at', 'id'),
+                      Index('ix_grocery_lists_customer_id_created_at_id', 'customer_id', 'created_at', 'id'),
+                      Index('ix_grocery_lists_desired_delivery', 'desired_delivery'))
+
     def as_dict(self):
-        return {**{c.name: getattr(self, c.name) for c in self.__table__.columns},
-                **{'grocery_items': [g_item.as_dict() for g_item in self.grocery_items]}}
+        return dump(self)
 
 
 class GroceryItem(Base):
@@ -52,8 +62,16 @@ class GroceryItem(Base):
     quantity = Column(Integer)
     name = Column(String)
     type = Column(String)
-    created_at = Column(Float, default=round(time.time()))
-    updated_at = Column(Float)
+    created_at = Column(Float, default=current_timestamp)
+    updated_at = Column(Float, default=time.time, onupdate=time.time)
+
+    __table_args__ = (Index('ix_grocery_items_created_at_id', 'created_at', 'id'),
+                      Index('ix_grocery_items_type_created_at_id', 'type', 'created_at', 'id'))
 
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return dump(self)
+
+
+register(GroceryItem, 'grocery_item')
+register(GroceryList, 'grocery_list', nested={'grocery_items': GroceryItem})
+register(Customer, 'customer', nested={'grocery_lists': GroceryList})
@@ -0,0 +1,186 @@
+"""Move customers to the shard DATABASE_SHARDS assigns them.
+
+Run offline, with the API stopped, after changing DATABASE_SHARDS: every
+customer found on a shard other than crc32(id) % shard count is copied with
+its grocery lists, their grocery_list_item rows and the items they link to,
+then deleted from where it was. Give shards that were dropped from the list
+with --source, they are emptied. Lists without a customer and items no list
+links to are moved to shard 0 from every other shard. An item linked from
+lists of customers now on different shards is copied to each of them.
+Finally every username is registered in the username directory on shard 0,
+which keeps them unique across shards, usernames held by two customers on
+different shards are reported.
+
+Each batch of customers is committed on its target before it is deleted from
+its source, a run that stopped half way can be started again: rows already
+copied are skipped.
+
+Run from the repository root: ``python -m database.rebalance --config app_config.py --dry-run``
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+from collections import Counter
+
+from flask import Config
+from sqlalchemy import delete, select
+
+from database.loaders import chunked
+from database.migrations import upgrade
+from database.models import Customer, GroceryItem, GroceryList, grocery_list_item_table
+from database.sql_client import create_engine_from_config, shard_of
+from database.usernames import username_table
+
+DEFAULT_BATCH_SIZE = 100
+CONFLICT_DIALECTS = ('sqlite', 'postgresql')
+customers = Customer.__table__
+grocery_lists = GroceryList.__table__
+grocery_items = GroceryItem.__table__
+links = grocery_list_item_table
+usernames = username_table
+
+
+class RebalanceError(Exception):
+    pass
+
+
+def fetch(connection, column, values):
+    rows = []
+    for chunk in chunked(list(values)):
+        rows.extend(dict(row._mapping) for row in connection.execute(select(column.table).where(column.in_(chunk))))
+    return rows
+
+
+def insert_missing(engine, table):
+    # Rows a stopped run already copied are left as they are.
+    dialect = engine.dialect.name
+    if dialect not in CONFLICT_DIALECTS:
+        return table.insert()
+    return importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert(table).on_conflict_do_nothing()
+
+
+def delete_in(connection, column, values):
+    for chunk in chunked(list(values)):
+        connection.execute(delete(column.table).where(column.in_(chunk)))
+
+
+def move(source, target, customer_ids=(), list_ids=(), item_ids=(), dry_run=False):
+    with source.connect() as connection:
+        customer_rows = fetch(connection, customers.c.id, customer_ids)
+        list_rows = fetch(connection, grocery_lists.c.customer_id, customer_ids)
+        list_rows += fetch(connection, grocery_lists.c.id, list_ids)
+        link_rows = fetch(connection, links.c.grocery_list_id, [row['id'] for row in list_rows])
+        item_ids = {row['grocery_item_id'] for row in link_rows} | set(item_ids)
+        item_rows = fetch(connection, grocery_items.c.id, item_ids)
+    moved = Counter(customers=len(customer_rows), grocery_lists=len(list_rows), grocery_items=len(item_rows))
+    if dry_run:
+        return moved
+    with target.begin() as connection:
+        # Parents first, in case the target enforces foreign keys.
+        for table, rows in ((customers, customer_rows), (grocery_items, item_rows), (grocery_lists, list_rows),
+                            (links, link_rows)):
+            if rows:
+                connection.execute(insert_missing(target, table), rows)
+        # A username taken on the target skips the customer, its lists must not be orphaned.
+        found = len(fetch(connection, customers.c.id, customer_ids))
+        if found != len(customer_rows):
+            raise RebalanceError(f"{len(customer_rows) - found} customers could not be copied to {target.url}, "
+                                 f"their usernames are taken there")
+    with source.begin() as connection:
+        delete_in(connection, links.c.grocery_list_id, [row['id'] for row in list_rows])
+        delete_in(connection, grocery_lists.c.id, [row['id'] for row in list_rows])
+        delete_in(connection, customers.c.id, customer_ids)
+        # Items other lists on the source still link to stay there as well.
+        linked = {row['grocery_item_id'] for row in fetch(connection, links.c.grocery_item_id, item_ids)}
+        delete_in(connection, grocery_items.c.id, item_ids - linked)
+    return moved
+
+
+def register_usernames(targets):
+    # Customers written while there was a single shard have no username claim yet.
+    directory, now, taken = targets[0], time.time(), []
+    for target in targets:
+        with target.connect() as connection:
+            rows = [{'username': username, 'customer_id': customer_id, 'claimed_at': now} for customer_id, username
+                    in connection.execute(select(customers.c.id, customers.c.username)
+                                          .where(customers.c.username.isnot(None)))]
+        with directory.begin() as connection:
+            holders = {}
+            for chunk in chunked(rows):
+                connection.execute(insert_missing(directory, usernames), chunk)
+                holders.update(connection.execute(select(usernames.c.username, usernames.c.customer_id).where(
+                    usernames.c.username.in_([row['username'] for row in chunk]))).all())
+        taken += [row['username'] for row in rows if holders[row['username']] != row['customer_id']]
+    if taken:
+        raise RebalanceError(f"{len(taken)} usernames are held by customers on different shards: "
+                             f"{', '.join(sorted(taken)[:10])}")
+
+
+def misplaced(connection, index, shard_total):
+    # Ids of the customers to move off the shard at index, with their target shard.
+    retired = index >= shard_total
+    for customer_id in connection.execute(select(customers.c.id)).scalars():
+        shard = shard_of(customer_id, shard_total)
+        if retired or shard != index:
+            yield customer_id, shard
+
+
+def rebalance(targets, sources=(), batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    # targets are the engines of DATABASE_SHARDS, shard 0 first, sources the
+    # engines of retired shards.
+    moved = Counter()
+    for index, source in enumerate(list(targets) + list(sources)):
+        with source.connect() as connection:
+            groups = {}
+            for customer_id, shard in misplaced(connection, index, len(targets)):
+                groups.setdefault(shard, []).append(customer_id)
+            orphans = items = []
+            if index:
+                orphans = connection.execute(select(grocery_lists.c.id)
+                                             .where(grocery_lists.c.customer_id.is_(None))).scalars().all()
+                items = connection.execute(select(grocery_items.c.id).where(
+                    ~grocery_items.c.id.in_(select(links.c.grocery_item_id)))).scalars().all()
+        for shard, customer_ids in groups.items():
+            for chunk in chunked(customer_ids, batch_size):
+                moved += move(source, targets[shard], customer_ids=chunk, dry_run=dry_run)
+        if orphans or items:
+            moved += move(source, targets[0], list_ids=orphans, item_ids=items, dry_run=dry_run)
+    if len(targets) > 1 and not dry_run:
+        register_usernames(targets)
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='app_config.py', help='app config with the new DATABASE_SHARDS')
+    parser.add_argument('--source', action='append', default=[], help='URI of a retired shard to empty')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='customers moved per commit')
+    parser.add_argument('--dry-run', action='store_true', help='only count what would move')
+    args = parser.parse_args(argv)
+
+    config = Config(os.getcwd())
+    config.from_pyfile(args.config)
+    uris = [config['SQLALCHEMY_DATABASE_URI']] + list(config.get('DATABASE_SHARDS') or ())
+    targets = [create_engine_from_config(dict(config, SQLALCHEMY_DATABASE_URI=uri)) for uri in uris]
+    sources = [create_engine_from_config(dict(config, SQLALCHEMY_DATABASE_URI=uri)) for uri in args.source]
+    try:
+        if not args.dry_run:
+            for engine in targets + sources:
+                upgrade(engine)
+        moved = rebalance(targets, sources, args.batch_size, args.dry_run)
+    except RebalanceError as err:
+        print(err, file=sys.stderr)
+        return 1
+    finally:
+        for engine in targets + sources:
+            engine.dispose()
+    verb = 'Would move' if args.dry_run else 'Moved'
+    print(f"{verb} {moved['customers']} customers, {moved['grocery_lists']} grocery lists and "
+          f"{moved['grocery_items']} grocery items")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
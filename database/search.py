@@ -0,0 +1,174 @@
+import functools
+import re
+import unicodedata
+
+from sqlalchemy import and_, bindparam, case, column, event, func, literal, literal_column, or_, select, table, text
+
+from database.models import GroceryItem
+
+# Catalog search over grocery item names and types. On SQLite builds with FTS5
+# an external content index, grocery_items_fts, is kept in sync by triggers, so
+# every write path (ORM, bulk executemany, upserts, set-based deletes) updates
+# it without the handlers knowing. It is created with grocery_items by
+# create_all and by migration 4 on existing databases. Elsewhere the search
+# falls back to LIKE prefix matches on the table itself.
+#
+# Every query word is a prefix: "org mil" finds "Organic Milk". Matches are
+# read newest first in windows of max_candidates, and each window is ranked by
+# ranked_statement, not by bm25: bm25 needs the document count of every term a
+# prefix expands to, which for a two or three letter prefix means reading most
+# of the index on every keystroke. Pages go through the first window in rank
+# order, then the next one (:candidate_offset), so older matches are reached
+# by paging rather than dropped.
+SEARCH_TABLE = 'grocery_items_fts'
+DEFAULT_MAX_CANDIDATES = 200
+WORD = re.compile(r'\w+')
+
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(name, type, content='grocery_items', "
+    f"content_rowid='rowid', prefix='2 3 4', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS grocery_items_fts_insert AFTER INSERT ON grocery_items BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name, type) VALUES (new.rowid, new.name, new.type); END",
+    f"CREATE TRIGGER IF NOT EXISTS grocery_items_fts_delete AFTER DELETE ON grocery_items BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, type) "
+    f"VALUES ('delete', old.rowid, old.name, old.type); END",
+    f"CREATE TRIGGER IF NOT EXISTS grocery_items_fts_update AFTER UPDATE OF name, type ON grocery_items BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, type) "
+    f"VALUES ('delete', old.rowid, old.name, old.type); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name, type) VALUES (new.rowid, new.name, new.type); END",
+]
+
+search_table = table(SEARCH_TABLE, column('rowid'))
+items_rowid = literal_column('grocery_items.rowid')
+
+
+def fts5_available(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def create_search_index(connection, rebuild=False):
+    if not fts5_available(connection):
+        return False
+    for statement in CREATE_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def has_search_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    return connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                      (SEARCH_TABLE,)).first() is not None
+
+
+@event.listens_for(GroceryItem.__table__, 'after_create')
+def create_search_index_with_table(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(GroceryItem.__table__, 'before_drop')
+def drop_search_index_with_table(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def normalize(value):
+    if value.isascii():
+        return value.lower()
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    return ''.join(character for character in decomposed if not unicodedata.combining(character))
+
+
+def query_words(query):
+    return WORD.findall(normalize(query))
+
+
+def match_expression(words):
+    # Quoted so words like AND, OR or NEAR stay plain terms.
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_parameters(words, limit, offset, candidate_offset=0):
+    # The statements below only depend on the number of words, the words
+    # themselves are bound here.
+    parameters = {'match': match_expression(words), 'starts': f"{escape_like(' '.join(words))}%",
+                  'limit': limit, 'offset': offset, 'candidate_offset': candidate_offset}
+    for index, word in enumerate(words):
+        parameters[f'word_{index}'] = f'% {escape_like(word)} %'
+        parameters[f'prefix_{index}'] = f'% {escape_like(word)}%'
+    return parameters
+
+
+def padded(expression):
+    return literal(' ') + func.lower(expression) + literal(' ')
+
+
+def like(expression, name):
+    return expression.like(bindparam(name), escape='\\')
+
+
+def candidate_statement(columns, word_count, use_index, max_candidates):
+    # The window of max_candidates items matching every word, newest first,
+    # that starts :candidate_offset matches in.
+    items = GroceryItem.__table__
+    if use_index:
+        return (select(*columns).select_from(items.join(search_table, search_table.c.rowid == items_rowid))
+                .where(text(f'{SEARCH_TABLE} MATCH :match'))
+                .order_by(search_table.c.rowid.desc()).limit(max_candidates).offset(bindparam('candidate_offset')))
+    conditions = [or_(like(padded(items.c.name), f'prefix_{index}'), like(padded(items.c.type), f'prefix_{index}'))
+                  for index in range(word_count)]
+    return (select(*columns).where(and_(*conditions))
+            .order_by(items.c.created_at.desc(), items.c.id.desc()).limit(max_candidates)
+            .offset(bindparam('candidate_offset')))
+
+
+def matches(condition):
+    return case((condition, 1), else_=0)
+
+
+def ranked_statement(candidates, word_count):
+    # Ranks the candidates in SQL so only one page reaches Python: names
+    # starting with the query first, then more whole-word matches, then more
+    # words matched in the name rather than the type, then shorter names, then
+    # newer items. lower() only folds ASCII, an unaccented query still finds
+    # accented names through the index but ranks them lower. The ranks are
+    # selected after the columns, for merging pages of several shards.
+    candidates = candidates.subquery()
+    name = padded(candidates.c.name)
+    whole_words = sum(matches(like(name, f'word_{index}')) for index in range(word_count)).label('rank_whole_words')
+    in_name = sum(matches(like(name, f'prefix_{index}')) for index in range(word_count)).label('rank_in_name')
+    starts = matches(like(func.lower(candidates.c.name), 'starts')).label('rank_starts')
+    length = func.coalesce(func.length(candidates.c.name), 0).label('rank_length')
+    return (select(*candidates.c, starts, whole_words, in_name, length)
+            .order_by(starts.desc(), whole_words.desc(), in_name.desc(), length,
+                      candidates.c.created_at.desc(), candidates.c.id.desc())
+            .limit(bindparam('limit')).offset(bindparam('offset')))
+
+
+def window_statement(candidates):
+    # A row when the window at :candidate_offset holds any match.
+    return select(literal(1)).select_from(candidates.subquery()).limit(1)
+
+
+def rank_key(row):
+    # The order of ranked_statement, sorted in reverse. Items without a
+    # created_at come last, as SQLite sorts NULL in a descending order.
+    return (row.rank_starts, row.rank_whole_words, row.rank_in_name, -row.rank_length,
+            row.created_at is not None, row.created_at or 0, row.id)
+
+
+@functools.lru_cache(maxsize=256)
+def search_statements(column_names, word_count, use_index, max_candidates):
+    # Unfiltered searches, the common case, reuse one ranked and one window
+    # statement per shape.
+    columns = [GroceryItem.__table__.c[name] for name in column_names]
+    candidates = candidate_statement(columns, word_count, use_index, max_candidates)
+    return ranked_statement(candidates, word_count), window_statement(candidates)
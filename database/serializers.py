@@ -0,0 +1,186 @@
+import functools
+from operator import attrgetter, itemgetter
+
+# Per model serializers, built once when the models are registered instead of
+# walking __table__.columns for every object. A Plan is the compiled form of a
+# field selection: the column names, getters returning all of them at once and
+# the plans of the nested relationships. Plans for ?fields= selections are
+# cached, so a request only parses its selection the first time it is seen.
+# ?depth= limits how many levels of relationships are expanded, deeper ones
+# are given as lists of ids (a Reference plan).
+SERIALIZERS = {}
+
+
+class ProjectionError(ValueError):
+    pass
+
+
+class Reference:
+    columns = ('id',)
+    nested = ()
+    signature = '#id'
+
+    def dump(self, obj):
+        return obj.id
+
+    def project(self, payload):
+        return payload['id']
+
+
+REFERENCE = Reference()
+
+
+class Plan:
+    def __init__(self, columns, nested, resource=None):
+        self.columns = tuple(columns)
+        self.nested = tuple(nested)
+        self.resource = resource
+        # The same string for every plan selecting the same fields, whatever the query spelled.
+        self.signature = ','.join(self.columns + tuple(f'{name}({plan.signature})' for name, plan in self.nested))
+        if len(self.columns) > 1:
+            self.attributes = attrgetter(*self.columns)
+            self.loaded = itemgetter(*self.columns)
+        elif self.columns:
+            attribute, loaded = attrgetter(self.columns[0]), itemgetter(self.columns[0])
+            self.attributes = lambda obj: (attribute(obj),)
+            self.loaded = lambda state: (loaded(state),)
+        else:
+            self.attributes = self.loaded = lambda obj: ()
+
+    def values(self, obj):
+        # Loaded column values sit in the instance __dict__, reading them there
+        # skips the instrumented attribute. Expired or unloaded columns are not
+        # there and go through the attributes, which load them.
+        try:
+            return self.loaded(obj.__dict__)
+        except KeyError:
+            return self.attributes(obj)
+
+    def dump(self, obj):
+        data = dict(zip(self.columns, self.values(obj)))
+        for name, plan in self.nested:
+            data[name] = [plan.dump(child) for child in getattr(obj, name)]
+        return data
+
+    def dump_row(self, row):
+        # Core rows selected with row_columns(), extra key columns come last.
+        return dict(zip(self.columns, row))
+
+    def project(self, payload):
+        # Same selection applied to an already serialized (cached) document.
+        data = {name: payload[name] for name in self.columns}
+        for name, plan in self.nested:
+            data[name] = [plan.project(child) for child in payload[name]]
+        return data
+
+    def row_columns(self, table, *keys):
+        return [table.c[name] for name in self.columns] + [table.c[key] for key in keys if key not in self.columns]
+
+    def limit(self, depth):
+        if depth <= 0:
+            nested = [(name, REFERENCE) for name, _ in self.nested]
+        else:
+            nested = [(name, plan if plan is REFERENCE else plan.limit(depth - 1)) for name, plan in self.nested]
+        return Plan(self.columns, nested, self.resource)
+
+    def check_normalizable(self):
+        for _, plan in self.nested:
+            if plan is REFERENCE:
+                continue
+            if plan.nested:
+                plan.check_normalizable()
+            elif 'id' not in plan.columns:
+                raise ProjectionError(f"The normalized shape needs the id field of {plan.resource}")
+
+    def normalize(self, payload, included):
+        # Records of leaf resources (no relationships of their own) are moved to
+        # included[resource][id] and referenced by id, so a grocery item in many
+        # lists of a customer is sent once. payload is already projected.
+        data = dict(payload)
+        for name, plan in self.nested:
+            if plan is REFERENCE:
+                continue
+            if plan.nested:
+                data[name] = [plan.normalize(child, included) for child in payload[name]]
+                continue
+            records = included.setdefault(plan.resource, {})
+            for child in payload[name]:
+                records.setdefault(child['id'], child)
+            data[name] = [child['id'] for child in payload[name]]
+        return data
+
+
+class Serializer:
+    def __init__(self, model, resource, nested=None):
+        self.model = model
+        self.resource = resource
+        self.columns = tuple(column.key for column in model.__table__.columns)
+        self.nested = dict(nested or {})
+        self.fields = self.columns + tuple(self.nested)
+        self._full = None
+
+    @property
+    def full(self):
+        # Built on first use, the nested serializers may be registered later.
+        if self._full is None:
+            self._full = Plan(self.columns, [(name, serializer_for(model).full)
+                                             for name, model in self.nested.items()], self.resource)
+        return self._full
+
+    def dump(self, obj):
+        return self.full.dump(obj)
+
+    def plan(self, fields=None, depth=None):
+        if depth is not None:
+            return self._limited(fields or None, depth)
+        if not fields:
+            return self.full
+        return self._plan(fields)
+
+    @functools.lru_cache(maxsize=256)
+    def _limited(self, fields, depth):
+        try:
+            levels = int(depth)
+        except ValueError as err:
+            raise ProjectionError(f"Invalid depth '{depth}'") from err
+        if levels < 0:
+            raise ProjectionError(f"Invalid depth '{depth}'")
+        return self.plan(fields).limit(levels)
+
+    @functools.lru_cache(maxsize=256)
+    def _plan(self, fields):
+        # fields is a comma separated list, nested fields use a dot:
+        # "id,total_price,grocery_items.name". A bare relationship name keeps it whole.
+        selected = {}
+        for field in fields.split(','):
+            name, _, rest = field.strip().partition('.')
+            if name not in self.fields:
+                raise ProjectionError(f"Unknown field '{field.strip()}' for {self.resource}")
+            if name in self.nested and rest:
+                if selected.get(name, []) is not None:
+                    selected.setdefault(name, []).append(rest)
+            elif rest:
+                raise ProjectionError(f"Field '{name}' of {self.resource} has no nested fields")
+            else:
+                selected[name] = None
+        columns = [name for name in self.columns if name in selected]
+        nested = []
+        for name, model in self.nested.items():
+            if name in selected:
+                child = serializer_for(model)
+                nested.append((name, child.full if selected[name] is None else child.plan(','.join(selected[name]))))
+        return Plan(columns, nested, self.resource)
+
+
+def register(model, resource, nested=None):
+    serializer = Serializer(model, resource, nested)
+    SERIALIZERS[model] = SERIALIZERS[resource] = serializer
+    return serializer
+
+
+def serializer_for(model_or_resource):
+    return SERIALIZERS[model_or_resource]
+
+
+def dump(obj):
+    return SERIALIZERS[type(obj)].full.dump(obj)
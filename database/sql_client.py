@@ -1,20 +1,199 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import contextlib
+import contextvars
+import zlib
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+import app_config
+
+
+def config_from_object(obj):
+    return {key: getattr(obj, key) for key in dir(obj) if key.isupper()}
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'check_same_thread': False}
+        if url.database in (None, '', ':memory:'):
+            # Every connection to :memory: is a new empty database, share one.
+            options['poolclass'] = StaticPool
+            return url, options
+        # Keep connections open so the pragmas run once per connection rather
+        # than on every checkout (pysqlite defaults file databases to NullPool).
+        options['poolclass'] = QueuePool
+    else:
+        options['pool_pre_ping'] = True
+    options['pool_size'] = config.get('DATABASE_POOL_SIZE', 5)
+    options['max_overflow'] = config.get('DATABASE_MAX_OVERFLOW', 10)
+    options['pool_timeout'] = config.get('DATABASE_POOL_TIMEOUT', 30)
+    if config.get('DATABASE_POOL_RECYCLE'):
+        options['pool_recycle'] = config['DATABASE_POOL_RECYCLE']
+    return url, options
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    # Run on every new SQLite connection, configs without SQLITE_PRAGMAS get app_config's.
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def create_engine_from_config(config):
+    url, options = engine_options(config)
+    engine = create_engine(url, **options)
+    if url.get_backend_name() == 'sqlite':
+        apply_sqlite_pragmas(engine, config.get('SQLITE_PRAGMAS', app_config.SQLITE_PRAGMAS))
+    return engine
+
+
+# Async drivers used by the ASGI entry point, ASYNC_DATABASE_URI overrides the mapping.
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+
+def async_url(config):
+    if config.get('ASYNC_DATABASE_URI'):
+        return make_url(config['ASYNC_DATABASE_URI'])
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+
+def create_async_engine_from_config(config):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    _, options = engine_options(config)
+    if options.get('poolclass') is QueuePool:
+        options['poolclass'] = AsyncAdaptedQueuePool
+    url = async_url(config)
+    async_engine = create_async_engine(url, **options)
+    if url.get_backend_name() == 'sqlite':
+        apply_sqlite_pragmas(async_engine.sync_engine, config.get('SQLITE_PRAGMAS', app_config.SQLITE_PRAGMAS))
+    return async_engine
+
+
+# Customer sharding. DATABASE_SHARDS lists the URIs of further databases next
+# to SQLALCHEMY_DATABASE_URI, which is shard 0. A customer, its grocery lists,
+# their grocery_list_item rows and the items created with them live on shard
+# crc32(customer id) % shard count. Records without a customer (lists created
+# without one, items created on their own) and the idempotency keys live on
+# shard 0. The session runs every statement on the shard in current_shard,
+# which the request hooks in rest_api/sharding.py set from the URL or payload.
+# Work spread over all shards (collections, aggregates) runs once per shard
+# through each_shard(). A session that used several shards commits each of
+# them on its own, a commit is only atomic within one shard.
+current_shard = contextvars.ContextVar('current_shard', default=0)
+extra_shards = []
+
+
+def shard_count():
+    return 1 + len(extra_shards)
+
+
+def shard_of(customer_id, count):
+    if customer_id is None or count == 1:
+        return 0
+    return zlib.crc32(str(customer_id).encode()) % count
 
-from app_config import SQLALCHEMY_DATABASE_URI
 
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
-db_session = scoped_session(sessionmaker(autocommit=False,
-                                         autoflush=False,
-                                         bind=engine))
+def shard_for(customer_id):
+    return shard_of(customer_id, shard_count())
+
+
+def shard_engine(shard):
+    return extra_shards[shard - 1] if shard else get_engine()
+
+
+def route_to(shard):
+    # For the rest of the request, request teardown goes back to shard 0.
+    current_shard.set(shard)
+
+
+@contextlib.contextmanager
+def using_shard(shard):
+    token = current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        current_shard.reset(token)
+
+
+def each_shard():
+    for shard in range(shard_count()):
+        with using_shard(shard):
+            yield shard
+
+
+class LazySession(Session):
+    # Binds to the default engine on first use when init_engine has not bound
+    # one. Statements run on the engine of the current shard.
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = current_shard.get()
+        if shard:
+            return extra_shards[shard - 1]
+        if self.bind is None:
+            self.bind = get_engine()
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+db_session = scoped_session(sessionmaker(class_=LazySession,
+                                         autocommit=False,
+                                         autoflush=False))
 Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+def __getattr__(name):
+    # The engine is built on first use: create_app builds it from its own
+    # config, anything else touching sql_client.engine first gets app_config's.
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def get_engine():
+    return globals().get('engine') or init_engine(config_from_object(app_config))
+
+
+def init_engine(config):
+    # Binds the session to the database named by an application's config.
+    global engine
+    current = globals().get('engine')
+    if current is None or current.url != make_url(config['SQLALCHEMY_DATABASE_URI']):
+        db_session.remove()
+        if current is not None:
+            current.dispose()
+        engine = create_engine_from_config(config)
+        db_session.configure(bind=engine)
+    init_shards(config)
+    return engine
+
+
+def init_shards(config):
+    urls = [make_url(uri) for uri in config.get('DATABASE_SHARDS') or ()]
+    if [shard.url for shard in extra_shards] == urls:
+        return
+    db_session.remove()
+    for shard in extra_shards:
+        shard.dispose()
+    extra_shards[:] = [create_engine_from_config(dict(config, SQLALCHEMY_DATABASE_URI=str(url))) for url in urls]
+
+
 def init_db():
     # import all modules here that might define models so that
     # they will be registered properly on the metadata.  Otherwise
     # you will have to import them first before calling init_db()
     import database.models
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    import database.idempotency
+    import database.changes
+    from database.migrations import upgrade
+    upgrade(get_engine())
+    for shard in extra_shards:
+        upgrade(shard)
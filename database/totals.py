@@ -0,0 +1,58 @@
+from sqlalchemy import func, select, update
+
+from database.loaders import chunked
+from database.models import GroceryItem, GroceryList, grocery_list_item_table
+from database.sql_client import db_session
+
+# GroceryList.total_price is owned by the server: the sum of price_per_unit *
+# quantity over the list's items. Handlers apply the change in a single UPDATE
+# when they know it (an item added, removed or repriced) and fall back to a
+# recompute from the association table when they do not (bulk upserts).
+line_total_expression = func.coalesce(GroceryItem.price_per_unit, 0) * func.coalesce(GroceryItem.quantity, 0)
+
+
+def line_total(price_per_unit, quantity):
+    return (price_per_unit or 0) * (quantity or 0)
+
+
+def items_total(grocery_items):
+    return sum(line_total(item.price_per_unit, item.quantity) for item in grocery_items)
+
+
+def computed_total():
+    return (select(func.coalesce(func.sum(line_total_expression), 0))
+            .select_from(grocery_list_item_table.join(GroceryItem.__table__))
+            .where(grocery_list_item_table.c.grocery_list_id == GroceryList.__table__.c.id)
+            .scalar_subquery())
+
+
+def recompute_statement(list_ids=None):
+    statement = update(GroceryList.__table__).values(total_price=computed_total())
+    if list_ids is not None:
+        statement = statement.where(GroceryList.__table__.c.id.in_(list_ids))
+    return statement
+
+
+def recompute_list_totals(list_ids):
+    for chunk in chunked(list_ids):
+        db_session.execute(recompute_statement(chunk))
+
+
+def adjust_list_totals(list_ids, delta):
+    if not delta:
+        return
+    table = GroceryList.__table__
+    for chunk in chunked(list_ids):
+        db_session.execute(update(table).where(table.c.id.in_(chunk))
+                           .values(total_price=func.coalesce(table.c.total_price, 0) + delta))
+
+
+def adjust_totals_containing(item_id, delta):
+    # One UPDATE for every list holding the item, whatever their number.
+    if not delta:
+        return
+    table = GroceryList.__table__
+    containing = (select(grocery_list_item_table.c.grocery_list_id)
+                  .where(grocery_list_item_table.c.grocery_item_id == item_id))
+    db_session.execute(update(table).where(table.c.id.in_(containing))
+                       .values(total_price=func.coalesce(table.c.total_price, 0) + delta))
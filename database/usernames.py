@@ -0,0 +1,69 @@
+import time
+
+from sqlalchemy import Column, Float, String, Table, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database.models import Customer
+from database.sql_client import Base, db_session, shard_count, shard_for, using_shard
+
+# Which customer holds each username once customers are spread over shards, the
+# unique constraint on customers.username only sees one shard. A username is
+# claimed here on shard 0 with an INSERT before the customer is written to its
+# own shard, the primary key decides between concurrent claims. A claim whose
+# customer never got (or no longer has) the username, because its write failed
+# or the process died before the commit, is taken over once it is older than
+# the claim timeout. With one shard the constraint on customers is enough and
+# nothing is claimed.
+DEFAULT_CLAIM_TIMEOUT = 60
+username_table = Table('customer_usernames', Base.metadata,
+                       Column('username', String, primary_key=True),
+                       Column('customer_id', String, nullable=False),
+                       Column('claimed_at', Float, nullable=False))
+
+
+def holds_username(customer_id, username):
+    with using_shard(shard_for(customer_id)):
+        return db_session.query(Customer.id).filter(Customer.id == customer_id,
+                                                    Customer.username == username).first() is not None
+
+
+def claim_username(username, customer_id, timeout=DEFAULT_CLAIM_TIMEOUT, now=None):
+    # Returns False when another customer holds the username.
+    if username is None or shard_count() == 1:
+        return True
+    with using_shard(0):
+        return _claim_username(username, customer_id, timeout, now or time.time())
+
+
+def _claim_username(username, customer_id, timeout, now):
+    table = username_table
+    try:
+        db_session.execute(insert(table).values(username=username, customer_id=customer_id, claimed_at=now))
+        db_session.commit()
+        return True
+    except IntegrityError:
+        db_session.rollback()
+    row = db_session.execute(select(table).where(table.c.username == username)).first()
+    if row is None:
+        # Released in between, claimed again.
+        return _claim_username(username, customer_id, timeout, now)
+    if row.customer_id == customer_id:
+        return True
+    if row.claimed_at > now - timeout or holds_username(row.customer_id, username):
+        return False
+    # Only the claim that was looked at is replaced, a concurrent takeover wins.
+    taken_over = db_session.execute(update(table).where(table.c.username == username)
+                                    .where(table.c.customer_id == row.customer_id)
+                                    .values(customer_id=customer_id, claimed_at=now)).rowcount
+    db_session.commit()
+    return bool(taken_over)
+
+
+def release_username(username, customer_id):
+    if username is None or shard_count() == 1:
+        return
+    table = username_table
+    with using_shard(0):
+        db_session.execute(delete(table).where(table.c.username == username)
+                           .where(table.c.customer_id == customer_id))
+        db_session.commit()
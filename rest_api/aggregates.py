@@ -0,0 +1,82 @@
+from flask import jsonify, make_response, request
+from flask.views import MethodView
+from sqlalchemy import desc, func, select
+
+from database.models import GroceryItem, GroceryList, grocery_list_item_table
+from database.sql_client import db_session, each_shard, shard_count
+from database.totals import line_total_expression
+from rest_api.grocery_lists import SingleGroceryListAPI
+from rest_api.pagination import PaginationError, apply_filters, page_size
+
+
+class AggregateAPI(MethodView):
+    # Each report is one GROUP BY over rows, no ORM objects are built. The list
+    # filters (customer_id, delivery_after, delivery_before) pick the lists
+    # that count, so a window over desired_delivery uses its index. With
+    # several shards each one is grouped on its own and combine() merges their
+    # rows in the order of the statement.
+    filters = SingleGroceryListAPI.filters
+    # Whether a group only ever has rows on one shard, each shard's first rows
+    # are then enough for the page.
+    disjoint_groups = True
+
+    def statement(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def combine(rows):
+        raise NotImplementedError
+
+    def get(self):
+        try:
+            statement = apply_filters(self.statement(), self.filters, request.args)
+            limit = page_size(request.args)
+        except PaginationError as err:
+            return make_response((jsonify(status="error", data=str(err)), 400))
+        if shard_count() == 1:
+            data = [dict(row._mapping) for row in db_session.execute(statement.limit(limit))]
+        else:
+            if self.disjoint_groups:
+                statement = statement.limit(limit)
+            data = self.combine([dict(row._mapping) for _ in each_shard() for row in db_session.execute(statement)])
+        return make_response((jsonify(status="success", data=data[:limit]), 200))
+
+
+class CustomerSpendAPI(AggregateAPI):
+
+    def statement(self):
+        spend = func.coalesce(func.sum(GroceryList.total_price), 0).label('total_spend')
+        return (select(GroceryList.customer_id, func.count(GroceryList.id).label('grocery_lists'), spend)
+                .where(GroceryList.customer_id.isnot(None))
+                .group_by(GroceryList.customer_id)
+                .order_by(desc('total_spend'), GroceryList.customer_id))
+
+    @staticmethod
+    def combine(rows):
+        # A customer's lists share its shard.
+        return sorted(rows, key=lambda row: (-row['total_spend'], row['customer_id']))
+
+
+class RevenueByTypeAPI(AggregateAPI):
+    disjoint_groups = False
+
+    def statement(self):
+        revenue = func.coalesce(func.sum(line_total_expression), 0).label('revenue')
+        return (select(GroceryItem.type, revenue,
+                       func.coalesce(func.sum(GroceryItem.quantity), 0).label('quantity'),
+                       func.count(func.distinct(GroceryList.id)).label('grocery_lists'))
+                .select_from(GroceryList.__table__.join(grocery_list_item_table).join(GroceryItem.__table__))
+                .group_by(GroceryItem.type)
+                .order_by(desc('revenue'), GroceryItem.type))
+
+    @staticmethod
+    def combine(rows):
+        # Every shard has rows of the same types, a list is only counted on its own shard.
+        totals = {}
+        for row in rows:
+            total = totals.setdefault(row['type'], {'type': row['type'], 'revenue': 0, 'quantity': 0,
+                                                    'grocery_lists': 0})
+            for key in ('revenue', 'quantity', 'grocery_lists'):
+                total[key] += row[key]
+        # Items without a type sort first, as NULL does in SQLite.
+        return sorted(totals.values(), key=lambda row: (-row['revenue'], row['type'] is not None, row['type'] or ''))
@@ -0,0 +1,91 @@
+from flask import request
+from sqlalchemy import select
+
+from database.loaders import CUSTOMER_GRAPH, GROCERY_ITEM_GRAPH, GROCERY_LIST_GRAPH
+from database.models import Customer, GroceryItem, GroceryList
+from rest_api.cache import cache_key, get_cache
+from database.serializers import ProjectionError
+from rest_api.conditional import (is_conditional, not_found_response, payload_response, record_plan,
+                                  unchanged_response)
+from rest_api.customers import SingleCustomerAPI
+from rest_api.grocery_items import SingleGroceryItemAPI
+from rest_api.grocery_lists import SingleGroceryListAPI
+from rest_api.multi_get import (MultiGetError, cached_payloads, load_statements, multi_get_response,
+                                requested_ids, store)
+from rest_api.pagination import (PaginationError, collection_statement, error_response, fetch_page, page_data,
+                                 page_response)
+
+# Awaitable versions of the GET views for asgi.py. They run inside a Flask
+# request context, so request, the record cache and the response helpers are
+# the ones the sync views use, only the database round trips are awaited.
+RESOURCES = {
+    'customer': (Customer, CUSTOMER_GRAPH, SingleCustomerAPI.filters),
+    'grocery_list': (GroceryList, GROCERY_LIST_GRAPH, SingleGroceryListAPI.filters),
+    'grocery_item': (GroceryItem, GROCERY_ITEM_GRAPH, SingleGroceryItemAPI.filters),
+}
+
+
+async def record_version(session, model, item_id):
+    row = (await session.execute(select(model.updated_at, model.created_at).where(model.id == item_id))).first()
+    if row is None:
+        return None
+    return row[0] or row[1] or 0
+
+
+async def record_response(session_factory, resource, item_id):
+    model, options, _ = RESOURCES[resource]
+    try:
+        plan = record_plan(resource)
+    except ProjectionError as err:
+        return error_response(err)
+    cache = get_cache()
+    key = cache_key(resource, item_id)
+    generation = cache.generation(key)
+    payload = cache.get(key)
+    if payload is None:
+        async with session_factory() as session:
+            if is_conditional():
+                version = await record_version(session, model, item_id)
+                response = unchanged_response(resource, item_id, version, plan)
+                if response is not None:
+                    return response
+            result = await session.execute(select(model).options(*options).where(model.id == item_id))
+            record = result.scalars().first()
+            if record is None:
+                return not_found_response(item_id)
+            payload = record.as_dict()
+        cache.set(key, payload, generation)
+    return payload_response(resource, item_id, payload, plan)
+
+
+async def collection_response(session_factory, resource, args):
+    model, options, filters = RESOURCES[resource]
+    try:
+        statement, size, plan = collection_statement(model, options, filters, args)
+    except (PaginationError, ProjectionError) as err:
+        return error_response(err)
+    async with session_factory() as session:
+        return page_response(*page_data([fetch_page(await session.execute(statement), plan)], size, plan))
+
+
+async def multi_get(session_factory, resource, ids):
+    model, options, _ = RESOURCES[resource]
+    try:
+        ids = requested_ids(ids)
+        plan = record_plan(resource)
+    except (MultiGetError, ProjectionError) as err:
+        return error_response(err)
+    payloads, misses = cached_payloads(resource, ids)
+    if misses:
+        async with session_factory() as session:
+            for statement in load_statements(model, options, misses):
+                store(resource, payloads, (await session.execute(statement)).scalars(), misses)
+    return multi_get_response(ids, payloads, plan)
+
+
+async def get(session_factory, resource, item_id=None):
+    if not item_id and 'ids' in request.args:
+        return await multi_get(session_factory, resource, request.args['ids'])
+    if not item_id:
+        return await collection_response(session_factory, resource, request.args)
+    return await record_response(session_factory, resource, item_id)
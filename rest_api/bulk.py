@@ -0,0 +1,197 @@
+import importlib
+import json
+import time
+
+from flask import current_app, jsonify, make_response
+from flask import json as app_json
+from sqlalchemy.exc import IntegrityError
+
+from database.changes import RESOURCE_TABLES, change_log_table, change_rows, mark_logged
+from database.models import current_timestamp, generate_uuid
+from database.sql_client import current_shard, db_session, shard_count, shard_for, using_shard
+
+DEFAULT_BATCH_SIZE = 1000
+# Imported on first use, loading the postgresql dialect costs every SQLite start ~30ms.
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+class BulkPayloadError(ValueError):
+    pass
+
+
+def parse_records(request):
+    # A JSON array or NDJSON (one object per line). NDJSON lines are parsed on
+    # their own so one malformed line only fails that row.
+    body = request.get_data().strip()
+    if not body:
+        raise BulkPayloadError("Payload was empty")
+    if body[:1] == b'[':
+        try:
+            return app_json.loads(body)
+        except json.JSONDecodeError as err:
+            raise BulkPayloadError(f"JSON parse error: {err}") from err
+    records = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(app_json.loads(line))
+        except json.JSONDecodeError as err:
+            records.append(BulkPayloadError(f"JSON parse error: {err}"))
+    return records
+
+
+def batch_size(args):
+    size = args.get('batch_size', current_app.config.get('BULK_INSERT_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    try:
+        size = int(size)
+    except ValueError as err:
+        raise BulkPayloadError(f"Invalid batch_size '{size}'") from err
+    if size < 1:
+        raise BulkPayloadError(f"Invalid batch_size '{size}'")
+    return size
+
+
+def prepare_row(table, record, required_fields=(), nested=()):
+    # executemany compiles one statement from the first row, so every row gets
+    # every column. Defaults are filled in here since an explicit None would
+    # otherwise be inserted as NULL.
+    if isinstance(record, BulkPayloadError):
+        raise record
+    if not isinstance(record, dict):
+        raise BulkPayloadError("Record is not a JSON object")
+    unknown = set(record) - set(table.columns.keys()) - set(nested)
+    if unknown:
+        raise BulkPayloadError(f"Record has unknown fields: {', '.join(sorted(unknown))}")
+    if required_fields and not any([record.get(key) for key in required_fields]):
+        raise BulkPayloadError(f"Record was missing one or more required fields: {', '.join(required_fields)}")
+    row = {column: record.get(column) for column in table.columns.keys()}
+    row['id'] = row['id'] or generate_uuid()
+    row['created_at'] = row['created_at'] or current_timestamp()
+    row['updated_at'] = time.time()
+    return row
+
+
+def insert_statement(table, upsert):
+    if not upsert or table is change_log_table:
+        return table.insert()
+    dialect = db_session.get_bind().dialect.name
+    if dialect not in UPSERT_DIALECTS:
+        raise BulkPayloadError(f"Upsert is not supported on '{dialect}'")
+    statement = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert(table)
+    if 'id' not in table.c:
+        # Association rows are all key, one that already exists is left as is.
+        return statement.on_conflict_do_nothing()
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: statement.excluded[name] for name in table.columns.keys() if name != 'id'})
+
+
+def execute_rows(rows_per_record, statements):
+    # One executemany per table, in the order the tables first appear so parents
+    # are written before the association rows that point at them.
+    rows_per_table = {}
+    for rows in rows_per_record:
+        for table, row in rows:
+            rows_per_table.setdefault(table, []).append(row)
+    for table, rows in rows_per_table.items():
+        db_session.execute(statements[table], rows)
+    if change_log_table in rows_per_table:
+        mark_logged()
+
+
+def logged_rows(rows, operation):
+    # rows with a change log row for each customer, list and item they write,
+    # committed in their batch.
+    return rows + [(change_log_table, change) for table, row in rows if table.name in RESOURCE_TABLES
+                   for change in change_rows(operation, RESOURCE_TABLES[table.name], [row['id']])]
+
+
+def bulk_insert(records, prepare, size, upsert=False):
+    """Insert records in batches of ``size`` and return one result per record.
+
+    ``prepare`` turns a record into ``(id, [(table, row), ...])`` or raises
+    BulkPayloadError. Each batch is committed on its own. A batch rejected by the
+    database is replayed one record per transaction so the rest of it still lands.
+    """
+    results = [None] * len(records)
+    prepared = []
+    for index, record in enumerate(records):
+        try:
+            record_id, rows = prepare(record)
+        except BulkPayloadError as err:
+            results[index] = {'index': index, 'status': 'error', 'message': str(err)}
+            continue
+        prepared.append((index, record_id, logged_rows(rows, 'upsert' if upsert else 'insert')))
+
+    statements = {}
+    for _, _, rows in prepared:
+        for table, _ in rows:
+            if table not in statements:
+                statements[table] = insert_statement(table, upsert)
+
+    for start in range(0, len(prepared), size):
+        batch = prepared[start:start + size]
+        try:
+            execute_rows([rows for _, _, rows in batch], statements)
+            db_session.commit()
+            failures = {}
+        except IntegrityError:
+            db_session.rollback()
+            failures = {}
+            for index, _, rows in batch:
+                try:
+                    execute_rows([rows], statements)
+                    db_session.commit()
+                except IntegrityError as err:
+                    db_session.rollback()
+                    failures[index] = str(err.orig)
+        for index, record_id, _ in batch:
+            if index in failures:
+                results[index] = {'index': index, 'status': 'error', 'message': failures[index]}
+            else:
+                results[index] = {'index': index, 'status': 'success', 'id': record_id}
+    return results
+
+
+def bulk_response(results):
+    inserted = sum(1 for result in results if result['status'] == 'success')
+    return make_response((jsonify(status="success" if inserted else "error", inserted=inserted,
+                                  failed=len(results) - inserted, data=results), 201 if inserted else 400))
+
+
+def shard_groups(records, shard_key):
+    # The indexes of the records to write on each shard.
+    if shard_key is None or shard_count() == 1:
+        return {current_shard.get(): list(range(len(records)))}
+    groups = {}
+    for index, record in enumerate(records):
+        groups.setdefault(shard_for(shard_key(record) if isinstance(record, dict) else None), []).append(index)
+    return groups
+
+
+def bulk_request(request, prepare, changes=None, shard_key=None):
+    # shard_key(record) gives the customer id whose shard a record is written to.
+    try:
+        records = parse_records(request)
+        if not isinstance(records, list):
+            raise BulkPayloadError("Payload must be a JSON array or NDJSON")
+        size = batch_size(request.args)
+        upsert = request.args.get('upsert', '').lower() in ('1', 'true', 'yes')
+        results = [None] * len(records)
+        for shard, indexes in shard_groups(records, shard_key).items():
+            with using_shard(shard):
+                group = [records[index] for index in indexes]
+                group_results = bulk_insert(group, prepare, size, upsert)
+                if changes:
+                    # Touched after the rows are committed, batches commit on their own.
+                    write_set = changes(group, group_results, upsert)
+                    write_set.touch()
+                    db_session.commit()
+                    write_set.invalidate()
+            for index, result in zip(indexes, group_results):
+                result['index'] = index
+                results[index] = result
+        return bulk_response(results)
+    except BulkPayloadError as err:
+        return make_response((jsonify(status="error", data=str(err)), 406))
@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 300
+# Invalidation counters of LRUCache, keys share one when their hashes collide.
+GENERATION_STRIPES = 4096
+
+
+class CacheBackend:
+    # Stores the serialized as_dict() payload of single records by key. A reader
+    # takes generation(key) before it loads the record and passes it to set(),
+    # which drops the value when delete() invalidated the key in between: the
+    # load may have read the record from before the write.
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def generation(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, generation=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+
+    def get(self, key):
+        return None
+
+    def generation(self, key):
+        return None
+
+    def set(self, key, value, generation=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'null'}
+
+
+class LRUCache(CacheBackend):
+    # In-process cache, private to each worker. Entries written by another
+    # worker process only disappear once their TTL runs out, use SharedCache
+    # when several workers serve the same database. max_bytes also bounds the
+    # summed len() of the values, for caches of bytes, a larger value is not
+    # kept at all.
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, clock=time.monotonic, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.generations = [0] * GENERATION_STRIPES
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                self.remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key):
+        return self.generations[hash(key) % GENERATION_STRIPES]
+
+    def set(self, key, value, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.generation(key):
+                return
+            self.remove(key)
+            if self.max_bytes is not None:
+                if len(value) > self.max_bytes:
+                    return
+                self.bytes += len(value)
+            self.entries[key] = (self.clock() + self.ttl, value)
+            while len(self.entries) > self.max_entries or self.max_bytes is not None and self.bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        # Called with the lock held.
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.max_bytes is not None:
+            self.bytes -= len(entry[1])
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.remove(key)
+                self.generations[hash(key) % GENERATION_STRIPES] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.generations = [generation + 1 for generation in self.generations]
+
+    def stats(self):
+        return {'backend': 'lru', 'entries': len(self.entries), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations}
+
+
+class SharedCache(CacheBackend):
+    # Cache kept in a shared store so every worker sees the same entries and
+    # invalidations. The client only needs get/set(ex=)/delete/incr/expire like
+    # redis-py, tests pass a local stand-in. Evictions happen inside the store,
+    # so only hits and misses are counted here. A key's generation is a counter
+    # next to it, bumped before the key is deleted. set() checks it again after
+    # writing, so an invalidation between the check and the write still
+    # removes the value.
+
+    def __init__(self, client, ttl=DEFAULT_TTL, prefix='grocery:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def generation_key(self, key):
+        return f'{self.prefix}generation:{key}'
+
+    def generation(self, key):
+        return int(self.client.get(self.generation_key(key)) or 0)
+
+    def set(self, key, value, generation=None):
+        if generation is not None and generation != self.generation(key):
+            return
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        if generation is not None and generation != self.generation(key):
+            self.client.delete(self.prefix + key)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.client.incr(self.generation_key(key))
+            self.client.expire(self.generation_key(key), self.ttl)
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return {'backend': 'shared', 'hits': self.hits, 'misses': self.misses, 'evictions': None}
+
+
+def create_cache(config):
+    backend = config.get('CACHE_BACKEND', 'lru')
+    ttl = config.get('CACHE_TTL', DEFAULT_TTL)
+    if backend == 'lru':
+        return LRUCache(config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES), ttl)
+    if backend == 'redis':
+        import redis
+        return SharedCache(redis.Redis.from_url(config['CACHE_URL']), ttl)
+    if backend in (None, 'null'):
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+
+
+def init_cache(app):
+    app.extensions['record_cache'] = create_cache(app.config)
+
+
+def get_cache():
+    return current_app.extensions['record_cache']
+
+
+def cache_key(resource, record_id):
+    return f'{resource}:{record_id}'
+
+
+def invalidate(keys):
+    if keys:
+        get_cache().delete(*keys)
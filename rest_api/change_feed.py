@@ -0,0 +1,182 @@
+import heapq
+import itertools
+import time
+
+from flask import Response, current_app, jsonify, make_response, request, stream_with_context
+from flask import json as app_json
+from flask.views import MethodView
+
+from database.changes import expired_through, logged, purge_changes, read_changes, sequence_bounds
+from database.sql_client import db_session, each_shard, shard_count
+
+# GET /api/changes serves the change log (database/changes.py) from a cursor:
+# the seq last read on each shard, joined by '.'. A consumer starts without
+# one (the whole log) or with ?after=latest (only what comes next) and sends
+# the returned cursor with its next request. ?limit= caps a batch,
+# ?resource= picks resources. Empty batches are held for up to ?wait= seconds
+# (long poll), woken by commits of this process and re-read every
+# CHANGE_FEED_POLL_INTERVAL for writes of other processes. With
+# Accept: text/event-stream the batches are sent as Server-Sent Events for
+# CHANGE_FEED_STREAM_SECONDS, each with the cursor as its id, so a
+# reconnecting EventSource resumes from Last-Event-ID. Rows past retention or
+# compaction are purged every CHANGE_FEED_PURGE_EVERY requests. A consumer
+# whose cursor points before rows dropped by retention gets truncated: true
+# once, with the cursor moved past them, and so does a consumer reading from
+# the start of a log that retention already cut. It missed changes and should
+# resync from the main routes if it needs them. Compacted rows only leave
+# gaps, the last change of each record is still read. A cursor taken with a
+# different number of shards is also truncated: new shards are read from
+# their start, positions on shards that were removed are dropped.
+DEFAULT_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1000
+DEFAULT_MAX_WAIT = 30
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_STREAM_SECONDS = 300
+DEFAULT_HEARTBEAT_SECONDS = 15
+DEFAULT_RETENTION = 7 * 86400
+DEFAULT_COMPACT_AFTER = 3600
+DEFAULT_PURGE_EVERY = 1000
+RESOURCES = ('customer', 'grocery_list', 'grocery_item')
+
+requests_served = itertools.count(1)
+
+
+class ChangeFeedError(ValueError):
+    pass
+
+
+def latest_cursor():
+    offsets = []
+    for _ in each_shard():
+        # Past the rows dropped by retention even when none are left.
+        offsets.append(max(sequence_bounds()[1] or 0, expired_through()))
+    db_session.rollback()
+    return offsets
+
+
+def parse_cursor(value):
+    # The offsets per shard, and whether the cursor was taken with another shard count.
+    count = shard_count()
+    if not value:
+        return [0] * count, False
+    if value == 'latest':
+        return latest_cursor(), False
+    try:
+        offsets = [int(part) for part in value.split('.')]
+    except ValueError as err:
+        raise ChangeFeedError(f"Invalid cursor '{value}'") from err
+    if min(offsets) < 0:
+        raise ChangeFeedError(f"Invalid cursor '{value}'")
+    return (offsets + [0] * count)[:count], len(offsets) != count
+
+
+def encode_cursor(offsets):
+    return '.'.join(str(offset) for offset in offsets)
+
+
+def number_arg(args, name, default, maximum):
+    try:
+        value = float(args.get(name, default))
+    except ValueError as err:
+        raise ChangeFeedError(f"Invalid {name} '{args.get(name)}'") from err
+    if value < 0 or value != value:
+        raise ChangeFeedError(f"Invalid {name} '{args.get(name)}'")
+    return min(value, maximum)
+
+
+def feed_args(args):
+    limit = int(number_arg(args, 'limit', DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE))
+    if limit < 1:
+        raise ChangeFeedError(f"Invalid limit '{args.get('limit')}'")
+    resources = [resource for resource in args.get('resource', '').split(',') if resource]
+    unknown = set(resources) - set(RESOURCES)
+    if unknown:
+        raise ChangeFeedError(f"Unknown resource '{sorted(unknown)[0]}', use one of {', '.join(RESOURCES)}")
+    wait = number_arg(args, 'wait', 0, current_app.config.get('CHANGE_FEED_MAX_WAIT', DEFAULT_MAX_WAIT))
+    return limit, resources, wait
+
+
+def change_event(row):
+    return {'seq': row.seq, 'resource': row.resource, 'id': row.record_id, 'operation': row.operation,
+            'at': row.created_at}
+
+
+def read_batch(offsets, limit, resources, truncated=False):
+    # Every shard's next rows merged by time. Each shard's rows stay in seq
+    # order, so the cursor moves to the last one taken from each.
+    per_shard, offsets = [], list(offsets)
+    for shard in each_shard():
+        expired = expired_through()
+        if offsets[shard] < expired:
+            truncated, offsets[shard] = True, expired
+        rows = read_changes(offsets[shard], limit, resources)
+        per_shard.append([(row.created_at, shard, row) for row in rows])
+    # Ends the read transactions, a later read sees newer commits.
+    db_session.rollback()
+    events = []
+    for _, shard, row in itertools.islice(heapq.merge(*per_shard, key=lambda entry: entry[:2]), limit):
+        offsets[shard] = row.seq
+        events.append(change_event(row))
+    return events, offsets, truncated
+
+
+def wait_for_batch(offsets, limit, resources, wait, poll_interval, truncated=False):
+    deadline = time.monotonic() + wait
+    while True:
+        events, offsets, truncated = read_batch(offsets, limit, resources, truncated)
+        remaining = deadline - time.monotonic()
+        if events or truncated or remaining <= 0:
+            return events, offsets, truncated
+        with logged:
+            logged.wait(min(poll_interval, remaining))
+
+
+def purge(config):
+    if next(requests_served) % config.get('CHANGE_FEED_PURGE_EVERY', DEFAULT_PURGE_EVERY) == 0:
+        for _ in each_shard():
+            purge_changes(config.get('CHANGE_LOG_RETENTION', DEFAULT_RETENTION),
+                          config.get('CHANGE_LOG_COMPACT_AFTER', DEFAULT_COMPACT_AFTER))
+
+
+def event_stream(offsets, limit, resources, config, truncated=False):
+    poll_interval = config.get('CHANGE_FEED_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    heartbeat = config.get('CHANGE_FEED_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+    deadline = time.monotonic() + config.get('CHANGE_FEED_STREAM_SECONDS', DEFAULT_STREAM_SECONDS)
+    yield f'retry: {int(poll_interval * 1000)}\n\n'
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events, offsets, truncated = wait_for_batch(offsets, limit, resources, min(heartbeat, remaining),
+                                                    poll_interval, truncated)
+        if events or truncated:
+            data = app_json.dumps({'data': events, 'cursor': encode_cursor(offsets), 'truncated': truncated})
+            yield f'id: {encode_cursor(offsets)}\nevent: changes\ndata: {data}\n\n'
+            truncated = False
+        else:
+            # Keeps proxies from closing an idle stream.
+            yield ': keepalive\n\n'
+
+
+class ChangeFeedAPI(MethodView):
+
+    def get(self):
+        config = current_app.config
+        try:
+            limit, resources, wait = feed_args(request.args)
+            # A reconnecting EventSource repeats its first URL, its position is only in Last-Event-ID.
+            offsets, truncated = parse_cursor(request.headers.get('Last-Event-ID') or request.args.get('after'))
+        except ChangeFeedError as err:
+            return make_response((jsonify(status="error", data=str(err)), 400))
+        purge(config)
+        if request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream':
+            response = Response(stream_with_context(event_stream(offsets, limit, resources, config, truncated)),
+                                mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+        events, offsets, truncated = wait_for_batch(offsets, limit, resources, wait,
+                                                    config.get('CHANGE_FEED_POLL_INTERVAL', DEFAULT_POLL_INTERVAL),
+                                                    truncated)
+        return make_response((jsonify(status="success", data=events, cursor=encode_cursor(offsets),
+                                      truncated=truncated), 200))
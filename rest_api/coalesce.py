@@ -0,0 +1,107 @@
+import threading
+import time
+
+from flask import current_app
+
+from database.sql_client import db_session
+
+# Write coalescing for PATCHes of a hot record, enabled by setting
+# PATCH_COALESCE_WINDOW_MS. The first PATCH of a record opens a batch and waits
+# out the window, PATCHes of the same record arriving meanwhile join it. That
+# first request then applies every payload of the batch in arrival order and
+# commits them in one transaction, after the previous batch of the record was
+# committed. Every request of the batch answers once that commit returned, so
+# an acknowledged PATCH is durable and a crash before the commit only loses
+# PATCHes nobody got an answer for. When the batch fails as a whole its
+# payloads are applied again one transaction each, so one bad payload only
+# fails its own request. Batches are per process, several worker processes
+# each coalesce their own requests.
+
+
+class Batch:
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.payloads = []
+        self.results = []
+        self.done = threading.Event()
+
+
+class PatchCoalescer:
+    # wait(window) keeps a batch open, tests pass one that waits for their
+    # requests to join instead of for the clock.
+
+    def __init__(self, window, wait=time.sleep):
+        self.window = window
+        self.wait = wait
+        self.lock = threading.Lock()
+        self.open = {}
+        self.last = {}
+        self.batches = self.patches = 0
+
+    def submit(self, key, payload, apply):
+        # apply(payloads) writes and commits the payloads of one batch.
+        with self.lock:
+            batch = self.open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self.open[key] = self.last[key] = Batch(self.last.get(key))
+            index = len(batch.payloads)
+            batch.payloads.append(payload)
+        if leader:
+            self.flush(key, batch, apply)
+        else:
+            batch.done.wait()
+        outcome, value = batch.results[index]
+        if outcome == 'error':
+            raise value
+        return value
+
+    def flush(self, key, batch, apply):
+        try:
+            self.wait(self.window)
+            with self.lock:
+                del self.open[key]
+            if batch.previous:
+                batch.previous.done.wait()
+            batch.results = self.apply(batch.payloads, apply)
+        except BaseException as err:
+            batch.results = [('error', err)] * len(batch.payloads)
+            raise
+        finally:
+            with self.lock:
+                self.batches += 1
+                self.patches += len(batch.payloads)
+                if self.last.get(key) is batch:
+                    del self.last[key]
+            batch.previous = None
+            batch.done.set()
+
+    @staticmethod
+    def apply(payloads, apply):
+        try:
+            return [('success', apply(payloads))] * len(payloads)
+        except Exception as err:
+            db_session.rollback()
+            if len(payloads) == 1:
+                return [('error', err)]
+        results = []
+        for payload in payloads:
+            try:
+                results.append(('success', apply([payload])))
+            except Exception as err:
+                db_session.rollback()
+                results.append(('error', err))
+        return results
+
+    def stats(self):
+        return {'window_ms': self.window * 1000, 'batches': self.batches, 'patches': self.patches}
+
+
+def init_coalescing(app):
+    window_ms = app.config.get('PATCH_COALESCE_WINDOW_MS', 0)
+    app.extensions['patch_coalescer'] = PatchCoalescer(window_ms / 1000) if window_ms else None
+
+
+def get_coalescer():
+    return current_app.extensions.get('patch_coalescer')
@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+
+from flask import request
+
+from rest_api.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Response compression negotiated from Accept-Encoding. gzip is always there,
+# br and zstd when the brotli / zstandard packages are installed. The encoding
+# with the highest q the client sends wins, ties go to COMPRESSION_ENCODINGS
+# order. Bodies under COMPRESSION_MIN_SIZE bytes and streamed responses (the
+# NDJSON export) are sent as they are. A compressed response turns its ETag
+# into a weak one, the bytes differ per encoding while the record is the same.
+# Compressed bodies are kept in a small LRU keyed by a digest of the body and
+# the encoding, so repeated GETs of a large cached document compress it once.
+# The LRU is bounded by COMPRESSION_CACHE_BYTES of compressed bodies as well
+# as by its entry count, large collection pages would pin memory otherwise.
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_ENCODINGS = ('zstd', 'br', 'gzip')
+DEFAULT_CACHE_ENTRIES = 256
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+COMPRESSORS = {'gzip': lambda data: gzip.compress(data, compresslevel=6, mtime=0)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data: brotli.compress(data, quality=5)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+
+
+class Compression:
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, encodings=DEFAULT_ENCODINGS, cache_entries=DEFAULT_CACHE_ENTRIES,
+                 cache_bytes=DEFAULT_CACHE_BYTES):
+        self.min_size = min_size
+        self.encodings = [encoding for encoding in encodings if encoding in COMPRESSORS]
+        self.cache = LRUCache(cache_entries, ttl=3600, max_bytes=cache_bytes) if cache_entries else None
+
+    def negotiate(self, accept_encodings):
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, encoding, data):
+        if self.cache is None:
+            return COMPRESSORS[encoding](data)
+        key = f'{encoding}:{hashlib.blake2b(data, digest_size=16).hexdigest()}'
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = COMPRESSORS[encoding](data)
+            self.cache.set(key, compressed)
+        return compressed
+
+    def after_request(self, response):
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if not response.mimetype or not response.mimetype.startswith(COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < self.min_size:
+            return response
+        response.set_data(self.compress(encoding, data))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def create_compression(config):
+    encodings = config.get('COMPRESSION_ENCODINGS', DEFAULT_ENCODINGS)
+    unknown = set(encodings) - {'gzip', 'br', 'zstd'}
+    if unknown:
+        raise ValueError(f"Unknown COMPRESSION_ENCODINGS {', '.join(sorted(unknown))}")
+    return Compression(config.get('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE), encodings,
+                       config.get('COMPRESSION_CACHE_ENTRIES', DEFAULT_CACHE_ENTRIES),
+                       config.get('COMPRESSION_CACHE_BYTES', DEFAULT_CACHE_BYTES))
+
+
+def init_compression(app):
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+    compression = app.extensions['compression'] = create_compression(app.config)
+    app.after_request(compression.after_request)
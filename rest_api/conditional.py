@@ -0,0 +1,138 @@
+import hashlib
+
+from flask import jsonify, make_response, request
+
+from database.serializers import ProjectionError, serializer_for
+from database.sql_client import db_session
+from rest_api.cache import cache_key, get_cache
+from rest_api.pagination import error_response
+
+
+def record_version(model, item_id):
+    row = db_session.query(model.updated_at, model.created_at).filter(model.id == item_id).first()
+    if row is None:
+        return None
+    return row[0] or row[1] or 0
+
+
+def payload_version(payload):
+    return payload.get('updated_at') or payload.get('created_at') or 0
+
+
+def record_etag(resource, item_id, version, plan=None):
+    # Each representation of a record gets its own ETag, a client holding the
+    # ?fields=id document must not get a 304 for the full one. The full nested
+    # document keeps the ETag of the record alone.
+    representation = representation_of(plan)
+    return hashlib.sha1(f'{resource}:{item_id}:{version!r}{representation}'.encode()).hexdigest()
+
+
+def is_conditional():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def not_modified(etag, version):
+    if request.if_none_match:
+        # Weak comparison, compressed responses carry the ETag as a weak one.
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return int(version) <= request.if_modified_since.timestamp()
+    return False
+
+
+def not_modified_response(etag, version):
+    response = make_response(('', 304))
+    response.set_etag(etag)
+    response.last_modified = version
+    return response
+
+
+def unchanged_response(resource, item_id, version, plan=None):
+    # 304 for a conditional request whose validators still match, else None.
+    if version is not None and not_modified(record_etag(resource, item_id, version, plan), version):
+        return not_modified_response(record_etag(resource, item_id, version, plan), version)
+    return None
+
+
+def not_found_response(item_id):
+    return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
+
+
+def normalized_shape():
+    # ?shape=normalized sends each grocery item once under "included" and
+    # references it by id from the lists, instead of repeating it in every list.
+    shape = request.args.get('shape', 'nested')
+    if shape not in ('nested', 'normalized'):
+        raise ProjectionError(f"Unknown shape '{shape}'")
+    return shape == 'normalized'
+
+
+def representation_of(plan):
+    normalized = normalized_shape()
+    if plan is None or (plan is serializer_for(plan.resource).full and not normalized):
+        return ''
+    return f":{plan.signature}:{'normalized' if normalized else 'nested'}"
+
+
+def record_plan(resource):
+    plan = serializer_for(resource).plan(request.args.get('fields'), request.args.get('depth'))
+    if normalized_shape():
+        plan.check_normalizable()
+    return plan
+
+
+def shaped(plan, payloads):
+    # The data of cached documents cut to the plan, plus the extra fields of the
+    # response. Without a selection the cached documents are sent as they are.
+    if plan is serializer_for(plan.resource).full:
+        data = list(payloads)
+    else:
+        data = [plan.project(payload) for payload in payloads]
+    if not normalized_shape():
+        return data, {}
+    included = {}
+    return [plan.normalize(record, included) for record in data], {'included': included}
+
+
+def payload_response(resource, item_id, payload, plan=None):
+    # The cache keeps the full document, a ?fields= or ?depth= selection is cut from it.
+    version = payload_version(payload)
+    etag = record_etag(resource, item_id, version, plan)
+    if not_modified(etag, version):
+        return not_modified_response(etag, version)
+    extra = {}
+    if plan is None:
+        data = payload
+    else:
+        [data], extra = shaped(plan, [payload])
+    response = make_response((jsonify(status='success', message=f"Record with id '{item_id}' was found",
+                                      data=data, **extra), 200))
+    response.set_etag(etag)
+    response.last_modified = version
+    return response
+
+
+def record_response(resource, model, load, item_id):
+    # GET for a single record with ETag / Last-Modified validators taken from
+    # updated_at. A conditional request that misses the cache is answered from
+    # the updated_at column alone, without loading or serializing the graph.
+    try:
+        plan = record_plan(resource)
+    except ProjectionError as err:
+        return error_response(err)
+    cache = get_cache()
+    key = cache_key(resource, item_id)
+    # Taken before the first read, a write invalidating the key after it keeps this load out of the cache.
+    generation = cache.generation(key)
+    payload = cache.get(key)
+    if payload is None and is_conditional():
+        response = unchanged_response(resource, item_id, record_version(model, item_id), plan)
+        if response is not None:
+            return response
+    if payload is None:
+        record = load(item_id)
+        if record is None:
+            return not_found_response(item_id)
+        payload = record.as_dict()
+        cache.set(key, payload, generation)
+    return payload_response(resource, item_id, payload, plan)
@@ -1,26 +1,50 @@
 import json
 
-from flask import make_response, jsonify, request
+from flask import Response, current_app, make_response, jsonify, request, stream_with_context
+from flask import json as app_json
 from flask.views import MethodView
 
-from database.models import Customer, GroceryList
-from database.sql_client import db_session
+from database.changes import log_changes
+from database.deletes import delete_customer
+from database.loaders import CUSTOMER_GRAPH, GROCERY_LIST_GRAPH, load_customer
+from database.models import Customer, GroceryList, generate_uuid
+from database.serializers import serializer_for
+from database.sql_client import db_session, route_to, shard_for
+from database.usernames import claim_username, release_username
+from rest_api.conditional import record_response
+from rest_api.delivery_slots import reschedule, unschedule
+from rest_api.idempotency import idempotent
+from rest_api.multi_get import multi_get
+from rest_api.pagination import collection_response
 from rest_api.utils import verify_and_pull_json
+from rest_api.writes import WriteSet
+
+
+def without_total(grocery_list):
+    # Lists created here have no items yet, their total starts at 0.
+    return {key: value for key, value in grocery_list.items() if key != 'total_price'}
+
+
+def username_taken(username):
+    return make_response((jsonify(status="error", data=f"Username '{username}' is already taken"), 409))
 
 
 class SingleCustomerAPI(MethodView):
     required_fields = ['username', 'password']
-    fields = Customer().as_dict().keys()
+    fields = serializer_for(Customer).fields
+    filters = {
+        'username': lambda value: Customer.username == value,
+        'email': lambda value: Customer.email == value,
+    }
 
     def get(self, item_id=None):
+        if not item_id and 'ids' in request.args:
+            return multi_get('customer', Customer, CUSTOMER_GRAPH, request.args['ids'])
         if not item_id:
-            return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = Customer.query.filter(Customer.id == item_id).first()
-        if not item:
-            return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was found",
-                                      data=item.as_dict()), 204))
+            return collection_response(Customer, CUSTOMER_GRAPH, self.filters, request.args)
+        return record_response('customer', Customer, load_customer, item_id)
 
+    @idempotent
     def post(self):
         status, payload = verify_and_pull_json(request)
         if status != 'success':
@@ -31,19 +55,38 @@ class SingleCustomerAPI(MethodView):
                                                              f"{', '.join(self.required_fields)}"), 404))
         docs = payload.pop('grocery_lists')
         customer = Customer(**payload)
+        # The id is the shard key, the customer and its lists are written to its shard.
+        customer.id = customer.id or generate_uuid()
+        # Usernames are claimed on shard 0 first, they are unique across shards.
+        username = customer.username
+        if not claim_username(username, customer.id):
+            return username_taken(username)
+        route_to(shard_for(customer.id))
+        grocery_lists = []
         if docs:
-            grocery_lists = [GroceryList(**grocery_list) for grocery_list in
+            grocery_lists = [GroceryList(**without_total(grocery_list)) for grocery_list in
                              docs or []]
             customer.grocery_lists = grocery_lists
         db_session.add(customer)
-        db_session.commit()
+        try:
+            db_session.flush()
+            scheduled = [(grocery_list.id, grocery_list.desired_delivery) for grocery_list in grocery_lists]
+            log_changes('insert', 'customer', customer.id)
+            log_changes('insert', 'grocery_list', *[list_id for list_id, _ in scheduled])
+            db_session.commit()
+        except BaseException:
+            db_session.rollback()
+            release_username(username, customer.id)
+            raise
+        for list_id, delivery in scheduled:
+            reschedule(list_id, delivery)
         return make_response(
             (jsonify(status="success", data=f"Record inserted with this id: {customer.id}"), 201))
 
     def patch(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = Customer.query.filter(Customer.id == item_id).first()
+        item = load_customer(item_id)
         if not item:
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
         status, payload = verify_and_pull_json(request)
@@ -54,23 +97,75 @@ class SingleCustomerAPI(MethodView):
         if not contains_data_in_any_field:
             return make_response((jsonify(status="error", data=f"Payload had no data to patch requested record "
                                                                f"'{item_id}' with"), 404))
+        username, renamed = item.username, payload.get('username') and payload['username'] != item.username
+        if renamed and not claim_username(payload['username'], item_id):
+            return username_taken(payload['username'])
+        added = []
         for key in self.fields:
             if key == 'grocery_lists' and payload.get(key):
-                item.grocery_lists.extend([GroceryList(**grocery_list) for grocery_list in
-                                           payload.get('grocery_lists', []) or []])
+                added = [GroceryList(**without_total(grocery_list)) for grocery_list in
+                         payload.get('grocery_lists', []) or []]
+                item.grocery_lists.extend(added)
             elif payload.get(key):
                 setattr(item, key, payload.get(key))
-        db_session.commit()
+        changes = WriteSet().add_customers(item_id)
+        try:
+            db_session.flush()
+            log_changes('update', 'customer', item_id)
+            log_changes('insert', 'grocery_list', *[grocery_list.id for grocery_list in added])
+            item.updated_at = changes.touch()
+            db_session.commit()
+        except BaseException:
+            db_session.rollback()
+            if renamed:
+                release_username(payload['username'], item_id)
+            raise
+        changes.invalidate()
+        if renamed:
+            release_username(username, item_id)
+        item = load_customer(item_id, refresh=True)
+        for grocery_list in added:
+            reschedule(grocery_list.id, grocery_list.desired_delivery)
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was patched",
                                       data=item.as_dict()), 204))
 
     def delete(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = Customer.query.filter(Customer.id == item_id).first()
-        if not item:
+        found = db_session.query(Customer.id, Customer.username).filter(Customer.id == item_id).first()
+        if not found:
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        item.delete()
+        list_ids = [row[0] for row in db_session.query(GroceryList.id).filter(GroceryList.customer_id == item_id)]
+        changes = WriteSet().add_customers(item_id)
+        changes.ids['grocery_list'].update(list_ids)
+        delete_customer(item_id)
+        log_changes('delete', 'customer', item_id)
+        log_changes('delete', 'grocery_list', *list_ids)
         db_session.commit()
+        changes.invalidate()
+        release_username(found.username, item_id)
+        unschedule(*list_ids)
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was deleted",
-                                      data=item.as_dict()), 204))
+                                      data={'id': item_id, 'grocery_lists': list_ids}), 204))
+
+
+class CustomerExportAPI(MethodView):
+    default_batch_size = 200
+
+    def get(self, item_id):
+        if not db_session.query(Customer.id).filter(Customer.id == item_id).first():
+            return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', self.default_batch_size)
+        # yield_per keeps only one batch of lists (and their items, loaded per
+        # batch by selectinload) alive at a time instead of the whole history.
+        query = (GroceryList.query.options(*GROCERY_LIST_GRAPH)
+                 .filter(GroceryList.customer_id == item_id)
+                 .order_by(GroceryList.created_at, GroceryList.id)
+                 .execution_options(stream_results=True)
+                 .yield_per(batch_size))
+
+        def generate():
+            for grocery_list in query:
+                yield app_json.dumps(grocery_list.as_dict()) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
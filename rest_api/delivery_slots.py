@@ -0,0 +1,208 @@
+import bisect
+import math
+import threading
+import time
+from operator import itemgetter
+
+from flask import current_app, jsonify, make_response, request
+from flask.views import MethodView
+from sqlalchemy import select
+
+from database.models import GroceryList
+from database.sql_client import db_session, each_shard
+from rest_api.pagination import error_response
+
+# Scheduled grocery lists by delivery slot, for dispatch asking "what is due
+# in the next 30 minutes". The index keeps every list with a desired_delivery
+# in buckets of DELIVERY_SLOT_SECONDS, each holding its delivery times and list
+# ids sorted by time, so a window reads whole buckets and bisects the two at
+# its edges. It is loaded from grocery_lists on the first query and then kept
+# current by the handlers that create, reschedule or delete lists after their
+# commit. The index is per process: writes made by other workers only show up
+# after DELIVERY_INDEX_MAX_AGE seconds, when it is loaded again (0 never does).
+DEFAULT_SLOT_SECONDS = 900
+DEFAULT_WINDOW_SECONDS = 1800
+MAX_SLOTS = 1000
+
+
+class SlotQueryError(ValueError):
+    pass
+
+
+class DeliverySlotIndex:
+
+    def __init__(self, slot_seconds=DEFAULT_SLOT_SECONDS, max_age=0, clock=time.monotonic):
+        self.slot_seconds = slot_seconds
+        self.max_age = max_age
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.buckets = {}
+        self.deliveries = {}
+        self.loaded_at = None
+
+    def bucket_of(self, delivery):
+        return math.floor(delivery / self.slot_seconds)
+
+    def load(self, rows):
+        # rows are (list id, desired_delivery) pairs, in any order. Buckets are
+        # cut from the sorted times with bisect rather than row by row.
+        with self.lock:
+            rows = sorted(rows, key=itemgetter(1))
+            times = [delivery for _, delivery in rows]
+            ids = [list_id for list_id, _ in rows]
+            self.buckets = {}
+            start = 0
+            while start < len(times):
+                bucket = self.bucket_of(times[start])
+                end = bisect.bisect_left(times, (bucket + 1) * self.slot_seconds, start)
+                # Keep the cut consistent with bucket_of where float division rounds.
+                while end < len(times) and self.bucket_of(times[end]) == bucket:
+                    end += 1
+                while end > start + 1 and self.bucket_of(times[end - 1]) != bucket:
+                    end -= 1
+                self.buckets[bucket] = (times[start:end], ids[start:end])
+                start = end
+            self.deliveries = dict(zip(ids, times))
+            self.loaded_at = self.clock()
+
+    def stale(self):
+        return self.loaded_at is None or bool(self.max_age) and self.clock() - self.loaded_at > self.max_age
+
+    def set(self, list_id, delivery):
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            self._remove(list_id)
+            if delivery is None:
+                return
+            delivery = float(delivery)
+            times, ids = self.buckets.setdefault(self.bucket_of(delivery), ([], []))
+            position = bisect.bisect_right(times, delivery)
+            times.insert(position, delivery)
+            ids.insert(position, list_id)
+            self.deliveries[list_id] = delivery
+
+    def discard(self, *list_ids):
+        with self.lock:
+            for list_id in list_ids:
+                self._remove(list_id)
+
+    def _remove(self, list_id):
+        delivery = self.deliveries.pop(list_id, None)
+        if delivery is None:
+            return
+        bucket = self.bucket_of(delivery)
+        times, ids = self.buckets[bucket]
+        position = bisect.bisect_left(times, delivery)
+        while ids[position] != list_id:
+            position += 1
+        del times[position]
+        del ids[position]
+        if not times:
+            del self.buckets[bucket]
+
+    def window(self, start, end, slot_seconds, with_ids=True):
+        # Slots of slot_seconds (a multiple of the bucket size) aligned to the
+        # epoch, covering [start, end). Only deliveries inside the window count.
+        first, last = math.floor(start / slot_seconds), math.ceil(end / slot_seconds)
+        slots = {number: {'start': number * slot_seconds, 'end': (number + 1) * slot_seconds, 'count': 0}
+                 for number in range(first, last)}
+        if with_ids:
+            for slot in slots.values():
+                slot['grocery_list_ids'] = []
+        per_slot = slot_seconds // self.slot_seconds
+        with self.lock:
+            for bucket in range(self.bucket_of(start), math.ceil(end / self.slot_seconds)):
+                entry = self.buckets.get(bucket)
+                if entry is None:
+                    continue
+                times, ids = entry
+                low = bisect.bisect_left(times, start) if times[0] < start else 0
+                high = bisect.bisect_left(times, end) if times[-1] >= end else len(times)
+                if low >= high:
+                    continue
+                slot = slots[bucket // per_slot]
+                slot['count'] += high - low
+                if with_ids:
+                    slot['grocery_list_ids'].extend(ids[low:high])
+        return list(slots.values())
+
+    def __len__(self):
+        return len(self.deliveries)
+
+
+def scheduled_lists():
+    table = GroceryList.__table__
+    statement = select(table.c.id, table.c.desired_delivery).where(table.c.desired_delivery.isnot(None))
+    return [row for _ in each_shard() for row in db_session.execute(statement)]
+
+
+def init_delivery_slots(app):
+    app.extensions['delivery_slots'] = DeliverySlotIndex(app.config.get('DELIVERY_SLOT_SECONDS', DEFAULT_SLOT_SECONDS),
+                                                         app.config.get('DELIVERY_INDEX_MAX_AGE', 0))
+
+
+def get_slot_index():
+    index = current_app.extensions['delivery_slots']
+    if index.stale():
+        with index.lock:
+            if index.stale():
+                index.load(scheduled_lists())
+    return index
+
+
+def reschedule(list_id, delivery):
+    current_app.extensions['delivery_slots'].set(list_id, delivery)
+
+
+def unschedule(*list_ids):
+    current_app.extensions['delivery_slots'].discard(*list_ids)
+
+
+def number_arg(args, name, default):
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise SlotQueryError(f"{name} must be a number, got '{value}'")
+    if not math.isfinite(number):
+        raise SlotQueryError(f"{name} must be a finite number, got '{value}'")
+    return number
+
+
+def window_args(args, bucket_seconds):
+    start = number_arg(args, 'from', time.time())
+    end = number_arg(args, 'to', start + DEFAULT_WINDOW_SECONDS)
+    slot_seconds = number_arg(args, 'slot_seconds', bucket_seconds)
+    if end <= start:
+        raise SlotQueryError("to must be after from")
+    if slot_seconds <= 0 or slot_seconds % bucket_seconds:
+        raise SlotQueryError(f"slot_seconds must be a positive multiple of {bucket_seconds}")
+    slot_seconds = int(slot_seconds)
+    if math.ceil(end / slot_seconds) - math.floor(start / slot_seconds) > MAX_SLOTS:
+        raise SlotQueryError(f"A window can hold at most {MAX_SLOTS} slots")
+    return start, end, slot_seconds
+
+
+class DeliverySlotAPI(MethodView):
+    # GET /api/grocery_list/slots?from=&to=&slot_seconds=: the lists due in
+    # [from, to) grouped by slot, by default the next 30 minutes in slots of
+    # DELIVERY_SLOT_SECONDS. counts_only=true leaves out the list ids, and
+    # DELIVERY_SLOT_CAPACITY adds the number of deliveries each slot has left.
+
+    def get(self):
+        index = get_slot_index()
+        try:
+            start, end, slot_seconds = window_args(request.args, index.slot_seconds)
+        except SlotQueryError as err:
+            return error_response(err)
+        slots = index.window(start, end, slot_seconds, with_ids=request.args.get('counts_only') != 'true')
+        capacity = current_app.config.get('DELIVERY_SLOT_CAPACITY')
+        if capacity:
+            per_slot = capacity * slot_seconds // index.slot_seconds
+            for slot in slots:
+                slot['remaining'] = per_slot - slot['count']
+        return make_response((jsonify(status='success', data={'from': start, 'to': end, 'slot_seconds': slot_seconds,
+                                                               'slots': slots}), 200))
@@ -1,25 +1,44 @@
 import json
 
-from flask import make_response, jsonify, request
+from flask import current_app, make_response, jsonify, request
 from flask.views import MethodView
 
+from database.changes import log_changes
+from database.deletes import delete_grocery_item
+from database.loaders import GROCERY_ITEM_GRAPH, load_grocery_item
 from database.models import GroceryItem
-from database.sql_client import db_session
+from database.search import (DEFAULT_MAX_CANDIDATES, candidate_statement, has_search_index, query_words,
+                             rank_key, ranked_statement, search_parameters, search_statements, window_statement)
+from database.serializers import ProjectionError, serializer_for
+from database.sql_client import db_session, each_shard, shard_count
+from database.totals import adjust_totals_containing, line_total, recompute_list_totals
+from rest_api.bulk import bulk_request, prepare_row
+from rest_api.conditional import record_response
+from rest_api.idempotency import idempotent
+from rest_api.instrumentation import count_rows
+from rest_api.multi_get import multi_get
+from rest_api.pagination import (PaginationError, apply_filters, collection_response, decode_offset, error_response,
+                                 page_response, page_size)
 from rest_api.utils import verify_and_pull_json
+from rest_api.writes import WriteSet
 
 
 class SingleGroceryItemAPI(MethodView):
     required_fields = ['name', 'quantity', 'price_per_unit']
+    filters = {
+        'name': lambda value: GroceryItem.name == value,
+        'type': lambda value: GroceryItem.type == value,
+    }
+    fields = serializer_for(GroceryItem).fields
 
     def get(self, item_id=None):
+        if not item_id and 'ids' in request.args:
+            return multi_get('grocery_item', GroceryItem, GROCERY_ITEM_GRAPH, request.args['ids'])
         if not item_id:
-            return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryItem.query.filter(GroceryItem.id == item_id).first()
-        if not item:
-            return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was found",
-                                      data=item.as_dict()), 204))
+            return collection_response(GroceryItem, GROCERY_ITEM_GRAPH, self.filters, request.args)
+        return record_response('grocery_item', GroceryItem, load_grocery_item, item_id)
 
+    @idempotent
     def post(self):
         status, payload = verify_and_pull_json(request)
         if status != 'success':
@@ -30,6 +49,8 @@ class SingleGroceryItemAPI(MethodView):
                                                                f"{', '.join(self.required_fields)}"), 404))
         grocery_item = GroceryItem(**payload)
         db_session.add(grocery_item)
+        db_session.flush()
+        log_changes('insert', 'grocery_item', grocery_item.id)
         db_session.commit()
         return make_response(
             (jsonify(status="success", data=f"Record Inserted with this id: {grocery_item.id}"), 201))
@@ -37,30 +58,119 @@ class SingleGroceryItemAPI(MethodView):
     def patch(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryItem.query.filter(GroceryItem.id == item_id).first()
+        item = load_grocery_item(item_id)
         if not item:
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
         status, payload = verify_and_pull_json(request)
         if status != 'success':
             return payload
-        contains_data_in_any_field = any([payload.get(key) for key in GroceryItem().as_dict().keys()])
+        contains_data_in_any_field = any([payload.get(key) for key in self.fields])
         if not contains_data_in_any_field:
             return make_response((jsonify(status="error", data=f"Payload had no data to patch requested record "
                                                                f"'{item_id}' with"), 404))
-        for key in GroceryItem().as_dict().keys():
+        old_total = line_total(item.price_per_unit, item.quantity)
+        for key in self.fields:
             if payload.get(key):
                 setattr(item, key, payload.get(key))
+        adjust_totals_containing(item_id, line_total(item.price_per_unit, item.quantity) - old_total)
+        changes = WriteSet().add_grocery_items(item_id)
+        # The lists holding the item changed their total.
+        log_changes('update', 'grocery_item', item_id)
+        log_changes('update', 'grocery_list', *changes.ids['grocery_list'])
+        item.updated_at = changes.touch()
         db_session.commit()
+        changes.invalidate()
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was patched",
                                       data=item.as_dict()), 204))
 
     def delete(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryItem.query.filter(GroceryItem.id == item_id).first()
+        item = load_grocery_item(item_id)
         if not item:
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        item.delete()
+        data = item.as_dict()
+        adjust_totals_containing(item_id, -line_total(item.price_per_unit, item.quantity))
+        changes = WriteSet().add_grocery_items(item_id)
+        changes.touch()
+        log_changes('delete', 'grocery_item', item_id)
+        log_changes('update', 'grocery_list', *changes.ids['grocery_list'])
+        delete_grocery_item(item_id)
         db_session.commit()
+        changes.invalidate()
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was deleted",
-                                      data=item.as_dict()), 204))
+                                      data=data), 204))
+
+
+class SearchGroceryItemAPI(MethodView):
+    # Prefix search over names and types, see database/search.py. Accepts the
+    # collection filters, ?fields=, limit and the returned cursor. Ranking is
+    # per window of the newest SEARCH_MAX_CANDIDATES matches (per shard): the
+    # cursor pages through one window in rank order, a page ends with its
+    # window and next_cursor then points at the window of older matches. It is
+    # only null once every match was returned.
+    default_max_candidates = DEFAULT_MAX_CANDIDATES
+
+    def get(self):
+        words = query_words(request.args.get('q', ''))
+        if not words:
+            return make_response((jsonify(status="error", data="Missing search query 'q'"), 400))
+        try:
+            plan = serializer_for(GroceryItem).plan(request.args.get('fields'))
+            size, offset = page_size(request.args), decode_offset(request.args.get('cursor'))
+            column_names = plan.columns + tuple(key for key in ('name', 'created_at', 'id') if key not in plan.columns)
+            shape = (column_names, len(words), has_search_index(db_session.connection()),
+                     current_app.config.get('SEARCH_MAX_CANDIDATES', self.default_max_candidates))
+            if any(request.args.get(key) is not None for key in SingleGroceryItemAPI.filters):
+                columns = [GroceryItem.__table__.c[name] for name in column_names]
+                candidates = apply_filters(candidate_statement(columns, *shape[1:]), SingleGroceryItemAPI.filters,
+                                           request.args)
+                statement, window = ranked_statement(candidates, len(words)), window_statement(candidates)
+            else:
+                statement, window = search_statements(*shape)
+        except (PaginationError, ProjectionError) as err:
+            return error_response(err)
+        # The cursor is the window times its stride plus the offset in it.
+        max_candidates = shape[3]
+        stride = max_candidates * shard_count()
+        window_index, skip = divmod(offset, stride)
+        candidate_offset = window_index * max_candidates
+        if shard_count() == 1:
+            rows = db_session.execute(statement, search_parameters(words, size + 1, skip, candidate_offset)).all()
+        else:
+            # Every shard ranks its own window up to the end of the page, the
+            # page is cut from their merge.
+            rows = [row for _ in each_shard() for row in db_session.execute(
+                statement, search_parameters(words, skip + size + 1, 0, candidate_offset)).all()]
+            rows = sorted(rows, key=rank_key, reverse=True)[skip:]
+        count_rows(len(rows))
+        if len(rows) > size:
+            next_cursor = str(offset + size)
+        elif any([db_session.execute(window, search_parameters(words, 1, 0, candidate_offset + max_candidates))
+                  .first() for _ in each_shard()]):
+            next_cursor = str((window_index + 1) * stride)
+        else:
+            next_cursor = None
+        return page_response([plan.dump_row(row) for row in rows[:size]], next_cursor)
+
+
+class BulkGroceryItemAPI(MethodView):
+
+    @idempotent
+    def post(self):
+        return bulk_request(request, self.prepare, self.changes)
+
+    @staticmethod
+    def changes(records, results, upsert):
+        # Plain inserts create new ids, only an upsert can replace existing records.
+        if not upsert:
+            return WriteSet()
+        changes = WriteSet().add_grocery_items(*[result['id'] for result in results if result['status'] == 'success'])
+        recompute_list_totals(changes.ids['grocery_list'])
+        log_changes('update', 'grocery_list', *changes.ids['grocery_list'])
+        return changes
+
+    @staticmethod
+    def prepare(record):
+        row = prepare_row(GroceryItem.__table__, record, SingleGroceryItemAPI.required_fields)
+        return row['id'], [(GroceryItem.__table__, row)]
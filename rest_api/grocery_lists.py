@@ -1,45 +1,75 @@
 import json
+from functools import partial
 
-from flask import make_response, jsonify, request
+from flask import current_app, make_response, jsonify, request
 from flask.views import MethodView
+from sqlalchemy import select
 
-from database.models import GroceryItem, GroceryList
-from database.sql_client import db_session
+from database.changes import log_changes
+from database.deletes import delete_grocery_lists
+from database.loaders import GROCERY_LIST_GRAPH, customer_ids_owning, load_grocery_list
+from database.models import GroceryItem, GroceryList, grocery_list_item_table
+from database.serializers import serializer_for
+from database.sql_client import current_shard, db_session, each_shard, shard_for
+from database.totals import adjust_list_totals, items_total, line_total, recompute_list_totals
+from rest_api.bulk import bulk_request, prepare_row
+from rest_api.coalesce import get_coalescer
+from rest_api.conditional import record_response
+from rest_api.delivery_slots import reschedule, unschedule
+from rest_api.idempotency import idempotent
+from rest_api.multi_get import multi_get
+from rest_api.pagination import PaginationError, apply_filters, collection_response, error_response
 from rest_api.utils import verify_and_pull_json
+from rest_api.writes import WriteSet
 
 
 class SingleGroceryListAPI(MethodView):
     required_fields = []
-    fields = GroceryList().as_dict().keys()
+    # total_price is computed from the items, remove_grocery_items takes item ids to unlink.
+    fields = [key for key in serializer_for(GroceryList).fields if key != 'total_price'] + ['remove_grocery_items']
+    filters = {
+        'customer_id': lambda value: GroceryList.customer_id == value,
+        'delivery_after': lambda value: GroceryList.desired_delivery >= float(value),
+        'delivery_before': lambda value: GroceryList.desired_delivery < float(value),
+    }
 
     def get(self, item_id=None):
+        if not item_id and 'ids' in request.args:
+            return multi_get('grocery_list', GroceryList, GROCERY_LIST_GRAPH, request.args['ids'])
         if not item_id:
-            return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryList.query.filter(GroceryList.id == item_id).first()
-        if not item:
-            return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was found",
-                                      data=item.as_dict()), 204))
+            return collection_response(GroceryList, GROCERY_LIST_GRAPH, self.filters, request.args)
+        return record_response('grocery_list', GroceryList, load_grocery_list, item_id)
 
+    @idempotent
     def post(self):
         status, payload = verify_and_pull_json(request)
         if status != 'success':
             return payload
+        payload.pop('total_price', None)
         docs = payload.pop('grocery_items')
         grocery_list = GroceryList(**payload)
         if docs:
             grocery_items = [GroceryItem(**grocery_item) for grocery_item in
                                         docs or []]
             grocery_list.grocery_items = grocery_items
+        grocery_list.total_price = items_total(grocery_list.grocery_items)
         db_session.add(grocery_list)
+        db_session.flush()
+        log_changes('insert', 'grocery_list', grocery_list.id)
+        log_changes('insert', 'grocery_item', *[grocery_item.id for grocery_item in grocery_list.grocery_items])
+        changes = WriteSet().add_customers(grocery_list.customer_id)
+        changes.touch()
+        delivery = grocery_list.desired_delivery
         db_session.commit()
+        changes.invalidate()
+        reschedule(grocery_list.id, delivery)
         return make_response(
             (jsonify(status="success", data=f"Record inserted with this id: {grocery_list.id}"), 201))
 
     def patch(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryList.query.filter(GroceryList.id == item_id).first()
+        item = load_grocery_list(item_id)
         if not item:
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
         status, payload = verify_and_pull_json(request)
@@ -49,23 +79,132 @@ class SingleGroceryListAPI(MethodView):
         if not contains_data_in_any_field:
             return make_response((jsonify(status="error", data=f"Payload had no data to patch requested record "
                                                                f"'{item_id}' with"), 404))
-        for key in self.fields:
-            if key == 'grocery_items' and payload.get(key):
-                item.grocery_items.extend([GroceryItem(**grocery_item) for grocery_item in
-                                           payload.get('grocery_items', []) or []])
-            elif payload.get(key):
-                setattr(item, key, payload.get(key))
-        db_session.commit()
+        if payload.get('customer_id') and shard_for(payload['customer_id']) != current_shard.get():
+            return make_response((jsonify(status="error", data=f"Record '{item_id}' can not move to a customer on "
+                                                               f"another shard"), 400))
+        coalescer = get_coalescer()
+        if coalescer:
+            # The session's snapshot has to end so the reload below sees the batch.
+            db_session.rollback()
+            found = coalescer.submit(('grocery_list', item_id), payload, partial(self.apply_patches, item_id))
+        else:
+            found = self.apply_patches(item_id, [payload])
+        if not found:
+            return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
+        item = load_grocery_list(item_id, refresh=True)
+        reschedule(item_id, item.desired_delivery)
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was patched",
                                       data=item.as_dict()), 204))
 
+    def apply_patches(self, item_id, payloads):
+        # Applies the payloads in order in one transaction: later fields win,
+        # grocery_items are appended and remove_grocery_items unlinked in turn.
+        item = load_grocery_list(item_id)
+        if not item:
+            return False
+        changes = WriteSet().add_grocery_lists(item_id)
+        delta = 0
+        added = []
+        for payload in payloads:
+            for key in self.fields:
+                if key == 'grocery_items' and payload.get(key):
+                    new_items = [GroceryItem(**grocery_item) for grocery_item in payload.get('grocery_items', []) or []]
+                    item.grocery_items.extend(new_items)
+                    delta += items_total(new_items)
+                    added.extend(new_items)
+                elif key == 'remove_grocery_items' and payload.get(key):
+                    removed = set(payload.get(key))
+                    delta -= items_total(g_item for g_item in item.grocery_items if g_item.id in removed)
+                    item.grocery_items = [g_item for g_item in item.grocery_items if g_item.id not in removed]
+                elif payload.get(key):
+                    setattr(item, key, payload.get(key))
+        db_session.flush()
+        adjust_list_totals([item_id], delta)
+        log_changes('update', 'grocery_list', item_id)
+        log_changes('insert', 'grocery_item', *[grocery_item.id for grocery_item in added])
+        changes.add_customers(item.customer_id)
+        item.updated_at = changes.touch()
+        db_session.commit()
+        changes.invalidate()
+        return True
+
     def delete(self, item_id=None):
         if not item_id:
             return make_response((jsonify(status="error", data=f"Missing item_id in url"), 404))
-        item = GroceryList.query.filter(GroceryList.id == item_id).first()
-        if not item:
+        if not db_session.query(GroceryList.id).filter(GroceryList.id == item_id).first():
             return make_response((jsonify(status="error", data=f"Record with id '{item_id}' was not found"), 404))
-        item.delete()
+        changes = WriteSet().add_grocery_lists(item_id)
+        changes.touch()
+        delete_grocery_lists([item_id])
+        log_changes('delete', 'grocery_list', item_id)
         db_session.commit()
+        changes.invalidate()
+        unschedule(item_id)
         return make_response((jsonify(status='success', message=f"Record with id '{item_id}' was deleted",
-                                      data=item.as_dict()), 204))
+                                      data={'id': item_id}), 204))
+
+
+class BulkGroceryListAPI(MethodView):
+    default_delete_batch_size = 1000
+
+    @idempotent
+    def post(self):
+        return bulk_request(request, self.prepare, self.changes, shard_key=lambda record: record.get('customer_id'))
+
+    def delete(self):
+        # Removes every list matching the filters of the collection GET, in
+        # batches of BULK_DELETE_BATCH_SIZE lists that are each committed on their
+        # own, so a retention run never holds more than one batch of ids or one
+        # long write lock. At least one filter is required.
+        args = request.args
+        if not any(args.get(key) is not None for key in SingleGroceryListAPI.filters):
+            return make_response((jsonify(status="error", data=f"Bulk delete needs at least one filter: "
+                                                               f"{', '.join(SingleGroceryListAPI.filters)}"), 400))
+        batch_size = current_app.config.get('BULK_DELETE_BATCH_SIZE', self.default_delete_batch_size)
+        try:
+            statement = apply_filters(select(GroceryList.id), SingleGroceryListAPI.filters, args).limit(batch_size)
+        except PaginationError as err:
+            return error_response(err)
+        deleted = batches = 0
+        for _ in each_shard():
+            while True:
+                list_ids = db_session.execute(statement).scalars().all()
+                if not list_ids:
+                    break
+                changes = WriteSet().add_customers(*customer_ids_owning(list_ids))
+                changes.touch()
+                changes.ids['grocery_list'].update(list_ids)
+                deleted += delete_grocery_lists(list_ids)
+                log_changes('delete', 'grocery_list', *list_ids)
+                db_session.commit()
+                changes.invalidate()
+                unschedule(*list_ids)
+                batches += 1
+        return make_response((jsonify(status='success', data={'deleted': deleted, 'batches': batches}), 200))
+
+    @staticmethod
+    def changes(records, results, upsert):
+        # Called once the rows are committed.
+        for result in results:
+            if result['status'] == 'success':
+                reschedule(result['id'], records[result['index']].get('desired_delivery'))
+        customer_ids = {record.get('customer_id') for record in records if isinstance(record, dict)}
+        if not upsert:
+            return WriteSet().add_customers(*customer_ids)
+        list_ids = [result['id'] for result in results if result['status'] == 'success']
+        # An upserted list keeps the items it already had, its total is counted again.
+        recompute_list_totals(list_ids)
+        return WriteSet().add_grocery_lists(*list_ids, customer_ids=customer_ids)
+
+    @staticmethod
+    def prepare(record):
+        row = prepare_row(GroceryList.__table__, record, SingleGroceryListAPI.required_fields,
+                          nested=['grocery_items'])
+        rows = [(GroceryList.__table__, row)]
+        row['total_price'] = 0
+        for grocery_item in record.get('grocery_items') or []:
+            item_row = prepare_row(GroceryItem.__table__, grocery_item)
+            row['total_price'] += line_total(item_row['price_per_unit'], item_row['quantity'])
+            rows.append((GroceryItem.__table__, item_row))
+            rows.append((grocery_list_item_table, {'grocery_list_id': row['id'], 'grocery_item_id': item_row['id']}))
+        return row['id'], rows
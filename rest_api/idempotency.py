@@ -0,0 +1,67 @@
+import functools
+import itertools
+
+from flask import current_app, jsonify, make_response, request
+
+from database.idempotency import claim, complete, fingerprint, purge_expired, release
+
+# Idempotency-Key support for POST handlers. The first request with a key runs
+# the handler and its response is stored, a retry with the same key and the
+# same body gets that response back (with Idempotent-Replayed: true) without
+# the handler or the models being touched. A retry while the first request is
+# still running gets a 409, the same key with a different body a 422. Server
+# errors are not stored, the key is released so the client can retry. Expired
+# keys are purged every IDEMPOTENCY_PURGE_EVERY claims.
+DEFAULT_TTL = 86400
+DEFAULT_PENDING_TIMEOUT = 60
+DEFAULT_PURGE_EVERY = 1000
+MAX_KEY_LENGTH = 255
+HEADER = 'Idempotency-Key'
+
+claims = itertools.count(1)
+
+
+def error(message, code):
+    return make_response((jsonify(status="error", data=message), code))
+
+
+def replay(record):
+    response = make_response((record.body, record.status_code))
+    response.mimetype = 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return error(f"{HEADER} must be between 1 and {MAX_KEY_LENGTH} characters", 400)
+        config = current_app.config
+        request_fingerprint = fingerprint(request.method, request.path, request.get_data())
+        record = claim(key, request_fingerprint, config.get('IDEMPOTENCY_TTL', DEFAULT_TTL),
+                       config.get('IDEMPOTENCY_PENDING_TIMEOUT', DEFAULT_PENDING_TIMEOUT))
+        if record is not None:
+            if record.fingerprint != request_fingerprint:
+                return error(f"{HEADER} '{key}' was already used with a different request", 422)
+            if record.status_code is None:
+                response = error(f"A request with {HEADER} '{key}' is still in progress", 409)
+                response.headers['Retry-After'] = '1'
+                return response
+            return replay(record)
+        if next(claims) % config.get('IDEMPOTENCY_PURGE_EVERY', DEFAULT_PURGE_EVERY) == 0:
+            purge_expired()
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            release(key)
+            raise
+        if response.status_code >= 500:
+            release(key)
+        else:
+            complete(key, response.status_code, response.get_data())
+        return response
+    return wrapper
@@ -0,0 +1,189 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from database import sql_client
+from database.sql_client import Base
+from rest_api.cache import get_cache
+
+slow_query_log = logging.getLogger('grocery.slow_queries')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Record cache stats that only grow, exported as counters. The others (entries) are gauges.
+CACHE_COUNTERS = ('hits', 'misses', 'evictions', 'expirations')
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, totals = self.series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0, 0.0]))
+            counts[index] += 1
+            totals[0] += 1
+            totals[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), list(totals)) for labels, (counts, totals) in self.series.items()}
+        for labels, (counts, (count, total)) in sorted(series.items()):
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bound_text = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound_text}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.request_duration = Histogram('grocery_http_request_duration_seconds',
+                                          'Wall time spent handling a request.', DURATION_BUCKETS)
+        self.db_duration = Histogram('grocery_http_request_db_duration_seconds',
+                                     'Time spent executing SQL statements per request.', DURATION_BUCKETS)
+        self.statements = Histogram('grocery_http_request_db_statements',
+                                    'SQL statements executed per request.', STATEMENT_BUCKETS)
+        self.rows = Histogram('grocery_http_request_db_rows',
+                              'Rows loaded plus rows changed per request.', STATEMENT_BUCKETS)
+
+    def observe(self, labels, wall, db_time, statements, rows):
+        self.request_duration.observe(labels, wall)
+        self.db_duration.observe(labels, db_time)
+        self.statements.observe(labels, statements)
+        self.rows.observe(labels, rows)
+
+    def render(self):
+        lines = []
+        for histogram in (self.request_duration, self.db_duration, self.statements, self.rows):
+            lines.extend(histogram.render())
+        for key, value in get_cache().stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key in CACHE_COUNTERS:
+                    name, kind = f'grocery_cache_{key}_total', 'counter'
+                else:
+                    name, kind = f'grocery_cache_{key}', 'gauge'
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def parameter_shape(parameters):
+    # Types only, the values may hold personal data.
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return {'executemany': len(parameters), 'row': parameter_shape(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def route_of(current_request):
+    return current_request.url_rule.rule if current_request.url_rule else 'unmatched'
+
+
+class RequestStats:
+    # Counters for the request in progress. Kept in a context variable rather
+    # than on flask.g, the hooks run for every statement and every loaded row.
+    __slots__ = ('started', 'db_time', 'statements', 'rows', 'slow_query_threshold_ms')
+
+    def __init__(self, slow_query_threshold_ms):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+
+
+current_stats = contextvars.ContextVar('grocery_request_stats', default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats.get()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - conn.info['query_started']
+    stats.db_time += elapsed
+    stats.statements += 1
+    if cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+    if elapsed * 1000 >= stats.slow_query_threshold_ms:
+        slow_query_log.warning('slow query %.1f ms on %s %s: %s parameters=%s', elapsed * 1000, request.method,
+                               route_of(request), ' '.join(statement.split()), parameter_shape(parameters))
+
+
+def count_loaded_row(target, context):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+def count_rows(count):
+    # Rows read as Core rows, which no ORM load event sees.
+    stats = current_stats.get()
+    if stats is not None:
+        stats.rows += count
+
+
+def instrument_engine(engine):
+    # Engines are shared by every app using the same database, listen only once.
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    if not event.contains(Base, 'load', count_loaded_row):
+        event.listen(Base, 'load', count_loaded_row, propagate=True)
+
+
+def start_request():
+    g.request_stats_token = current_stats.set(RequestStats(current_app.config.get('SLOW_QUERY_THRESHOLD_MS', 200)))
+
+
+def finish_request(response):
+    stats = current_stats.get()
+    if stats is None:
+        return response
+    wall = time.perf_counter() - stats.started
+    current_app.extensions['request_metrics'].observe((('method', request.method), ('route', route_of(request))),
+                                                      wall, stats.db_time, stats.statements, stats.rows)
+    if current_app.config.get('SERVER_TIMING_ENABLED', True):
+        response.headers.add('Server-Timing', f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} '
+                                              f'statements, {stats.rows} rows"')
+        response.headers.add('Server-Timing', f'app;dur={wall * 1000:.2f}')
+    return response
+
+
+def end_request(exception=None):
+    if 'request_stats_token' in g:
+        current_stats.reset(g.pop('request_stats_token'))
+
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    app.extensions['request_metrics'] = RequestMetrics()
+    instrument_engine(sql_client.engine)
+    for shard in sql_client.extra_shards:
+        instrument_engine(shard)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_request)
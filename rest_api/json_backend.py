@@ -0,0 +1,51 @@
+from flask.json import JSONDecoder, JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON_BACKEND picks the serializer behind jsonify, request.get_json and the
+# bulk/export endpoints: 'orjson', 'stdlib', or 'auto' for orjson when it is
+# installed. Flask 2.0 builds its encoder and decoder from app.json_encoder and
+# app.json_decoder and only calls encode()/decode(), so overriding those two
+# swaps the whole implementation while every view keeps using jsonify.
+
+
+class OrjsonEncoder(JSONEncoder):
+
+    def encode(self, o):
+        # orjson only writes compact output, pretty printing (debug) keeps the stdlib.
+        if self.indent is not None:
+            return super().encode(o)
+        # Dates still go through Flask's default() so they stay HTTP dates.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
+class OrjsonDecoder(JSONDecoder):
+
+    def decode(self, s, *args):
+        if self.object_hook or self.object_pairs_hook or self.parse_float is not float or self.parse_int is not int:
+            return super().decode(s, *args)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, callers catch the same error.
+        return orjson.loads(s)
+
+
+def json_backend(config):
+    backend = config.get('JSON_BACKEND', 'auto')
+    if backend == 'auto':
+        backend = 'orjson' if orjson is not None else 'stdlib'
+    if backend == 'orjson':
+        if orjson is None:
+            raise ValueError("JSON_BACKEND 'orjson' needs the orjson package")
+        return OrjsonEncoder, OrjsonDecoder
+    if backend == 'stdlib':
+        return JSONEncoder, JSONDecoder
+    raise ValueError(f"Unknown JSON_BACKEND '{backend}'")
+
+
+def init_json(app):
+    app.json_encoder, app.json_decoder = json_backend(app.config)
@@ -0,0 +1,95 @@
+from flask import current_app, jsonify, make_response, request
+from flask.views import MethodView
+from sqlalchemy import select
+
+from database.loaders import chunked
+from database.serializers import ProjectionError
+from database.sql_client import db_session, each_shard
+from rest_api.cache import cache_key, get_cache
+from rest_api.conditional import record_plan, shaped
+from rest_api.pagination import error_response
+from rest_api.utils import verify_and_pull_json
+
+# Several records by id in one request: ?ids=a,b,c on the collection GET or a
+# POST of {"ids": [...]} to /api/<resource>/multi_get. Records found in the
+# record cache are served from it, the rest are loaded with chunked IN queries
+# (shard after shard, until all are found) and cached. The data follows the
+# requested order (duplicates once) and unknown ids are listed under "missing".
+MAX_IDS = 1000
+
+
+class MultiGetError(ValueError):
+    pass
+
+
+def requested_ids(ids):
+    if isinstance(ids, str):
+        ids = ids.split(',')
+    if not isinstance(ids, list) or not all(isinstance(item_id, str) for item_id in ids):
+        raise MultiGetError("ids must be a list of record ids")
+    ids = list(dict.fromkeys(item_id.strip() for item_id in ids if item_id.strip()))
+    if not ids:
+        raise MultiGetError("No ids were requested")
+    max_ids = current_app.config.get('API_MAX_MULTI_GET_IDS', MAX_IDS)
+    if len(ids) > max_ids:
+        raise MultiGetError(f"At most {max_ids} ids can be requested at once, got {len(ids)}")
+    return ids
+
+
+def cached_payloads(resource, ids):
+    # Also the generation of every missed key, taken before the misses are loaded.
+    cache = get_cache()
+    payloads, generations = {}, {}
+    for item_id in ids:
+        generations[item_id] = cache.generation(cache_key(resource, item_id))
+        payload = cache.get(cache_key(resource, item_id))
+        if payload is not None:
+            payloads[item_id] = payload
+    return payloads, {item_id: generations[item_id] for item_id in ids if item_id not in payloads}
+
+
+def load_statements(model, options, ids):
+    for chunk in chunked(ids):
+        yield select(model).options(*options).where(model.id.in_(chunk))
+
+
+def store(resource, payloads, records, generations):
+    cache = get_cache()
+    for record in records:
+        payload = payloads[record.id] = record.as_dict()
+        cache.set(cache_key(resource, record.id), payload, generations[record.id])
+
+
+def multi_get_response(ids, payloads, plan):
+    data, extra = shaped(plan, [payloads[item_id] for item_id in ids if item_id in payloads])
+    missing = [item_id for item_id in ids if item_id not in payloads]
+    return make_response((jsonify(status='success', data=data, missing=missing, **extra), 200))
+
+
+def multi_get(resource, model, options, ids):
+    try:
+        ids = requested_ids(ids)
+        plan = record_plan(resource)
+    except (MultiGetError, ProjectionError) as err:
+        return error_response(err)
+    payloads, misses = cached_payloads(resource, ids)
+    for _ in each_shard():
+        for statement in load_statements(model, options, [item_id for item_id in misses if item_id not in payloads]):
+            store(resource, payloads, db_session.execute(statement).scalars(), misses)
+    return multi_get_response(ids, payloads, plan)
+
+
+class MultiGetAPI(MethodView):
+
+    def __init__(self, resource, model, options):
+        self.resource = resource
+        self.model = model
+        self.options = options
+
+    def post(self):
+        status, payload = verify_and_pull_json(request)
+        if status != 'success':
+            return payload
+        if not isinstance(payload, dict):
+            return error_response(MultiGetError("Payload must be an object with an 'ids' list"))
+        return multi_get(self.resource, self.model, self.options, payload.get('ids'))
@@ -0,0 +1,134 @@
+import base64
+import json
+from operator import attrgetter
+
+from flask import current_app, jsonify, make_response
+from sqlalchemy import select, tuple_
+
+from database.serializers import ProjectionError, serializer_for
+from database.sql_client import db_session, each_shard
+from rest_api.instrumentation import count_rows
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(record):
+    raw = json.dumps([record.created_at, record.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as err:
+        raise PaginationError(f"Invalid cursor '{cursor}'") from err
+    return created_at, record_id
+
+
+def decode_offset(cursor):
+    # Cursor of result lists that are ranked rather than ordered by a key.
+    if not cursor:
+        return 0
+    try:
+        offset = int(cursor)
+    except ValueError as err:
+        raise PaginationError(f"Invalid cursor '{cursor}'") from err
+    if offset < 0:
+        raise PaginationError(f"Invalid cursor '{cursor}'")
+    return offset
+
+
+def page_size(args):
+    max_size = current_app.config.get('API_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    try:
+        size = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as err:
+        raise PaginationError(f"Invalid limit '{args.get('limit')}'") from err
+    if size < 1:
+        raise PaginationError(f"Invalid limit '{size}'")
+    return min(size, max_size)
+
+
+def apply_filters(query, filters, args):
+    for key, build_clause in filters.items():
+        value = args.get(key)
+        if value is None:
+            continue
+        try:
+            query = query.filter(build_clause(value))
+        except ValueError as err:
+            raise PaginationError(f"Invalid value '{value}' for filter '{key}'") from err
+    return query
+
+
+def keyset_query(query, model, args):
+    # The cursor holds the (created_at, id) of the last record returned, so every
+    # page is a range scan over that index no matter how deep the client pages.
+    # Works on ORM queries and on select() statements alike.
+    size = page_size(args)
+    cursor = args.get('cursor')
+    if cursor:
+        query = query.filter(tuple_(model.created_at, model.id) > tuple_(*decode_cursor(cursor)))
+    return query.order_by(model.created_at, model.id).limit(size + 1), size
+
+
+def split_page(records, size):
+    next_cursor = encode_cursor(records[size - 1]) if len(records) > size else None
+    return records[:size], next_cursor
+
+
+def error_response(err):
+    return make_response((jsonify(status="error", data=str(err)), 400))
+
+
+def page_response(data, next_cursor):
+    return make_response((jsonify(status='success', data=data, next_cursor=next_cursor), 200))
+
+
+def collection_statement(model, options, filters, args):
+    # ?fields= picks the serialized fields and ?depth= how deep relationships
+    # are expanded. A selection without nested relationships is read as plain
+    # Core rows of just those columns (plus the cursor keys): no ORM objects,
+    # identity map or relationship loads.
+    plan = serializer_for(model).plan(args.get('fields'), args.get('depth'))
+    if plan.nested:
+        statement = select(model).options(*options)
+    else:
+        statement = select(*plan.row_columns(model.__table__, 'created_at', 'id'))
+    statement, size = keyset_query(apply_filters(statement, filters, args), model, args)
+    return statement, size, plan
+
+
+def fetch_page(result, plan):
+    # Fetched right away, selectinload runs its queries while the rows are read.
+    if plan.nested:
+        return result.scalars().all()
+    rows = result.all()
+    count_rows(len(rows))
+    return rows
+
+
+def page_data(pages, size, plan):
+    # One page per shard, each in key order. Merged they stay in key order and
+    # the next page starts after the last record returned, whichever shard it
+    # came from.
+    records = [record for page in pages for record in page]
+    if len(pages) > 1:
+        records.sort(key=attrgetter('created_at', 'id'))
+    records, next_cursor = split_page(records, size)
+    dump = plan.dump if plan.nested else plan.dump_row
+    return [dump(record) for record in records], next_cursor
+
+
+def collection_response(model, options, filters, args):
+    try:
+        statement, size, plan = collection_statement(model, options, filters, args)
+    except (PaginationError, ProjectionError) as err:
+        return error_response(err)
+    pages = [fetch_page(db_session.execute(statement), plan) for _ in each_shard()]
+    return page_response(*page_data(pages, size, plan))
@@ -0,0 +1,366 @@
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, jsonify, make_response, request, send_file
+from flask.views import MethodView
+from sqlalchemy.orm import Session
+
+from database.loaders import GROCERY_LIST_GRAPH
+from database.models import Customer, GroceryList
+from database.serializers import ProjectionError, serializer_for
+from database.sql_client import create_engine_from_config, db_session, shard_for, shard_of, using_shard
+from rest_api.aggregates import CustomerSpendAPI, RevenueByTypeAPI
+from rest_api.idempotency import idempotent
+from rest_api.json_backend import json_backend
+from rest_api.pagination import PaginationError, apply_filters, error_response
+from rest_api.utils import verify_and_pull_json
+
+# Report jobs: exports and aggregations run in a pool of REPORT_WORKERS worker
+# processes so serializing a large customer graph does not hold the GIL of the
+# process serving requests. POST /api/reports queues a job and answers at once
+# with its id, GET /api/reports/<id> reports its status and progress and
+# /api/reports/<id>/result serves the NDJSON file the worker wrote to
+# REPORT_DIRECTORY. Every worker opens its own engine from the configured URI.
+# Progress and cancellation go through small files next to the result: the
+# worker rewrites <id>.progress every batch and stops at the next batch once
+# <id>.cancel exists. At most REPORT_MAX_PENDING jobs are queued or running,
+# further ones get a 429, and only the newest REPORT_MAX_JOBS finished jobs are
+# kept with their files. Jobs live in the process that accepted them, with
+# several worker processes serving the API a job is only visible to its own.
+# Workers open an engine per shard, an aggregation reads every shard.
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 20
+DEFAULT_MAX_JOBS = 100
+DEFAULT_BATCH_SIZE = 200
+# Settings a worker process needs, the rest of the app config stays behind.
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'DATABASE_POOL_SIZE', 'DATABASE_MAX_OVERFLOW',
+                      'DATABASE_POOL_TIMEOUT', 'DATABASE_POOL_RECYCLE', 'SQLITE_PRAGMAS', 'JSON_BACKEND',
+                      'DATABASE_SHARDS')
+
+
+class ReportError(ValueError):
+    pass
+
+
+class ReportQueueFull(Exception):
+    pass
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+class CustomerExportReport:
+    # The grocery lists of params['customer_id'] with their items, like
+    # /api/customer/<id>/export, ?fields= and ?depth= given as params.
+
+    def validate(self, params):
+        customer_id = params.get('customer_id')
+        if not isinstance(customer_id, str) or not customer_id:
+            raise ReportError("customer_export needs a customer_id")
+        serializer_for(GroceryList).plan(params.get('fields'), params.get('depth'))
+        with using_shard(shard_for(customer_id)):
+            return db_session.query(Customer.id).filter(Customer.id == customer_id).first() is not None
+
+    def rows(self, sessions, params, batch_size):
+        # sessions holds one session per shard.
+        plan = serializer_for(GroceryList).plan(params.get('fields'), params.get('depth'))
+        session = sessions[shard_of(params['customer_id'], len(sessions))]
+        query = session.query(GroceryList).filter(GroceryList.customer_id == params['customer_id'])
+        total = query.count()
+        query = (query.options(*GROCERY_LIST_GRAPH)
+                 .order_by(GroceryList.created_at, GroceryList.id)
+                 .execution_options(stream_results=True)
+                 .yield_per(batch_size))
+        return total, (plan.dump(grocery_list) for grocery_list in query)
+
+
+class AggregateReport:
+    # Every row of an aggregate endpoint, without its page limit. The list
+    # filters are given as params.
+
+    def __init__(self, view_class):
+        self.view_class = view_class
+
+    def statement(self, params):
+        return apply_filters(self.view_class().statement(), self.view_class.filters, params)
+
+    def validate(self, params):
+        self.statement(params)
+        return True
+
+    def rows(self, sessions, params, batch_size):
+        if len(sessions) == 1:
+            return None, (dict(row._mapping) for row in sessions[0].execute(self.statement(params)))
+        statement = self.statement(params)
+        return None, iter(self.view_class.combine([dict(row._mapping) for session in sessions
+                                                   for row in session.execute(statement)]))
+
+
+REPORTS = {
+    'customer_export': CustomerExportReport(),
+    'customer_spend': AggregateReport(CustomerSpendAPI),
+    'revenue_by_type': AggregateReport(RevenueByTypeAPI),
+}
+
+# Set in each worker process by init_worker, shard 0 first.
+worker_engines = []
+worker_encoder = None
+
+
+def init_worker(config):
+    global worker_encoder
+    for engine in worker_engines:
+        engine.dispose()
+    uris = [config['SQLALCHEMY_DATABASE_URI']] + list(config.get('DATABASE_SHARDS') or ())
+    worker_engines[:] = [create_engine_from_config(dict(config, SQLALCHEMY_DATABASE_URI=uri)) for uri in uris]
+    worker_encoder = json_backend(config)[0]()
+
+
+def job_path(directory, job_id, suffix):
+    return os.path.join(directory, f'{job_id}.{suffix}')
+
+
+def write_progress(directory, job_id, done, total):
+    path = job_path(directory, job_id, 'progress')
+    with open(path + '.tmp', 'w') as progress:
+        json.dump({'done': done, 'total': total}, progress)
+    os.replace(path + '.tmp', path)
+
+
+def run_report(job_id, kind, params, directory, batch_size):
+    # Runs in a worker process. Rows go to <id>.ndjson.part, renamed once complete.
+    cancel_path = job_path(directory, job_id, 'cancel')
+    if os.path.exists(cancel_path):
+        raise ReportCancelled()
+    part_path = job_path(directory, job_id, 'ndjson.part')
+    done = 0
+    with contextlib.ExitStack() as stack:
+        sessions = [stack.enter_context(Session(engine)) for engine in worker_engines]
+        total, rows = REPORTS[kind].rows(sessions, params, batch_size)
+        write_progress(directory, job_id, done, total)
+        try:
+            with open(part_path, 'w') as output:
+                for row in rows:
+                    output.write(worker_encoder.encode(row) + '\n')
+                    done += 1
+                    if done % batch_size == 0:
+                        if os.path.exists(cancel_path):
+                            raise ReportCancelled()
+                        write_progress(directory, job_id, done, total)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+    os.replace(part_path, job_path(directory, job_id, 'ndjson'))
+    write_progress(directory, job_id, done, done)
+    return done
+
+
+class ReportJob:
+
+    def __init__(self, kind, params):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.rows = None
+        self.error = None
+        self.future = None
+
+    @property
+    def pending(self):
+        return self.status in ('queued', 'running')
+
+
+class ReportRunner:
+
+    def __init__(self, config, directory=None, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 max_jobs=DEFAULT_MAX_JOBS, batch_size=DEFAULT_BATCH_SIZE, start_method='spawn'):
+        self.config = {key: config[key] for key in WORKER_CONFIG_KEYS if key in config}
+        self.directory = directory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.batch_size = batch_size
+        self.start_method = start_method
+        self.lock = threading.RLock()
+        self.jobs = OrderedDict()
+        self.executor = None
+
+    def pool(self):
+        # Started on the first job, spawning the workers costs every start otherwise.
+        if self.executor is None:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix='grocery-reports-')
+            os.makedirs(self.directory, exist_ok=True)
+            self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context(self.start_method),
+                                                initializer=init_worker, initargs=(self.config,))
+        return self.executor
+
+    def submit(self, kind, params):
+        with self.lock:
+            if sum(1 for job in self.jobs.values() if job.pending) >= self.max_pending:
+                raise ReportQueueFull(f"{self.max_pending} report jobs are already queued or running")
+            job = ReportJob(kind, params)
+            self.jobs[job.id] = job
+            job.future = self.pool().submit(run_report, job.id, kind, params, self.directory, self.batch_size)
+            job.future.add_done_callback(functools.partial(self.finished, job))
+            return job
+
+    def finished(self, job, future):
+        with self.lock:
+            job.finished_at = time.time()
+            error = None if future.cancelled() else future.exception()
+            if future.cancelled() or isinstance(error, ReportCancelled):
+                job.status = 'cancelled'
+            elif error is not None:
+                job.status, job.error = 'failed', str(error) or type(error).__name__
+                if isinstance(error, BrokenProcessPool):
+                    # A worker died (killed, out of memory), the next job starts a new pool.
+                    self.executor = None
+            else:
+                job.status, job.rows = 'done', future.result()
+            self.evict()
+
+    def evict(self):
+        finished = [job for job in self.jobs.values() if not job.pending]
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            self.remove(job)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job):
+        with self.lock:
+            if not job.pending:
+                return
+            # A job already handed to a worker stops at its next batch.
+            open(job_path(self.directory, job.id, 'cancel'), 'w').close()
+            job.future.cancel()
+
+    def remove(self, job):
+        with self.lock:
+            self.jobs.pop(job.id, None)
+            for suffix in ('ndjson', 'progress', 'cancel'):
+                try:
+                    os.remove(job_path(self.directory, job.id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def result_path(self, job):
+        return job_path(self.directory, job.id, 'ndjson')
+
+    def progress(self, job):
+        try:
+            with open(job_path(self.directory, job.id, 'progress')) as progress:
+                return json.load(progress)
+        except (FileNotFoundError, ValueError):
+            return {'done': 0, 'total': None}
+
+    def describe(self, job):
+        progress = self.progress(job)
+        status = job.status
+        if status == 'queued' and os.path.exists(job_path(self.directory, job.id, 'progress')):
+            status = 'running'
+        return {'id': job.id, 'kind': job.kind, 'params': job.params, 'status': status, 'progress': progress,
+                'created_at': job.created_at, 'finished_at': job.finished_at, 'rows': job.rows, 'error': job.error}
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+def init_reports(app):
+    config = app.config
+    app.extensions['reports'] = ReportRunner(config, config.get('REPORT_DIRECTORY'),
+                                             config.get('REPORT_WORKERS', DEFAULT_WORKERS),
+                                             config.get('REPORT_MAX_PENDING', DEFAULT_MAX_PENDING),
+                                             config.get('REPORT_MAX_JOBS', DEFAULT_MAX_JOBS),
+                                             config.get('EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                                             config.get('REPORT_START_METHOD', 'spawn'))
+
+
+def get_reports():
+    return current_app.extensions['reports']
+
+
+def job_not_found(job_id):
+    return make_response((jsonify(status="error", data=f"Report job '{job_id}' was not found"), 404))
+
+
+class ReportAPI(MethodView):
+
+    def get(self, job_id=None):
+        runner = get_reports()
+        if not job_id:
+            return make_response((jsonify(status='success', data=[runner.describe(job) for job in
+                                                                  list(runner.jobs.values())]), 200))
+        job = runner.get(job_id)
+        if job is None:
+            return job_not_found(job_id)
+        return make_response((jsonify(status='success', data=runner.describe(job)), 200))
+
+    @idempotent
+    def post(self):
+        status, payload = verify_and_pull_json(request)
+        if status != 'success':
+            return payload
+        if not isinstance(payload, dict) or payload.get('kind') not in REPORTS:
+            return error_response(ReportError(f"kind must be one of: {', '.join(REPORTS)}"))
+        params = payload.get('params') or {}
+        if not isinstance(params, dict):
+            return error_response(ReportError("params must be an object"))
+        try:
+            if not REPORTS[payload['kind']].validate(params):
+                return make_response((jsonify(status="error", data=f"Record with id '{params['customer_id']}' "
+                                                                   f"was not found"), 404))
+        except (ReportError, PaginationError, ProjectionError) as err:
+            return error_response(err)
+        runner = get_reports()
+        try:
+            job = runner.submit(payload['kind'], params)
+        except ReportQueueFull as err:
+            response = make_response((jsonify(status="error", data=str(err)), 429))
+            response.headers['Retry-After'] = '1'
+            return response
+        return make_response((jsonify(status='success', data=runner.describe(job)), 202))
+
+    def delete(self, job_id=None):
+        # Cancels a queued or running job, a finished job is removed with its result.
+        runner = get_reports()
+        job = runner.get(job_id) if job_id else None
+        if job is None:
+            return job_not_found(job_id)
+        if job.pending:
+            runner.cancel(job)
+            message = f"Report job '{job_id}' was cancelled"
+        else:
+            runner.remove(job)
+            message = f"Report job '{job_id}' was deleted"
+        return make_response((jsonify(status='success', message=message, data=runner.describe(job)), 204))
+
+
+class ReportResultAPI(MethodView):
+
+    def get(self, job_id):
+        runner = get_reports()
+        job = runner.get(job_id)
+        if job is None:
+            return job_not_found(job_id)
+        if job.status != 'done':
+            return make_response((jsonify(status="error", data=f"Report job '{job_id}' is {job.status}"), 409))
+        return send_file(runner.result_path(job), mimetype='application/x-ndjson')
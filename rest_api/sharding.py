@@ -0,0 +1,66 @@
+from flask import request
+from sqlalchemy import select
+
+from database.models import GroceryItem, GroceryList
+from database.sql_client import current_shard, db_session, each_shard, route_to, shard_count, shard_for
+from rest_api.cache import LRUCache
+
+# Routes each request to the shard holding its records when DATABASE_SHARDS is
+# set, see database/sql_client.py. Customer routes carry the shard key in the
+# URL, a new grocery list in its customer_id. Grocery lists and items addressed
+# by id are looked up on every shard once and their shard is remembered, ids
+# never move between shards while the app runs (rebalancing runs offline). A
+# new customer picks its shard in the handler, once it has an id. Everything
+# else starts on shard 0 and spreads over the shards where it needs to.
+DEFAULT_LOCATION_ENTRIES = 100000
+LOCATED = {'grocery_list': GroceryList, 'grocery_item': GroceryItem}
+
+
+class ShardLocator:
+
+    def __init__(self, max_entries=DEFAULT_LOCATION_ENTRIES):
+        self.locations = LRUCache(max_entries, ttl=float('inf'))
+
+    def locate(self, resource, item_id):
+        key = f'{resource}:{item_id}'
+        shard = self.locations.get(key)
+        if shard is not None:
+            return shard
+        model = LOCATED[resource]
+        found = 0
+        for shard in each_shard():
+            if db_session.execute(select(model.id).where(model.id == item_id)).first() is not None:
+                self.locations.set(key, shard)
+                found = shard
+                break
+        # Ends the read transactions opened on the shards looked at.
+        db_session.rollback()
+        return found
+
+
+def request_shard(locator):
+    item_id = (request.view_args or {}).get('item_id')
+    if request.endpoint in ('customer', 'customer_export') and item_id:
+        return shard_for(item_id)
+    if request.endpoint in LOCATED and item_id:
+        return locator.locate(request.endpoint, item_id)
+    if request.endpoint == 'grocery_list' and request.method == 'POST':
+        payload = request.get_json(force=True, silent=True)
+        return shard_for(payload.get('customer_id') if isinstance(payload, dict) else None)
+    return 0
+
+
+def init_sharding(app):
+    if shard_count() == 1:
+        return
+    locator = app.extensions['shard_locator'] = ShardLocator(app.config.get('SHARD_LOCATION_ENTRIES',
+                                                                            DEFAULT_LOCATION_ENTRIES))
+
+    def route_request():
+        route_to(request_shard(locator))
+
+    def end_request(exception=None):
+        current_shard.set(0)
+
+    app.before_request(route_request)
+    app.teardown_request(end_request)
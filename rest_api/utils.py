@@ -1,13 +1,12 @@
-import json
-
-from flask import jsonify, make_response, request
+from flask import jsonify, make_response
+from werkzeug.exceptions import BadRequest
 
 
 def verify_and_pull_json(request):
-    payload = request.json
-    if not payload:
-        try:
-            return "success", json.loads(request.data)
-        except json.JSONDecodeError as err:
-            return "error", make_response(jsonify(status="error", message="JSON parse error: {}".format(err)), 406)
-    return "success", payload
\ No newline at end of file
+    # Parsed once with the app's JSON backend whatever the Content-Type, the
+    # result is cached on the request.
+    try:
+        return "success", request.get_json(force=True)
+    except BadRequest as err:
+        return "error", make_response(jsonify(status="error", message="JSON parse error: {}".format(err.description)),
+                                      406)
@@ -0,0 +1,47 @@
+import time
+
+from sqlalchemy import update
+
+from database.loaders import chunked, customer_ids_owning, grocery_list_ids_containing
+from database.models import Customer, GroceryItem, GroceryList
+from database.sql_client import db_session
+from rest_api.cache import cache_key, invalidate
+
+
+class WriteSet:
+    # The records a write changes, together with every record whose serialized
+    # document embeds them: an item shows up in its lists, a list in its
+    # customer. Collect it before the write (a delete removes the rows that
+    # lead to the parents), touch() before commit and invalidate() after it.
+    resources = (('customer', Customer), ('grocery_list', GroceryList), ('grocery_item', GroceryItem))
+
+    def __init__(self):
+        self.ids = {resource: set() for resource, _ in self.resources}
+
+    def add_customers(self, *customer_ids):
+        self.ids['customer'].update(customer_id for customer_id in customer_ids if customer_id)
+        return self
+
+    def add_grocery_lists(self, *list_ids, customer_ids=()):
+        self.ids['grocery_list'].update(list_ids)
+        return self.add_customers(*customer_ids_owning(list_ids), *customer_ids)
+
+    def add_grocery_items(self, *item_ids):
+        self.ids['grocery_item'].update(item_ids)
+        return self.add_grocery_lists(*grocery_list_ids_containing(item_ids))
+
+    def touch(self, now=None):
+        # Bumps updated_at in the current transaction so the ETag of every
+        # affected document changes, including when only a relationship did.
+        now = now or time.time()
+        for resource, model in self.resources:
+            for chunk in chunked(self.ids[resource]):
+                db_session.execute(update(model.__table__).where(model.__table__.c.id.in_(chunk))
+                                   .values(updated_at=now))
+        return now
+
+    def cache_keys(self):
+        return [cache_key(resource, record_id) for resource, ids in self.ids.items() for record_id in ids]
+
+    def invalidate(self):
+        invalidate(self.cache_keys())
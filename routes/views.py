@@ -1,7 +1,19 @@
-from flask import Blueprint
+from flask import Blueprint, abort, current_app, jsonify
+
+from rest_api.cache import get_cache
 
 views_bp = Blueprint('views', __name__)
 
 @views_bp.route('/')
 def hello_world():  # put application's code here
-    return 'Hello World!'
\ No newline at end of file
+    return 'Hello World!'
+
+@views_bp.route('/api/cache/stats')
+def cache_stats():
+    return jsonify(status='success', data=get_cache().stats())
+
+@views_bp.route('/metrics')
+def metrics():
+    if 'request_metrics' not in current_app.extensions:
+        abort(404)
+    return current_app.extensions['request_metrics'].render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
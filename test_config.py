@@ -1,2 +1,3 @@
 SQLALCHEMY_TRACK_MODIFICATIONS = False
-SQLALCHEMY_DATABASE_URI = 'sqlite:///test_grocery_delivery_db.sqlite3?check_same_thread=False'
\ No newline at end of file
+# One in-memory database shared by the whole test run, nothing is left on disk between runs.
+SQLALCHEMY_DATABASE_URI = 'sqlite://'
@@ -0,0 +1,15 @@
+import os
+
+
+def file_database_config(directory, shards=1):
+    # test_config.py's in-memory database is a single shared connection. Tests
+    # writing from several threads, or reading through the async engine, need
+    # connections of their own and get a database file instead. With shards > 1
+    # each further shard is a file of its own.
+    path = os.path.join(directory, 'test_config.py')
+    uris = [f"sqlite:///{os.path.join(directory, f'shard_{shard}.sqlite3')}" for shard in range(1, shards)]
+    with open(path, 'w') as config:
+        config.write(f"SQLALCHEMY_TRACK_MODIFICATIONS = False\n"
+                     f"SQLALCHEMY_DATABASE_URI = 'sqlite:///{os.path.join(directory, 'test.sqlite3')}'\n"
+                     f"DATABASE_SHARDS = {uris!r}\n")
+    return path
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('aiosqlite')
+
+from asgi import create_asgi_app
+from database.sql_client import db_session
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+@pytest.fixture(scope="module")
+def loop():
+    # The async engine's pool belongs to the loop it first ran on, like in a server.
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def asgi_app(loop, tmp_path_factory):
+    asgi_app = create_asgi_app(file_database_config(str(tmp_path_factory.mktemp('asgi'))))
+    with asgi_app.flask_app.app_context():
+        example_data.example_grocery_list.grocery_items.append(example_data.example_grocery_item)
+        example_data.example_customer.grocery_lists.append(example_data.example_grocery_list)
+        db_session.add(example_data.example_customer)
+        db_session.commit()
+        example_data.ids = (example_data.example_customer.id, example_data.example_grocery_list.id,
+                            example_data.example_grocery_item.id)
+    asgi_app.loop = loop
+    yield asgi_app
+    loop.run_until_complete(asgi_app.close())
+
+
+def call(asgi_app, method, path, query='', body=None, headers=()):
+    # Sends one request through the ASGI interface and collects the response.
+    raw = json.dumps(body).encode() if body is not None else b''
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(b'content-type', b'application/json'), *headers], 'http_version': '1.1'}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': raw, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asgi_app.loop.run_until_complete(asgi_app(scope, receive, send))
+    start = messages[0]
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in messages[1:])
+
+
+class TestAsgiApp:
+    def test_async_get_returns_record_with_validators(self, asgi_app):
+        customer_id = example_data.ids[0]
+        status, headers, body = call(asgi_app, 'GET', f'/api/customer/{customer_id}')
+        assert status == 200 and headers[b'etag']
+        assert json.loads(body)['data']['grocery_lists'][0]['id'] == example_data.ids[1]
+
+    def test_async_conditional_get_results_in_304(self, asgi_app):
+        list_id = example_data.ids[1]
+        _, headers, _ = call(asgi_app, 'GET', f'/api/grocery_list/{list_id}')
+        status, _, _ = call(asgi_app, 'GET', f'/api/grocery_list/{list_id}',
+                            headers=[(b'if-none-match', headers[b'etag'])])
+        assert status == 304
+
+    def test_async_collection_is_paged(self, asgi_app):
+        status, _, body = call(asgi_app, 'GET', '/api/grocery_item', query='limit=1')
+        assert status == 200 and len(json.loads(body)['data']) == 1
+
+    def test_missing_record_results_in_404(self, asgi_app):
+        status, _, _ = call(asgi_app, 'GET', '/api/grocery_item/missing')
+        assert status == 404
+
+    def test_writes_run_through_flask_app(self, asgi_app):
+        item_id = example_data.ids[2]
+        status, _, _ = call(asgi_app, 'PATCH', f'/api/grocery_item/{item_id}', body={'name': 'async patched'})
+        assert status == 204
+        _, _, body = call(asgi_app, 'GET', f'/api/grocery_item/{item_id}')
+        assert json.loads(body)['data']['name'] == 'async patched'
+
+    def test_streamed_export_is_forwarded(self, asgi_app):
+        status, headers, body = call(asgi_app, 'GET', f'/api/customer/{example_data.ids[0]}/export')
+        assert status == 200 and headers[b'content-type'] == b'application/x-ndjson'
+        assert json.loads(body.splitlines()[0])['id'] == example_data.ids[1]
+
+    def test_async_multi_get(self, asgi_app):
+        customer_id, list_id, _ = example_data.ids
+        status, _, body = call(asgi_app, 'GET', '/api/grocery_list', query=f'ids=missing,{list_id}&fields=id')
+        assert status == 200 and json.loads(body)['data'] == [{'id': list_id}]
+        assert json.loads(body)['missing'] == ['missing']
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from benchmarks.__main__ import main, regressions
+from database import sql_client
+
+
+@pytest.fixture(autouse=True)
+def restore_engine():
+    # The suite rebinds the session to its own throwaway database.
+    engine = sql_client.engine
+    yield
+    sql_client.engine = engine
+    sql_client.db_session.remove()
+    sql_client.db_session.configure(bind=engine)
+
+
+class TestBenchmarkSuite:
+    def test_every_route_is_driven(self, tmp_path):
+        output = tmp_path / 'results.json'
+        assert main(['--customers', '2', '--lists-per-customer', '2', '--items-per-list', '2',
+                     '--requests', '2', '--modes', 'client', 'wsgi', '--output', str(output)]) == 0
+        results = json.loads(output.read_text())['results']
+        measured = [result for result in results if not result.get('skipped')]
+        assert {result['mode'] for result in measured} == {'client', 'wsgi'}
+        assert all(result['errors'] == 0 for result in measured)
+        assert ('DELETE', '/api/customer/<string:item_id>') in {(r['method'], r['rule']) for r in measured}
+
+    def test_p95_regressions_are_reported(self):
+        before = {'results': [{'mode': 'client', 'method': 'GET', 'rule': '/', 'p95_ms': 1.0}]}
+        after = [{'mode': 'client', 'method': 'GET', 'rule': '/', 'p95_ms': 2.0}]
+        assert len(list(regressions(after, before, 0.25))) == 1
+
+    def test_async_throughput_compares_both_modes(self, capsys):
+        pytest.importorskip('aiosqlite')
+        from benchmarks.async_throughput import main as async_main
+        async_main(['--customers', '2', '--lists-per-customer', '2', '--items-per-list', '2', '--requests', '10',
+                    '--concurrency', '1', '4'])
+        rows = [line.split() for line in capsys.readouterr().out.splitlines()[1:]]
+        assert [(row[0], row[1]) for row in rows] == [('sync', '1'), ('async', '1'), ('sync', '4'), ('async', '4')]
+        assert all(row[4] == '0' for row in rows)
+
+    def test_sharded_writes_are_measured_per_shard_count(self, capsys):
+        from benchmarks.sharding import main as sharding_main
+        assert sharding_main(['--shards', '1', '2', '--workers', '1', '--writes', '3', '--customers', '4']) == 0
+        rows = [line.split() for line in capsys.readouterr().out.splitlines()[1:]]
+        assert [(row[0], row[1], row[2]) for row in rows] == [('1', '3', '0'), ('2', '3', '0')]
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryItem, GroceryList, generate_uuid
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+def item_payload():
+    payload = FakeData().example_grocery_item.as_dict()
+    payload.pop('id')
+    return payload
+
+
+class TestBulkGroceryItemAPI:
+    def test_json_array_results_in_201_and_rows_in_db(self, client):
+        payload = [item_payload() for _ in range(5)]
+        response = client.post(url_for('grocery_item_bulk', batch_size=2), json=payload)
+        ids = [result['id'] for result in response.json['data']]
+        assert response.status_code == 201 and response.json['inserted'] == 5
+        assert GroceryItem.query.filter(GroceryItem.id.in_(ids)).count() == 5
+
+    def test_ndjson_results_in_201(self, client):
+        body = '\n'.join(json.dumps(item_payload()) for _ in range(3))
+        response = client.post(url_for('grocery_item_bulk'), data=body, content_type='application/x-ndjson')
+        assert response.status_code == 201 and response.json['inserted'] == 3
+
+    def test_invalid_rows_are_reported_per_row(self, client):
+        body = '\n'.join([json.dumps(item_payload()), '{not json', json.dumps({'type': 'no name'}),
+                          json.dumps({**item_payload(), 'colour': 'red'})])
+        response = client.post(url_for('grocery_item_bulk'), data=body, content_type='application/x-ndjson')
+        statuses = [result['status'] for result in response.json['data']]
+        assert statuses == ['success', 'error', 'error', 'error']
+
+    def test_duplicate_id_only_fails_that_row(self, client):
+        existing = item_payload()
+        first = client.post(url_for('grocery_item_bulk'), json=[existing])
+        existing['id'] = first.json['data'][0]['id']
+        response = client.post(url_for('grocery_item_bulk'), json=[item_payload(), existing, item_payload()])
+        statuses = [result['status'] for result in response.json['data']]
+        assert statuses == ['success', 'error', 'success']
+
+    def test_upsert_updates_existing_row(self, client):
+        payload = item_payload()
+        first = client.post(url_for('grocery_item_bulk'), json=[payload])
+        payload['id'] = first.json['data'][0]['id']
+        payload['name'] = 'upserted name'
+        response = client.post(url_for('grocery_item_bulk', upsert='true'), json=[payload])
+        assert response.status_code == 201
+        assert GroceryItem.query.filter(GroceryItem.id == payload['id']).first().name == 'upserted name'
+
+    def test_no_payload_results_in_406(self, client):
+        response = client.post(url_for('grocery_item_bulk'))
+        assert response.status_code == 406
+
+
+class TestBulkGroceryListAPI:
+    def test_lists_with_items_are_inserted(self, client):
+        payload = []
+        for _ in range(3):
+            grocery_list = FakeData().example_grocery_list.as_dict()
+            grocery_list['grocery_items'] = [item_payload(), item_payload()]
+            payload.append(grocery_list)
+        response = client.post(url_for('grocery_list_bulk', batch_size=2), json=payload)
+        ids = [result['id'] for result in response.json['data']]
+        grocery_lists = GroceryList.query.filter(GroceryList.id.in_(ids)).all()
+        assert response.status_code == 201
+        assert len(grocery_lists) == 3 and all(len(g.grocery_items) == 2 for g in grocery_lists)
+
+    def test_upserting_a_list_with_items_twice_results_in_201(self, client):
+        grocery_list = FakeData().example_grocery_list.as_dict()
+        grocery_list['id'] = generate_uuid()
+        grocery_list['grocery_items'] = [{**item_payload(), 'id': generate_uuid()} for _ in range(2)]
+        for _ in range(2):
+            response = client.post(url_for('grocery_list_bulk', upsert='true'), json=[grocery_list])
+            assert response.status_code == 201 and response.json['failed'] == 0
+        assert len(GroceryList.query.filter(GroceryList.id == grocery_list['id']).one().grocery_items) == 2
@@ -0,0 +1,158 @@
+import fnmatch
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.sql_client import db_session
+from database.models import GroceryItem
+from rest_api.cache import LRUCache, SharedCache, cache_key, get_cache, invalidate
+from rest_api.conditional import record_response
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+class LocalSharedStore:
+    # Stand-in for a redis client in tests.
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        pass
+
+    def scan_iter(self, match):
+        return [key for key in self.values if fnmatch.fnmatch(key, match)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            example_data.example_grocery_list.grocery_items.append(example_data.example_grocery_item)
+            example_data.example_customer.grocery_lists.append(example_data.example_grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+class TestLRUCache:
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None and cache.get('a') == 1 and cache.stats()['evictions'] == 1
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(ttl=10, clock=clock)
+        cache.set('a', 1)
+        clock.now = 11
+        assert cache.get('a') is None and cache.stats()['expirations'] == 1
+
+    def test_hits_and_misses_are_counted(self):
+        cache = LRUCache()
+        cache.get('a')
+        cache.set('a', 1)
+        cache.get('a')
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    def test_byte_bound_evicts_and_skips_large_values(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'123456')
+        cache.set('c', b'12345678901')
+        assert cache.get('a') is None and cache.get('b') == b'123456' and cache.get('c') is None
+        assert cache.bytes == 6 and cache.stats()['evictions'] == 1
+
+    def test_set_after_an_invalidation_is_dropped(self):
+        cache = LRUCache()
+        generation = cache.generation('a')
+        cache.delete('a')
+        cache.set('a', 1, generation)
+        cache.set('b', 2, cache.generation('b'))
+        assert cache.get('a') is None and cache.get('b') == 2
+
+
+class TestSharedCache:
+    def test_round_trip_and_delete(self):
+        cache = SharedCache(LocalSharedStore())
+        cache.set('grocery_item:1', {'name': 'milk'})
+        assert cache.get('grocery_item:1') == {'name': 'milk'}
+        cache.delete('grocery_item:1')
+        assert cache.get('grocery_item:1') is None
+
+    def test_set_after_an_invalidation_is_dropped(self):
+        cache = SharedCache(LocalSharedStore())
+        generation = cache.generation('grocery_item:1')
+        cache.delete('grocery_item:1')
+        cache.set('grocery_item:1', {'name': 'milk'}, generation)
+        assert cache.get('grocery_item:1') is None
+
+
+class TestRecordCache:
+    def test_second_get_is_a_hit(self, client):
+        hits = get_cache().stats()['hits']
+        client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id))
+        client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id))
+        assert get_cache().stats()['hits'] == hits + 1
+
+    def test_item_patch_invalidates_item_list_and_customer(self, client):
+        client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id))
+        client.get(url_for('grocery_list', item_id=example_data.example_grocery_list.id))
+        client.get(url_for('customer', item_id=example_data.example_customer.id))
+        client.patch(url_for('grocery_item', item_id=example_data.example_grocery_item.id),
+                     json={"name": FakeData().example_grocery_item.name})
+        keys = [cache_key('grocery_item', example_data.example_grocery_item.id),
+                cache_key('grocery_list', example_data.example_grocery_list.id),
+                cache_key('customer', example_data.example_customer.id)]
+        assert all(key not in get_cache().entries for key in keys)
+
+    def test_list_patch_invalidates_customer(self, client):
+        client.get(url_for('customer', item_id=example_data.example_customer.id))
+        client.patch(url_for('grocery_list', item_id=example_data.example_grocery_list.id),
+                     json={"desired_delivery": 1234})
+        assert cache_key('customer', example_data.example_customer.id) not in get_cache().entries
+
+    def test_load_racing_a_write_is_not_cached(self, client):
+        item_id = example_data.example_grocery_item.id
+        key = cache_key('grocery_item', item_id)
+        get_cache().delete(key)
+
+        def load(record_id):
+            # A write commits and invalidates the key while the record is being loaded.
+            record = db_session.get(GroceryItem, record_id)
+            invalidate([key])
+            return record
+
+        assert record_response('grocery_item', GroceryItem, load, item_id).status_code == 200
+        assert key not in get_cache().entries
+
+    def test_stats_endpoint(self, client):
+        response = client.get(url_for('views.cache_stats'))
+        assert response.status_code == 200 and response.json['data']['backend'] == 'lru'
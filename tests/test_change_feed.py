@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.changes import change_log_table, purge_changes
+from database.sql_client import db_session
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client(tmp_path_factory):
+    # Long polls are woken from another thread, which needs its own connection.
+    app = create_app(file_database_config(str(tmp_path_factory.mktemp('change_feed'))))
+    app.config.update(CHANGE_FEED_POLL_INTERVAL=0.05, CHANGE_FEED_STREAM_SECONDS=0.3)
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+def latest(client):
+    return client.get(url_for('changes', after='latest')).get_json()['cursor']
+
+
+def changes_after(client, cursor, **args):
+    body = client.get(url_for('changes', after=cursor, **args)).get_json()
+    return [(change['operation'], change['resource'], change['id']) for change in body['data']], body['cursor']
+
+
+def created_id(response):
+    return response.get_json()['data'].rsplit(' ', 1)[1]
+
+
+def item_payload():
+    payload = FakeData().example_grocery_item.as_dict()
+    payload.pop('id')
+    return payload
+
+
+class TestChangeLog:
+    def test_post_logs_the_customer_and_its_lists(self, client):
+        cursor = latest(client)
+        grocery_list = FakeData().example_grocery_list.as_dict()
+        grocery_list.pop('id')
+        payload = FakeData().example_customer.as_dict()
+        payload.pop('id')
+        payload['grocery_lists'] = [grocery_list]
+        customer_id = created_id(client.post(url_for('customer'), json=payload))
+        changes, cursor = changes_after(client, cursor)
+        assert changes[0] == ('insert', 'customer', customer_id)
+        assert [change[:2] for change in changes[1:]] == [('insert', 'grocery_list')]
+        assert changes_after(client, cursor) == ([], cursor)
+
+    def test_list_patch_and_delete_are_logged_in_order(self, client):
+        list_id = created_id(client.post(url_for('grocery_list'), json={'desired_delivery': 1.0,
+                                                                        'grocery_items': [item_payload()]}))
+        cursor = latest(client)
+        client.patch(url_for('grocery_list', item_id=list_id), json={'desired_delivery': 2.0})
+        client.delete(url_for('grocery_list', item_id=list_id))
+        changes, _ = changes_after(client, cursor)
+        assert changes == [('update', 'grocery_list', list_id), ('delete', 'grocery_list', list_id)]
+
+    def test_item_patch_logs_the_lists_whose_total_changed(self, client):
+        response = client.post(url_for('grocery_list'), json={'desired_delivery': 1.0,
+                                                              'grocery_items': [item_payload()]})
+        list_id = created_id(response)
+        item_id = client.get(url_for('grocery_list', item_id=list_id)).get_json()['data']['grocery_items'][0]['id']
+        cursor = latest(client)
+        client.patch(url_for('grocery_item', item_id=item_id), json={'quantity': 99})
+        changes, _ = changes_after(client, cursor)
+        assert changes == [('update', 'grocery_item', item_id), ('update', 'grocery_list', list_id)]
+
+    def test_bulk_rows_are_logged_with_their_batch(self, client):
+        existing = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        cursor = latest(client)
+        response = client.post(url_for('grocery_item_bulk', batch_size=2),
+                               json=[item_payload(), {**item_payload(), 'id': existing}, item_payload()])
+        inserted = [result['id'] for result in response.get_json()['data'] if result['status'] == 'success']
+        changes, _ = changes_after(client, cursor)
+        assert len(inserted) == 2 and changes == [('insert', 'grocery_item', item_id) for item_id in inserted]
+
+
+class TestChangeFeed:
+    def test_batches_follow_the_cursor(self, client):
+        cursor = latest(client)
+        ids = [created_id(client.post(url_for('grocery_item'), json=item_payload())) for _ in range(3)]
+        first, cursor = changes_after(client, cursor, limit=2)
+        second, cursor = changes_after(client, cursor, limit=2)
+        assert [change[2] for change in first + second] == ids and len(first) == 2
+
+    def test_resource_filter(self, client):
+        cursor = latest(client)
+        client.post(url_for('grocery_list'), json={'desired_delivery': 1.0, 'grocery_items': [item_payload()]})
+        changes, _ = changes_after(client, cursor, resource='grocery_list')
+        assert [change[:2] for change in changes] == [('insert', 'grocery_list')]
+
+    @pytest.mark.parametrize('args', [{'after': 'x'}, {'after': '-1'}, {'after': '1.-2'}, {'limit': 0},
+                                      {'wait': 'soon'}, {'resource': 'orders'}])
+    def test_invalid_arguments_result_in_400(self, client, args):
+        assert client.get(url_for('changes', **args)).status_code == 400
+
+    def test_long_poll_wakes_on_commit(self, client):
+        # Not from re-reading, the interval is longer than the test allows.
+        client.application.config['CHANGE_FEED_POLL_INTERVAL'] = 30
+        cursor = latest(client)
+        result = {}
+
+        def poll():
+            started = time.monotonic()
+            result['body'] = client.get(f'/api/changes?after={cursor}&wait=10').get_json()
+            result['seconds'] = time.monotonic() - started
+
+        thread = threading.Thread(target=poll)
+        thread.start()
+        time.sleep(0.2)
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        thread.join(10)
+        client.application.config['CHANGE_FEED_POLL_INTERVAL'] = 0.05
+        assert [change['id'] for change in result['body']['data']] == [item_id]
+        assert result['seconds'] < 5
+
+    def test_event_stream_sends_batches_with_their_cursor(self, client):
+        cursor = latest(client)
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        response = client.get(url_for('changes'), headers={'Accept': 'text/event-stream', 'Last-Event-ID': cursor})
+        assert response.mimetype == 'text/event-stream' and 'Content-Encoding' not in response.headers
+        messages = [message for message in response.get_data(as_text=True).split('\n\n')
+                    if 'event: changes' in message]
+        fields = dict(line.split(': ', 1) for line in messages[0].splitlines())
+        data = json.loads(fields['data'])
+        assert [change['id'] for change in data['data']] == [item_id] and fields['id'] == data['cursor']
+
+    @pytest.mark.parametrize('after', ['0', 'latest'])
+    def test_reconnect_resumes_from_last_event_id(self, client, after):
+        cursor = latest(client)
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        response = client.get(url_for('changes', after=after), headers={'Last-Event-ID': cursor})
+        assert [change['id'] for change in response.get_json()['data']] == [item_id]
+
+
+class TestRetention:
+    def test_compaction_keeps_the_last_change_of_each_record(self, client):
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        client.patch(url_for('grocery_item', item_id=item_id), json={'quantity': 3})
+        purge_changes(retention=10 ** 9, compact_after=-60)
+        rows = db_session.execute(change_log_table.select().where(change_log_table.c.record_id == item_id)).all()
+        db_session.rollback()
+        assert [row.operation for row in rows] == ['update']
+
+    def test_expired_changes_are_dropped_and_reported(self, client):
+        cursor = latest(client)
+        client.post(url_for('grocery_item'), json=item_payload())
+        expired, _ = purge_changes(retention=-60, compact_after=-60)
+        assert expired > 0
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        body = client.get(url_for('changes', after=cursor)).get_json()
+        assert body['truncated'] and [change['id'] for change in body['data']] == [item_id]
+        assert not client.get(url_for('changes', after=body['cursor'])).get_json()['truncated']
+
+    def test_reading_from_the_start_of_a_cut_log_is_reported(self, client):
+        client.post(url_for('grocery_item'), json=item_payload())
+        purge_changes(retention=-60, compact_after=-60)
+        body = client.get(url_for('changes')).get_json()
+        assert body['truncated'] and int(body['cursor']) > 0
+
+    @pytest.mark.parametrize('cursor', ['0.0', '0.0.0'])
+    def test_cursor_of_another_shard_count_is_reported(self, client, cursor):
+        position = latest(client)
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        body = client.get(url_for('changes', after=f'{position}.{cursor}')).get_json()
+        assert body['truncated'] and [change['id'] for change in body['data']] == [item_id]
+        assert '.' not in body['cursor']
+
+    def test_compaction_gaps_do_not_truncate_a_consumer(self, client):
+        purge_changes(retention=-60, compact_after=-60)
+        cursor = latest(client)
+        item_id = created_id(client.post(url_for('grocery_item'), json=item_payload()))
+        for quantity in (3, 4):
+            client.patch(url_for('grocery_item', item_id=item_id), json={'quantity': quantity})
+        # The insert and first update are compacted away, the rows after the cursor start with a gap.
+        purge_changes(retention=10 ** 9, compact_after=-60)
+        body = client.get(url_for('changes', after=cursor)).get_json()
+        assert not body['truncated'] and [change['operation'] for change in body['data']] == ['update']
@@ -0,0 +1,191 @@
+import threading
+import time
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+
+from app import create_app
+from database.models import GroceryList
+from database.sql_client import db_session
+from rest_api.coalesce import PatchCoalescer, init_coalescing
+from rest_api.grocery_lists import SingleGroceryListAPI
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client(tmp_path_factory):
+    # Concurrent requests need connections of their own.
+    app = create_app(file_database_config(str(tmp_path_factory.mktemp('coalesce'))))
+    app.config['PATCH_COALESCE_WINDOW_MS'] = 100
+    init_coalescing(app)
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+def make_list():
+    customer = FakeData().example_customer
+    grocery_list = FakeData().example_grocery_list
+    grocery_list.grocery_items = []
+    customer.grocery_lists.append(grocery_list)
+    db_session.add(customer)
+    db_session.commit()
+    list_id = grocery_list.id
+    db_session.remove()
+    return list_id
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def run_concurrently(targets, coalescer, key):
+    # Starts the targets one after the other, each once the previous one's
+    # payload joined the open batch of key, and holds that batch open until
+    # all of them did. The batch and its order never depend on the scheduler.
+    results = [None] * len(targets)
+    release = threading.Event()
+    coalescer.wait = lambda window: release.wait()
+
+    def run(index, target):
+        try:
+            results[index] = target()
+        except Exception as err:
+            results[index] = err
+
+    threads = []
+    for index, target in enumerate(targets):
+        threads.append(threading.Thread(target=run, args=(index, target)))
+        threads[-1].start()
+        wait_until(lambda: key in coalescer.open and len(coalescer.open[key].payloads) == index + 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def patch_in_thread(app, list_id, payload):
+    def target():
+        return app.test_client().patch(f'/api/grocery_list/{list_id}', json=payload).status_code
+    return target
+
+
+def item(name, price):
+    return {'name': name, 'type': 'produce', 'price_per_unit': price, 'quantity': 1}
+
+
+class TestPatchCoalescer:
+    def test_payloads_of_a_window_are_applied_once_in_arrival_order(self):
+        coalescer = PatchCoalescer(0.05)
+        calls = []
+
+        def apply(payloads):
+            calls.append(list(payloads))
+            return True
+
+        results = run_concurrently([partial(coalescer.submit, 'list', n, apply) for n in range(5)], coalescer, 'list')
+        assert results == [True] * 5
+        assert calls == [[0, 1, 2, 3, 4]]
+        assert coalescer.stats()['batches'] == 1
+
+    def test_batches_of_a_record_commit_in_order(self):
+        # The second batch opens while the first is still committing and has
+        # to wait for it.
+        applying, release = threading.Event(), threading.Event()
+        second_flushing = threading.Event()
+        coalescer = PatchCoalescer(0.02, wait=lambda window: None)
+        calls = []
+
+        def apply(payloads):
+            if payloads[0] == 0:
+                applying.set()
+                release.wait()
+            calls.append(payloads[0])
+            return True
+
+        first = threading.Thread(target=coalescer.submit, args=('list', 0, apply))
+        first.start()
+        applying.wait()
+        coalescer.wait = lambda window: second_flushing.set()
+        second = threading.Thread(target=coalescer.submit, args=('list', 1, apply))
+        second.start()
+        second_flushing.wait()
+        release.set()
+        first.join()
+        second.join()
+        assert calls == [0, 1] and coalescer.stats()['batches'] == 2
+
+    def test_a_failing_payload_only_fails_its_own_request(self):
+        coalescer = PatchCoalescer(0.05)
+        applied = []
+
+        def apply(payloads):
+            if 'bad' in payloads:
+                raise TypeError('bad payload')
+            applied.extend(payloads)
+            return True
+
+        results = run_concurrently([partial(coalescer.submit, 'list', payload, apply)
+                                    for payload in ['a', 'bad', 'c']], coalescer, 'list')
+        assert results[0] is True and results[2] is True
+        assert isinstance(results[1], TypeError)
+        assert applied == ['a', 'c']
+
+
+class TestCoalescedPatch:
+    def test_concurrent_patches_are_merged_into_one_commit(self, client):
+        list_id = make_list()
+        coalescer = client.application.extensions['patch_coalescer']
+        batches = coalescer.stats()['batches']
+        payloads = [{'grocery_items': [item('apple', 3)]}, {'desired_delivery': 1000.0},
+                    {'grocery_items': [item('pear', 4)]}, {'desired_delivery': 2000.0}]
+        results = run_concurrently([patch_in_thread(client.application, list_id, payload) for payload in payloads],
+                                   coalescer, ('grocery_list', list_id))
+        assert results == [204] * 4
+        assert coalescer.stats()['batches'] == batches + 1
+        grocery_list = db_session.get(GroceryList, list_id)
+        assert grocery_list.desired_delivery == 2000.0
+        assert sorted(g_item.name for g_item in grocery_list.grocery_items) == ['apple', 'pear']
+        assert grocery_list.total_price == 7
+        db_session.remove()
+
+    def test_items_added_and_removed_in_one_batch_keep_the_total(self, client):
+        list_id = make_list()
+        client.patch(f'/api/grocery_list/{list_id}', json={'grocery_items': [item('milk', 5), item('eggs', 2)]})
+        milk_id = next(g_item.id for g_item in db_session.get(GroceryList, list_id).grocery_items
+                       if g_item.name == 'milk')
+        db_session.remove()
+        results = run_concurrently([patch_in_thread(client.application, list_id, {'remove_grocery_items': [milk_id]}),
+                                    patch_in_thread(client.application, list_id, {'grocery_items': [item('tea', 6)]})],
+                                   client.application.extensions['patch_coalescer'], ('grocery_list', list_id))
+        assert results == [204, 204]
+        grocery_list = db_session.get(GroceryList, list_id)
+        assert sorted(g_item.name for g_item in grocery_list.grocery_items) == ['eggs', 'tea']
+        assert grocery_list.total_price == 8
+        db_session.remove()
+
+    def test_a_failed_commit_acknowledges_nothing(self, client, monkeypatch):
+        list_id = make_list()
+        coalescer = PatchCoalescer(0.05)
+        apply = partial(SingleGroceryListAPI().apply_patches, list_id)
+
+        def crash():
+            raise RuntimeError('disk I/O error')
+
+        monkeypatch.setattr(db_session, 'commit', crash)
+        results = run_concurrently([partial(coalescer.submit, list_id, {'desired_delivery': n}, apply)
+                                    for n in (1.0, 2.0)], coalescer, list_id)
+        monkeypatch.undo()
+        assert all(isinstance(result, RuntimeError) for result in results)
+        db_session.remove()
+        assert db_session.execute(select(GroceryList.desired_delivery)
+                                  .where(GroceryList.id == list_id)).scalar() not in (1.0, 2.0)
+        assert coalescer.submit(list_id, {'desired_delivery': 3.0}, apply) is True
+        db_session.remove()
+        assert db_session.get(GroceryList, list_id).desired_delivery == 3.0
+        db_session.remove()
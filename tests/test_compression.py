@@ -0,0 +1,115 @@
+import gzip
+import json
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryItem, GroceryList
+from database.sql_client import db_session
+from rest_api.compression import DEFAULT_CACHE_BYTES
+from tests.example_data import FakeData
+
+example_data = FakeData()
+shared_items = [FakeData().example_grocery_item for _ in range(6)]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            # Three lists holding the same items, the shape normalization pays off on.
+            for _ in range(3):
+                grocery_list = GroceryList(desired_delivery=1.0)
+                grocery_list.grocery_items.extend(shared_items)
+                example_data.example_customer.grocery_lists.append(grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+def customer_url(**args):
+    return url_for('customer', item_id=example_data.example_customer.id, **args)
+
+
+class TestCompression:
+    def test_gzip_is_negotiated(self, client):
+        plain = client.get(customer_url())
+        response = client.get(customer_url(), headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.get_data())) == plain.get_json()
+        assert len(response.get_data()) < len(plain.get_data())
+
+    def test_uncompressed_without_an_accepted_encoding(self, client):
+        for headers in ({}, {'Accept-Encoding': 'gzip;q=0'}, {'Accept-Encoding': 'identity'}):
+            response = client.get(customer_url(), headers=headers)
+            assert 'Content-Encoding' not in response.headers
+            assert 'Accept-Encoding' in response.headers['Vary']
+
+    def test_small_bodies_are_not_compressed(self, client):
+        response = client.get(url_for('grocery_item', item_id=shared_items[0].id),
+                              headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compressed_etag_is_weak_and_still_matches(self, client):
+        response = client.get(customer_url(), headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        assert etag.startswith('W/')
+        revalidated = client.get(customer_url(), headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert revalidated.status_code == 304
+
+    def test_repeated_bodies_are_compressed_once(self, client):
+        cache = client.application.extensions['compression'].cache
+        client.get(customer_url(), headers={'Accept-Encoding': 'gzip'})
+        hits = cache.hits
+        client.get(customer_url(), headers={'Accept-Encoding': 'gzip'})
+        assert cache.hits == hits + 1
+
+    def test_compressed_body_cache_is_bounded_in_bytes(self, client):
+        cache = client.application.extensions['compression'].cache
+        client.get(customer_url(), headers={'Accept-Encoding': 'gzip'})
+        assert 0 < cache.bytes <= cache.max_bytes == DEFAULT_CACHE_BYTES
+
+    def test_streamed_export_is_not_compressed(self, client):
+        response = client.get(url_for('customer_export', item_id=example_data.example_customer.id),
+                              headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_data().splitlines()) == 3
+
+
+class TestPayloadShape:
+    def test_depth_zero_references_lists_by_id(self, client):
+        data = client.get(customer_url(depth=0)).get_json()['data']
+        assert sorted(data['grocery_lists']) == sorted(grocery_list.id for grocery_list in
+                                                       example_data.example_customer.grocery_lists)
+
+    def test_depth_one_references_items_by_id(self, client):
+        data = client.get(customer_url(depth=1)).get_json()['data']
+        assert all(sorted(grocery_list['grocery_items']) == sorted(item.id for item in shared_items)
+                   for grocery_list in data['grocery_lists'])
+
+    def test_depth_applies_to_collections(self, client):
+        response = client.get(url_for('grocery_list', depth=0, limit=500))
+        assert all(isinstance(item_id, str) for record in response.get_json()['data']
+                   for item_id in record['grocery_items'])
+
+    @pytest.mark.parametrize('args', [{'depth': -1}, {'depth': 'all'}, {'shape': 'flat'},
+                                      {'shape': 'normalized', 'fields': 'id,grocery_lists.grocery_items.name'}])
+    def test_bad_shapes_result_in_400(self, client, args):
+        assert client.get(customer_url(**args)).status_code == 400
+
+    def test_normalized_shape_sends_each_item_once(self, client):
+        nested = client.get(customer_url()).get_json()
+        body = client.get(customer_url(shape='normalized')).get_json()
+        included = body['included']['grocery_item']
+        assert sorted(included) == sorted(item.id for item in shared_items)
+        for nested_list, grocery_list in zip(nested['data']['grocery_lists'], body['data']['grocery_lists']):
+            assert [included[item_id] for item_id in grocery_list['grocery_items']] == nested_list['grocery_items']
+
+    def test_normalized_multi_get_shares_included(self, client):
+        list_ids = [grocery_list.id for grocery_list in example_data.example_customer.grocery_lists]
+        body = client.get(url_for('grocery_list', ids=','.join(list_ids), shape='normalized')).get_json()
+        assert len(body['data']) == 3 and len(body['included']['grocery_item']) == len(shared_items)
+        assert db_session.query(GroceryItem).filter(GroceryItem.id.in_(body['included']['grocery_item'])).count() == 6
@@ -0,0 +1,79 @@
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryList
+from database.sql_client import db_session
+from rest_api.cache import get_cache
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            example_data.example_grocery_list.grocery_items.append(example_data.example_grocery_item)
+            example_data.example_customer.grocery_lists.append(example_data.example_grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+def etag_of(client, endpoint, item_id):
+    return client.get(url_for(endpoint, item_id=item_id)).headers['ETag']
+
+
+class TestConditionalGet:
+    def test_get_sets_validators(self, client):
+        response = client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id))
+        assert response.headers.get('ETag') and response.headers.get('Last-Modified')
+
+    def test_matching_if_none_match_results_in_304(self, client):
+        etag = etag_of(client, 'customer', example_data.example_customer.id)
+        response = client.get(url_for('customer', item_id=example_data.example_customer.id),
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.headers['ETag'] == etag
+
+    def test_uncached_conditional_get_results_in_304(self, client):
+        etag = etag_of(client, 'grocery_list', example_data.example_grocery_list.id)
+        get_cache().clear()
+        response = client.get(url_for('grocery_list', item_id=example_data.example_grocery_list.id),
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_etag_of_a_selection_does_not_match_other_representations(self, client):
+        item_id = example_data.example_customer.id
+        etag = client.get(url_for('customer', item_id=item_id, fields='id,username')).headers['ETag']
+        for cached in (True, False):
+            if not cached:
+                get_cache().clear()
+            for args in ({}, {'depth': 0}, {'fields': 'id,username', 'shape': 'normalized'}):
+                response = client.get(url_for('customer', item_id=item_id, **args), headers={'If-None-Match': etag})
+                assert response.status_code == 200
+            response = client.get(url_for('customer', item_id=item_id, fields='username, id'),
+                                  headers={'If-None-Match': etag})
+            assert response.status_code == 304
+
+    def test_stale_if_none_match_results_in_full_response(self, client):
+        response = client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id),
+                              headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 200
+
+    def test_item_patch_changes_list_and_customer_etags(self, client):
+        list_etag = etag_of(client, 'grocery_list', example_data.example_grocery_list.id)
+        customer_etag = etag_of(client, 'customer', example_data.example_customer.id)
+        client.patch(url_for('grocery_item', item_id=example_data.example_grocery_item.id),
+                     json={"name": FakeData().example_grocery_item.name})
+        assert etag_of(client, 'grocery_list', example_data.example_grocery_list.id) != list_etag
+        assert etag_of(client, 'customer', example_data.example_customer.id) != customer_etag
+
+    def test_adding_items_to_list_updates_updated_at(self, client):
+        before = GroceryList.query.filter(GroceryList.id == example_data.example_grocery_list.id).first().updated_at
+        db_session.remove()
+        client.patch(url_for('grocery_list', item_id=example_data.example_grocery_list.id),
+                     json={"grocery_items": [FakeData().example_grocery_item.as_dict()]})
+        after = GroceryList.query.filter(GroceryList.id == example_data.example_grocery_list.id).first().updated_at
+        assert after > before
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.sql_client import db_session
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    app.config['EXPORT_BATCH_SIZE'] = 2
+    with app.test_request_context():
+        with app.app_context():
+            for _ in range(5):
+                grocery_list = FakeData().example_grocery_list
+                grocery_list.grocery_items = [FakeData().example_grocery_item for _ in range(3)]
+                example_data.example_customer.grocery_lists.append(grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+class TestCustomerExportAPI:
+    def test_export_streams_one_line_per_grocery_list(self, client):
+        response = client.get(url_for('customer_export', item_id=example_data.example_customer.id))
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+        assert len(lines) == 5 and all(len(line['grocery_items']) == 3 for line in lines)
+        assert {line['customer_id'] for line in lines} == {example_data.example_customer.id}
+
+    def test_export_is_streamed(self, client):
+        response = client.get(url_for('customer_export', item_id=example_data.example_customer.id))
+        assert response.is_streamed
+
+    def test_export_incorrect_id_results_in_404(self, client):
+        response = client.get(url_for('customer_export', item_id=example_data.example_customer.id + '22'))
+        assert response.status_code == 404
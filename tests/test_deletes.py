@@ -0,0 +1,93 @@
+import pytest
+from flask import url_for
+from sqlalchemy import func, select, update
+
+from app import create_app
+from database import sql_client
+from database.models import Customer, GroceryItem, GroceryList, grocery_list_item_table
+from database.sql_client import db_session
+from tests.example_data import FakeData
+from tests.test_query_counts import QueryCounter
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    app.config['BULK_DELETE_BATCH_SIZE'] = 2
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+def make_customer(list_count, items_per_list, desired_delivery=None):
+    customer = FakeData().example_customer
+    for _ in range(list_count):
+        grocery_list = FakeData().example_grocery_list
+        grocery_list.desired_delivery = desired_delivery or grocery_list.desired_delivery
+        grocery_list.grocery_items = [FakeData().example_grocery_item for _ in range(items_per_list)]
+        customer.grocery_lists.append(grocery_list)
+    db_session.add(customer)
+    db_session.commit()
+    ids = customer.id, [grocery_list.id for grocery_list in customer.grocery_lists]
+    db_session.remove()
+    return ids
+
+
+def links_of(list_ids):
+    return db_session.execute(select(func.count()).select_from(grocery_list_item_table)
+                              .where(grocery_list_item_table.c.grocery_list_id.in_(list_ids))).scalar()
+
+
+def delete_counting_queries(client, endpoint, item_id):
+    with QueryCounter(sql_client.engine) as counter:
+        response = client.delete(url_for(endpoint, item_id=item_id))
+    db_session.remove()
+    return response, counter.count
+
+
+class TestDeletes:
+    def test_customer_delete_removes_lists_and_links_but_not_items(self, client):
+        item_count = GroceryItem.query.count()
+        item_id, list_ids = make_customer(3, 4)
+        response = client.delete(url_for('customer', item_id=item_id))
+        assert response.status_code == 204
+        assert db_session.get(Customer, item_id) is None
+        assert GroceryList.query.filter(GroceryList.id.in_(list_ids)).count() == 0 and links_of(list_ids) == 0
+        assert GroceryItem.query.count() == item_count + 12
+
+    def test_customer_delete_query_count_is_constant(self, client):
+        _, small = delete_counting_queries(client, 'customer', make_customer(1, 1)[0])
+        _, large = delete_counting_queries(client, 'customer', make_customer(12, 8)[0])
+        assert small == large
+
+    def test_list_delete_touches_its_customer(self, client):
+        item_id, list_ids = make_customer(2, 2)
+        etag = client.get(url_for('customer', item_id=item_id)).headers['ETag']
+        assert client.delete(url_for('grocery_list', item_id=list_ids[0])).status_code == 204
+        response = client.get(url_for('customer', item_id=item_id), headers={'If-None-Match': etag})
+        assert response.status_code == 200 and links_of(list_ids[:1]) == 0
+
+    def test_item_delete_removes_its_links(self, client):
+        _, list_ids = make_customer(2, 2)
+        item_id = db_session.execute(select(grocery_list_item_table.c.grocery_item_id)
+                                     .where(grocery_list_item_table.c.grocery_list_id == list_ids[0])).scalar()
+        assert client.delete(url_for('grocery_item', item_id=item_id)).status_code == 204
+        links = db_session.execute(select(func.count()).select_from(grocery_list_item_table)
+                                   .where(grocery_list_item_table.c.grocery_item_id == item_id)).scalar()
+        assert db_session.get(GroceryItem, item_id) is None and links == 0
+        assert links_of(list_ids) == 3
+
+    def test_bulk_delete_removes_matching_lists_in_batches(self, client):
+        item_id, list_ids = make_customer(6, 2, desired_delivery=1000)
+        old_lists, new_lists = list_ids[:5], list_ids[5:]
+        db_session.execute(update(GroceryList.__table__).where(GroceryList.id == new_lists[0])
+                           .values(desired_delivery=3000))
+        db_session.commit()
+        response = client.delete(url_for('grocery_list_bulk', customer_id=item_id, delivery_before=2000))
+        assert response.status_code == 200 and response.json['data'] == {'deleted': 5, 'batches': 3}
+        assert GroceryList.query.filter(GroceryList.id.in_(list_ids)).count() == 1
+        assert links_of(old_lists) == 0 and links_of(new_lists) == 2
+        assert db_session.get(Customer, item_id) is not None
+
+    def test_bulk_delete_needs_a_valid_filter(self, client):
+        assert client.delete(url_for('grocery_list_bulk')).status_code == 400
+        assert client.delete(url_for('grocery_list_bulk', delivery_before='soon')).status_code == 400
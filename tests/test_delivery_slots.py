@@ -0,0 +1,128 @@
+import itertools
+
+import pytest
+from flask import url_for
+from sqlalchemy import select
+
+from app import create_app
+from database.models import GroceryList
+from database.sql_client import db_session
+from rest_api.delivery_slots import DeliverySlotIndex
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+days = itertools.count(50000)
+
+
+def new_window():
+    # A day far in the future no other test schedules anything in.
+    return next(days) * 86400
+
+
+def slots(client, start, end, **args):
+    response = client.get(url_for('grocery_list_slots', **{'from': start, 'to': end}, **args))
+    assert response.status_code == 200
+    return response.get_json()['data']['slots']
+
+
+def post_list(client, delivery):
+    response = client.post(url_for('grocery_list'), json={'desired_delivery': delivery, 'grocery_items': []})
+    return response.get_json()['data'].rsplit(' ', 1)[-1]
+
+
+class TestDeliverySlotIndex:
+    def test_window_groups_deliveries_by_slot(self):
+        index = DeliverySlotIndex(slot_seconds=900)
+        index.load([('a', 9000.0), ('b', 9899.0), ('c', 9900.0), ('d', 10799.0), ('e', 10800.0)])
+        window = index.window(9000, 10800, 900)
+        assert [(slot['start'], slot['grocery_list_ids']) for slot in window] == [(9000, ['a', 'b']),
+                                                                                    (9900, ['c', 'd'])]
+
+    def test_window_edges_inside_a_slot_only_count_what_they_cover(self):
+        index = DeliverySlotIndex(slot_seconds=900)
+        index.load([('a', 9000.0), ('b', 9500.0), ('c', 9800.0)])
+        assert index.window(9400, 9600, 900) == [{'start': 9000, 'end': 9900, 'count': 1, 'grocery_list_ids': ['b']}]
+
+    def test_wider_slots_merge_buckets(self):
+        index = DeliverySlotIndex(slot_seconds=900)
+        index.load([(str(n), 3600.0 + n * 300) for n in range(24)])
+        window = index.window(3600, 10800, 3600, with_ids=False)
+        assert window == [{'start': 3600, 'end': 7200, 'count': 12}, {'start': 7200, 'end': 10800, 'count': 12}]
+
+    def test_set_moves_and_discard_removes(self):
+        index = DeliverySlotIndex(slot_seconds=900)
+        index.load([('a', 100.0), ('b', 100.0), ('c', 100.0)])
+        index.set('b', 1000.0)
+        index.discard('c', 'unknown')
+        index.set('new', 50.0)
+        assert index.window(0, 1800, 900)[0]['grocery_list_ids'] == ['new', 'a']
+        assert index.window(0, 1800, 900)[1]['grocery_list_ids'] == ['b']
+        index.set('a', None)
+        assert len(index) == 2
+
+    def test_updates_before_the_first_load_are_skipped(self):
+        index = DeliverySlotIndex(slot_seconds=900)
+        index.set('a', 100.0)
+        index.load([])
+        assert len(index) == 0
+
+    def test_index_goes_stale_after_max_age(self):
+        now = [0.0]
+        index = DeliverySlotIndex(slot_seconds=900, max_age=60, clock=lambda: now[0])
+        assert index.stale()
+        index.load([])
+        now[0] = 61
+        assert index.stale()
+
+
+class TestDeliverySlotAPI:
+    def test_handlers_keep_the_index_current(self, client):
+        start = new_window()
+        list_id = post_list(client, start + 100)
+        assert slots(client, start, start + 1800)[0]['grocery_list_ids'] == [list_id]
+        client.patch(url_for('grocery_list', item_id=list_id), json={'desired_delivery': start + 1000})
+        window = slots(client, start, start + 1800)
+        assert window[0]['count'] == 0 and window[1]['grocery_list_ids'] == [list_id]
+        client.delete(url_for('grocery_list', item_id=list_id))
+        assert all(slot['count'] == 0 for slot in slots(client, start, start + 1800))
+
+    def test_bulk_writes_and_customer_deletes_update_the_index(self, client):
+        start = new_window()
+        response = client.post(url_for('grocery_list_bulk'), json=[{'desired_delivery': start + n} for n in range(3)])
+        assert response.status_code == 201
+        assert slots(client, start, start + 900)[0]['count'] == 3
+        client.delete(url_for('grocery_list_bulk', delivery_after=start, delivery_before=start + 900))
+        assert slots(client, start, start + 900)[0]['count'] == 0
+
+        customer = FakeData().example_customer.as_dict()
+        customer.update(id=None, grocery_lists=[{'desired_delivery': start + 10}])
+        client.post(url_for('customer'), json={key: value for key, value in customer.items() if value is not None})
+        assert slots(client, start, start + 900)[0]['count'] == 1
+        list_id = slots(client, start, start + 900)[0]['grocery_list_ids'][0]
+        customer_id = db_session.execute(select(GroceryList.customer_id).where(GroceryList.id == list_id)).scalar()
+        db_session.remove()
+        client.delete(url_for('customer', item_id=customer_id))
+        assert slots(client, start, start + 900)[0]['count'] == 0
+
+    def test_counts_only_and_capacity(self, client):
+        start = new_window()
+        post_list(client, start + 5)
+        client.application.config['DELIVERY_SLOT_CAPACITY'] = 4
+        try:
+            window = slots(client, start, start + 1800, slot_seconds=1800, counts_only='true')
+        finally:
+            client.application.config['DELIVERY_SLOT_CAPACITY'] = 0
+        assert window == [{'start': start, 'end': start + 1800, 'count': 1, 'remaining': 7}]
+
+    @pytest.mark.parametrize('args', [{'from': 'soon'}, {'from': 100, 'to': 50}, {'slot_seconds': 600},
+                                      {'from': 0, 'to': 1e9}])
+    def test_bad_windows_result_in_400(self, client, args):
+        assert client.get(url_for('grocery_list_slots', **args)).status_code == 400
@@ -4,7 +4,6 @@ from flask import url_for
 from app import create_app
 from database.models import Customer, GroceryItem, GroceryList
 from database.sql_client import db_session
-from database.sql_client import init_db
 from tests.example_data import FakeData
 
 example_data = FakeData()
@@ -12,7 +11,6 @@ example_data = FakeData()
 
 @pytest.fixture(scope="module", autouse=True)
 def client():
-    init_db()
     app = create_app('test_config.py')
     with app.test_request_context():
         with app.app_context():
@@ -22,13 +20,6 @@ def client():
             db_session.add(example_data.example_grocery_item)
             db_session.commit()
             yield app.test_client()
-            empty_tables = [
-                Customer.__table__.delete(),
-                GroceryList.__table__.delete(),
-                GroceryItem.__table__.delete()]
-            for table in empty_tables:
-                db_session.execute(table)
-            db_session.commit()
 
 
 class TestCustomerAPI:
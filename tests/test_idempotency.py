@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+import uuid
+
+import pytest
+from flask import url_for
+from sqlalchemy import event, func, select
+
+from app import create_app
+from database import sql_client
+from database.idempotency import claim, fingerprint, idempotency_key_table, purge_expired
+from database.models import Customer, GroceryList
+from database.sql_client import db_session
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client(tmp_path_factory):
+    # Concurrent requests need connections of their own.
+    app = create_app(file_database_config(str(tmp_path_factory.mktemp('idempotency'))))
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+def new_key():
+    return str(uuid.uuid4())
+
+
+def customer_payload():
+    customer = FakeData().example_customer.as_dict()
+    customer.update(id=None, grocery_lists=[])
+    return {key: value for key, value in customer.items() if value is not None}
+
+
+def stored(key):
+    row = db_session.execute(select(idempotency_key_table).where(idempotency_key_table.c.key == key)).first()
+    db_session.remove()
+    return row
+
+
+def customers_named(username):
+    count = db_session.execute(select(func.count()).where(Customer.username == username)).scalar()
+    db_session.remove()
+    return count
+
+
+class StatementLog:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _callback(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._callback)
+
+
+class TestIdempotencyKeys:
+    def test_retry_replays_the_stored_response_without_touching_the_models(self, client):
+        key, payload = new_key(), customer_payload()
+        first = client.post(url_for('customer'), json=payload, headers={'Idempotency-Key': key})
+        with StatementLog(sql_client.engine) as log:
+            retry = client.post(url_for('customer'), json=payload, headers={'Idempotency-Key': key})
+        assert first.status_code == retry.status_code == 201
+        assert retry.get_json() == first.get_json()
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first.headers
+        assert customers_named(payload['username']) == 1
+        assert all('customers' not in statement and 'grocery' not in statement for statement in log.statements)
+
+    def test_grocery_list_retries_create_one_list(self, client):
+        key = new_key()
+        payload = {'desired_delivery': time.time(), 'grocery_items': []}
+        responses = [client.post(url_for('grocery_list'), json=payload, headers={'Idempotency-Key': key})
+                     for _ in range(3)]
+        assert {response.get_data() for response in responses} == {responses[0].get_data()}
+        list_id = responses[0].get_json()['data'].rsplit(' ', 1)[-1]
+        assert db_session.get(GroceryList, list_id) is not None
+        db_session.remove()
+
+    def test_requests_without_a_key_are_not_deduplicated(self, client):
+        payload = {'desired_delivery': time.time(), 'grocery_items': []}
+        first = client.post(url_for('grocery_list'), json=payload)
+        second = client.post(url_for('grocery_list'), json=payload)
+        assert first.get_json()['data'] != second.get_json()['data']
+
+    def test_reusing_a_key_with_another_body_results_in_422(self, client):
+        key = new_key()
+        client.post(url_for('customer'), json=customer_payload(), headers={'Idempotency-Key': key})
+        response = client.post(url_for('customer'), json=customer_payload(), headers={'Idempotency-Key': key})
+        assert response.status_code == 422
+
+    def test_retry_while_the_first_request_runs_results_in_409(self, client):
+        key, payload = new_key(), customer_payload()
+        body = json.dumps(payload).encode()
+        claim(key, fingerprint('POST', '/api/customer', body), 60, 60)
+        db_session.remove()
+        response = client.post(url_for('customer'), data=body, headers={'Idempotency-Key': key})
+        assert response.status_code == 409
+        assert response.headers['Retry-After'] == '1'
+        assert customers_named(payload['username']) == 0
+
+    def test_abandoned_and_expired_keys_are_taken_over(self, client):
+        pending, expired = new_key(), new_key()
+        claim(pending, 'other', 60, 60, now=time.time() - 120)
+        claim(expired, 'other', 1, 60, now=time.time() - 10)
+        db_session.remove()
+        for key in (pending, expired):
+            payload = customer_payload()
+            response = client.post(url_for('customer'), json=payload, headers={'Idempotency-Key': key})
+            assert response.status_code == 201
+            assert customers_named(payload['username']) == 1
+
+    def test_concurrent_duplicates_run_the_handler_once(self, client):
+        key, payload = new_key(), customer_payload()
+        app = client.application
+        statuses = []
+
+        def post():
+            with app.test_client() as thread_client:
+                statuses.append(thread_client.post('/api/customer', json=payload,
+                                                   headers={'Idempotency-Key': key}).status_code)
+
+        threads = [threading.Thread(target=post) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert statuses.count(201) >= 1
+        assert set(statuses) <= {201, 409}
+        assert customers_named(payload['username']) == 1
+
+    def test_failed_requests_release_the_key(self, client):
+        key = new_key()
+        payload = dict(customer_payload(), unknown_field=1)
+        response = client.post(url_for('customer'), json=payload, headers={'Idempotency-Key': key})
+        assert response.status_code == 500
+        assert stored(key) is None
+
+    def test_client_errors_are_replayed(self, client):
+        key = new_key()
+        first = client.post(url_for('customer'), json={'grocery_lists': []}, headers={'Idempotency-Key': key})
+        retry = client.post(url_for('customer'), json={'grocery_lists': []}, headers={'Idempotency-Key': key})
+        assert first.status_code == retry.status_code == 404
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+
+    def test_overlong_key_results_in_400(self, client):
+        response = client.post(url_for('customer'), json=customer_payload(), headers={'Idempotency-Key': 'k' * 256})
+        assert response.status_code == 400
+
+    def test_purge_removes_only_expired_keys(self, client):
+        live, expired = new_key(), new_key()
+        claim(live, 'live', 60, 60)
+        claim(expired, 'expired', 1, 60, now=time.time() - 10)
+        assert purge_expired() >= 1
+        db_session.remove()
+        assert stored(live) is not None
+        assert stored(expired) is None
@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.sql_client import db_session
+from rest_api.instrumentation import parameter_shape
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            example_data.example_grocery_list.grocery_items.append(example_data.example_grocery_item)
+            example_data.example_customer.grocery_lists.append(example_data.example_grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+def server_timing(response):
+    return dict(entry.split(';', 1) for entry in response.headers.getlist('Server-Timing'))
+
+
+class TestInstrumentation:
+    def test_response_has_server_timing(self, client):
+        response = client.get(url_for('grocery_list', limit=5))
+        timing = server_timing(response)
+        assert 'db' in timing and 'app' in timing
+        assert 'statements' in timing['db']
+        assert not timing['db'].startswith('dur=0.00;desc="0 ')
+
+    def test_metrics_has_route_histograms(self, client):
+        client.get(url_for('customer', item_id=example_data.example_customer.id))
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        text = response.get_data(as_text=True)
+        assert '# TYPE grocery_http_request_duration_seconds histogram' in text
+        assert 'grocery_http_request_db_statements_count{method="GET",route="/api/customer/<string:item_id>"}' in text
+        assert 'le="+Inf"' in text
+        assert '# TYPE grocery_cache_hits_total counter' in text and '\ngrocery_cache_hits_total ' in text
+        assert '# TYPE grocery_cache_entries gauge' in text
+
+    def test_slow_queries_are_logged_with_parameter_shapes(self, client, caplog):
+        client.application.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+        try:
+            with caplog.at_level(logging.WARNING, logger='grocery.slow_queries'):
+                client.get(url_for('grocery_item', item_id=example_data.example_grocery_item.id),
+                           headers={'If-None-Match': '"stale"'})
+        finally:
+            client.application.config['SLOW_QUERY_THRESHOLD_MS'] = 200
+        messages = [record.getMessage() for record in caplog.records]
+        assert any('SELECT' in message and 'str' in message for message in messages)
+        assert not any(example_data.example_grocery_item.id in message for message in messages)
+
+    def test_parameter_shape_hides_values(self):
+        assert parameter_shape(('secret', 3)) == ['str', 'int']
+        assert parameter_shape([{'id': 'a'}, {'id': 'b'}]) == {'executemany': 2, 'row': {'id': 'str'}}
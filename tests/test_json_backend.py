@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+from flask import jsonify, request
+from flask.json import JSONDecoder, JSONEncoder
+
+from app import create_app
+from rest_api.json_backend import OrjsonDecoder, OrjsonEncoder, json_backend
+from rest_api.utils import verify_and_pull_json
+
+
+@pytest.fixture(scope="module")
+def app():
+    app = create_app('test_config.py')
+    with app.app_context():
+        yield app
+
+
+class CountingDecoder(JSONDecoder):
+    calls = 0
+
+    def decode(self, s, *args):
+        CountingDecoder.calls += 1
+        return super().decode(s, *args)
+
+
+class TestJsonBackend:
+    def test_backend_selection(self):
+        assert json_backend({'JSON_BACKEND': 'stdlib'}) == (JSONEncoder, JSONDecoder)
+        with pytest.raises(ValueError):
+            json_backend({'JSON_BACKEND': 'yaml'})
+
+    def test_orjson_is_used_when_installed(self, app):
+        pytest.importorskip('orjson')
+        assert app.json_encoder is OrjsonEncoder and app.json_decoder is OrjsonDecoder
+
+    def test_jsonify_output_matches_stdlib(self, app):
+        pytest.importorskip('orjson')
+        data = {'b': [1, 2.5, None], 'a': {'nested': 'é'}, 'when': datetime.datetime(2021, 1, 2, 3, 4, 5)}
+        with app.test_request_context():
+            fast = jsonify(data).get_json()
+            app.json_encoder = JSONEncoder
+            try:
+                slow = jsonify(data).get_json()
+            finally:
+                app.json_encoder = OrjsonEncoder
+        assert fast == slow and fast['when'] == 'Sat, 02 Jan 2021 03:04:05 GMT'
+
+    def test_body_is_parsed_once_whatever_the_content_type(self, app):
+        app.json_decoder = CountingDecoder
+        try:
+            with app.test_request_context(data=b'{"name": "milk"}', content_type='text/plain'):
+                status, payload = verify_and_pull_json(request)
+                request.get_json(force=True)
+        finally:
+            app.json_decoder = json_backend(app.config)[1]
+        assert status == 'success' and payload == {'name': 'milk'} and CountingDecoder.calls == 1
+
+    def test_invalid_json_results_in_406(self, app):
+        with app.test_request_context(data=b'{"name": ', content_type='application/json'):
+            status, response = verify_and_pull_json(request)
+        assert status == 'error' and response.status_code == 406
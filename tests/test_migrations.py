@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from database.migrations import head, stamp, upgrade
+from database.search import has_search_index
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE customers (id VARCHAR PRIMARY KEY, username VARCHAR UNIQUE, password VARCHAR NOT NULL, '
+    'email VARCHAR, address VARCHAR, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_lists (id VARCHAR PRIMARY KEY, customer_id VARCHAR REFERENCES customers (id), '
+    'desired_delivery FLOAT, total_price INTEGER, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_items (id VARCHAR PRIMARY KEY, price_per_unit INTEGER, quantity INTEGER, '
+    'name VARCHAR, type VARCHAR, created_at FLOAT, updated_at FLOAT)',
+    'CREATE TABLE grocery_list_item (grocery_list_id VARCHAR REFERENCES grocery_lists (id), '
+    'grocery_item_id VARCHAR REFERENCES grocery_items (id))',
+]
+
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+class TestMigrations:
+    def test_fresh_database_is_stamped_with_head(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.sqlite3'}")
+        assert upgrade(engine) == head()
+        assert 'ix_grocery_lists_customer_id_created_at_id' in index_names(engine, 'grocery_lists')
+
+    def test_legacy_database_is_upgraded(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.sqlite3'}")
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO grocery_lists (id) VALUES ('list')"))
+            connection.execute(text("INSERT INTO grocery_items (id) VALUES ('item')"))
+            for _ in range(2):
+                connection.execute(text("INSERT INTO grocery_list_item VALUES ('list', 'item')"))
+
+        assert upgrade(engine) == head()
+        pk = inspect(engine).get_pk_constraint('grocery_list_item')['constrained_columns']
+        assert pk == ['grocery_list_id', 'grocery_item_id']
+        assert 'ix_grocery_list_item_grocery_item_id' in index_names(engine, 'grocery_list_item')
+        assert 'ix_grocery_items_created_at_id' in index_names(engine, 'grocery_items')
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT COUNT(*) FROM grocery_list_item')).scalar() == 1
+
+    def test_upgrade_is_a_no_op_when_current(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'current.sqlite3'}")
+        upgrade(engine)
+        assert upgrade(engine) == head()
+
+    def test_database_at_head_skips_schema_checks(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'startup.sqlite3'}"
+        upgrade(create_engine(url))
+        engine = create_engine(url)
+        statements = []
+        event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        assert upgrade(engine) == head()
+        assert len(statements) == 2
+        upgrade(engine)
+        assert len(statements) == 2
+
+    def test_tables_added_later_are_created_for_databases_behind_head(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'behind.sqlite3'}")
+        upgrade(engine)
+        with engine.begin() as connection:
+            connection.execute(text('DROP TABLE idempotency_keys'))
+            stamp(connection, 4)
+        assert upgrade(create_engine(engine.url)) == head()
+        assert inspect(engine).has_table('idempotency_keys')
+
+    def test_legacy_totals_are_backfilled(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'totals.sqlite3'}")
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO grocery_lists (id, total_price) VALUES ('list', 1), ('empty', 5)"))
+            connection.execute(text("INSERT INTO grocery_items (id, price_per_unit, quantity) "
+                                    "VALUES ('a', 250, 2), ('b', 100, 3)"))
+            connection.execute(text("INSERT INTO grocery_list_item VALUES ('list', 'a'), ('list', 'b')"))
+
+        upgrade(engine)
+        with engine.connect() as connection:
+            totals = dict(connection.execute(text('SELECT id, total_price FROM grocery_lists')).fetchall())
+        assert totals == {'list': 800, 'empty': 0}
+
+    def test_search_index_is_built_for_existing_items(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'search.sqlite3'}")
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO grocery_items (id, name, type) VALUES ('a', 'Organic Milk', 'dairy')"))
+
+        upgrade(engine)
+        with engine.connect() as connection:
+            if not has_search_index(connection):
+                pytest.skip('SQLite was built without FTS5')
+            match = text("SELECT rowid FROM grocery_items_fts WHERE grocery_items_fts MATCH 'mil*'")
+            assert len(connection.execute(match).fetchall()) == 1
@@ -0,0 +1,71 @@
+import pytest
+from flask import url_for
+
+from app import create_app
+from database import sql_client
+from database.sql_client import db_session
+from rest_api.cache import get_cache
+from tests.example_data import FakeData
+from tests.test_query_counts import QueryCounter
+
+example_data = [FakeData() for _ in range(3)]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    app.config['API_MAX_MULTI_GET_IDS'] = 5
+    with app.test_request_context():
+        with app.app_context():
+            for data in example_data:
+                data.example_grocery_list.grocery_items.append(data.example_grocery_item)
+                data.example_customer.grocery_lists.append(data.example_grocery_list)
+                db_session.add(data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+def item_ids():
+    return [data.example_grocery_item.id for data in example_data]
+
+
+class TestMultiGet:
+    def test_records_follow_the_requested_order(self, client):
+        ids = list(reversed(item_ids()))
+        response = client.get(url_for('grocery_item', ids=','.join(ids)))
+        assert response.status_code == 200
+        assert [record['id'] for record in response.json['data']] == ids and response.json['missing'] == []
+
+    def test_missing_ids_are_reported(self, client):
+        ids = [item_ids()[0], 'missing', item_ids()[0]]
+        response = client.get(url_for('grocery_item', ids=','.join(ids)))
+        assert [record['id'] for record in response.json['data']] == [item_ids()[0]]
+        assert response.json['missing'] == ['missing']
+
+    def test_post_body_with_nested_records(self, client):
+        ids = [data.example_customer.id for data in example_data]
+        response = client.post(url_for('customer_multi_get'), json={'ids': ids})
+        assert [record['id'] for record in response.json['data']] == ids
+        assert response.json['data'][0]['grocery_lists'][0]['grocery_items'][0]['id'] == item_ids()[0]
+
+    def test_uncached_records_are_loaded_with_one_query(self, client):
+        get_cache().clear()
+        ids = [data.example_grocery_list.id for data in example_data]
+        db_session.remove()
+        with QueryCounter(sql_client.engine) as counter:
+            response = client.post(url_for('grocery_list_multi_get'), json={'ids': ids})
+        # One IN query for the lists, one selectinload query for their items.
+        assert len(response.json['data']) == 3 and counter.count == 2
+
+    def test_projection(self, client):
+        response = client.get(url_for('grocery_list', ids=example_data[1].example_grocery_list.id,
+                                      fields='id,grocery_items.name'))
+        assert response.json['data'] == [{'id': example_data[1].example_grocery_list.id,
+                                          'grocery_items': [{'name': example_data[1].example_grocery_item.name}]}]
+
+    def test_invalid_requests_result_in_400(self, client):
+        assert client.get(url_for('grocery_item', ids='')).status_code == 400
+        assert client.get(url_for('grocery_item', ids=','.join(str(n) for n in range(6)))).status_code == 400
+        assert client.post(url_for('grocery_item_multi_get'), json={'ids': 'a'}).status_code == 200
+        assert client.post(url_for('grocery_item_multi_get'), json={'ids': [1]}).status_code == 400
+        assert client.post(url_for('grocery_item_multi_get'), json=['a']).status_code == 400
@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryItem, GroceryList
+from database.sql_client import db_session
+from tests.example_data import FakeData
+
+item_type = f"paged-{uuid.uuid4()}"
+customer_id = str(uuid.uuid4())
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            for index in range(7):
+                item = FakeData().example_grocery_item
+                item.type = item_type
+                item.created_at = 1000 + index // 2
+                db_session.add(item)
+                grocery_list = FakeData().example_grocery_list
+                grocery_list.customer_id = customer_id
+                grocery_list.desired_delivery = 5000 + index
+                db_session.add(grocery_list)
+            db_session.commit()
+            yield app.test_client()
+
+
+def fetch_all_pages(client, endpoint, **args):
+    seen, cursor, pages = [], None, 0
+    while True:
+        if cursor:
+            args['cursor'] = cursor
+        response = client.get(url_for(endpoint, **args))
+        assert response.status_code == 200
+        seen.extend(record['id'] for record in response.json['data'])
+        cursor = response.json['next_cursor']
+        pages += 1
+        if not cursor:
+            return seen, pages
+
+
+class TestCollectionPagination:
+    def test_pages_cover_every_record_once(self, client):
+        seen, pages = fetch_all_pages(client, 'grocery_item', type=item_type, limit=2)
+        expected = [item.id for item in GroceryItem.query.filter(GroceryItem.type == item_type)
+                    .order_by(GroceryItem.created_at, GroceryItem.id)]
+        assert seen == expected and pages == 4
+
+    def test_customer_filter(self, client):
+        seen, _ = fetch_all_pages(client, 'grocery_list', customer_id=customer_id)
+        assert len(seen) == 7
+
+    def test_delivery_window_filter(self, client):
+        seen, _ = fetch_all_pages(client, 'grocery_list', customer_id=customer_id,
+                                  delivery_after=5002, delivery_before=5005)
+        grocery_lists = GroceryList.query.filter(GroceryList.id.in_(seen)).all()
+        assert sorted(g.desired_delivery for g in grocery_lists) == [5002, 5003, 5004]
+
+    def test_page_size_is_capped(self, client):
+        client.application.config['API_MAX_PAGE_SIZE'] = 3
+        try:
+            response = client.get(url_for('grocery_item', type=item_type, limit=100))
+        finally:
+            client.application.config.pop('API_MAX_PAGE_SIZE')
+        assert len(response.json['data']) == 3
+
+    def test_invalid_cursor_results_in_400(self, client):
+        response = client.get(url_for('grocery_item', cursor='not-a-cursor'))
+        assert response.status_code == 400
+
+    def test_invalid_filter_results_in_400(self, client):
+        response = client.get(url_for('grocery_list', delivery_after='soon'))
+        assert response.status_code == 400
+
+    def test_customer_collection_results_in_200(self, client):
+        response = client.get(url_for('customer', limit=1))
+        assert response.status_code == 200
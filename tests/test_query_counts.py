@@ -0,0 +1,105 @@
+import pytest
+from flask import url_for
+from sqlalchemy import event
+
+from app import create_app
+from database import sql_client
+from database.models import Customer, GroceryItem, GroceryList
+from database.sql_client import db_session
+from tests.example_data import FakeData
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            yield app.test_client()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _callback(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._callback)
+
+
+def make_customer(list_count, items_per_list):
+    data = FakeData()
+    customer = data.example_customer
+    for _ in range(list_count):
+        grocery_list = FakeData().example_grocery_list
+        grocery_list.grocery_items = [FakeData().example_grocery_item for _ in range(items_per_list)]
+        customer.grocery_lists.append(grocery_list)
+    db_session.add(customer)
+    db_session.commit()
+    customer_id = customer.id
+    # Start every request from an empty identity map like a fresh request would
+    db_session.remove()
+    return customer_id
+
+
+def count_queries(client, method, endpoint, item_id, **kwargs):
+    with QueryCounter(sql_client.engine) as counter:
+        response = getattr(client, method)(url_for(endpoint, item_id=item_id), **kwargs)
+    db_session.remove()
+    return response, counter.count
+
+
+class TestCustomerQueryCounts:
+    def test_get_query_count_is_constant(self, client):
+        small_response, small = count_queries(client, 'get', 'customer', make_customer(1, 1))
+        large_response, large = count_queries(client, 'get', 'customer', make_customer(12, 8))
+        assert large_response.status_code == 200 and small == large
+
+    def test_patch_query_count_is_constant(self, client):
+        _, small = count_queries(client, 'patch', 'customer', make_customer(1, 1),
+                                 json={"email": FakeData().example_customer.email})
+        _, large = count_queries(client, 'patch', 'customer', make_customer(12, 8),
+                                 json={"email": FakeData().example_customer.email})
+        assert small == large
+
+    def test_delete_removes_customer_and_lists(self, client):
+        customer_id = make_customer(3, 2)
+        response, _ = count_queries(client, 'delete', 'customer', customer_id)
+        assert response.status_code == 204
+        assert Customer.query.filter(Customer.id == customer_id).first() is None
+        assert GroceryList.query.filter(GroceryList.customer_id == customer_id).count() == 0
+
+
+class TestGroceryListQueryCounts:
+    def test_get_query_count_is_constant(self, client):
+        small_list = GroceryList.query.filter(GroceryList.customer_id == make_customer(1, 1)).first().id
+        large_list = GroceryList.query.filter(GroceryList.customer_id == make_customer(1, 40)).first().id
+        db_session.remove()
+        _, small = count_queries(client, 'get', 'grocery_list', small_list)
+        large_response, large = count_queries(client, 'get', 'grocery_list', large_list)
+        assert large_response.status_code == 200 and small == large
+
+    def test_delete_removes_grocery_list(self, client):
+        grocery_list = GroceryList.query.filter(GroceryList.customer_id == make_customer(1, 3)).first().id
+        db_session.remove()
+        response, _ = count_queries(client, 'delete', 'grocery_list', grocery_list)
+        assert response.status_code == 204
+        assert GroceryList.query.filter(GroceryList.id == grocery_list).first() is None
+
+
+class TestGroceryItemQueryCounts:
+    def test_delete_removes_grocery_item(self, client):
+        item = FakeData().example_grocery_item
+        db_session.add(item)
+        db_session.commit()
+        item_id = item.id
+        db_session.remove()
+        response, _ = count_queries(client, 'delete', 'grocery_item', item_id)
+        assert response.status_code == 204
+        assert GroceryItem.query.filter(GroceryItem.id == item_id).first() is None
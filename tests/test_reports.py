@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.sql_client import db_session
+from rest_api.reports import ReportCancelled, ReportJob, get_reports, init_worker, run_report
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+example_data = FakeData()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client(tmp_path_factory):
+    # Worker processes open the database themselves, it has to be a file.
+    directory = str(tmp_path_factory.mktemp('reports'))
+    app = create_app(file_database_config(directory))
+    with app.test_request_context():
+        with app.app_context():
+            for _ in range(3):
+                grocery_list = FakeData().example_grocery_list
+                grocery_list.grocery_items.append(FakeData().example_grocery_item)
+                example_data.example_customer.grocery_lists.append(grocery_list)
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            runner = get_reports()
+            runner.directory, runner.workers = os.path.join(directory, 'results'), 1
+            yield app.test_client()
+            runner.shutdown()
+
+
+def submit(client, kind, **params):
+    response = client.post(url_for('report'), json={'kind': kind, 'params': params})
+    assert response.status_code == 202
+    return response.get_json()['data']['id']
+
+
+def wait_for(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(url_for('report', job_id=job_id)).get_json()['data']
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def result_rows(client, job_id):
+    response = client.get(url_for('report_result', job_id=job_id))
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data().splitlines()]
+
+
+class TestReportJobs:
+    def test_customer_export_runs_in_a_worker(self, client):
+        job_id = submit(client, 'customer_export', customer_id=example_data.example_customer.id, depth=0)
+        job = wait_for(client, job_id)
+        assert job['status'] == 'done' and job['rows'] == 3 and job['progress'] == {'done': 3, 'total': 3}
+        rows = result_rows(client, job_id)
+        assert {row['id'] for row in rows} == {grocery_list.id for grocery_list in
+                                               example_data.example_customer.grocery_lists}
+        assert all(isinstance(item_id, str) for row in rows for item_id in row['grocery_items'])
+
+    def test_aggregate_report_is_filtered(self, client):
+        job_id = submit(client, 'customer_spend', customer_id=example_data.example_customer.id)
+        assert wait_for(client, job_id)['status'] == 'done'
+        [row] = result_rows(client, job_id)
+        assert row['customer_id'] == example_data.example_customer.id and row['grocery_lists'] == 3
+
+    def test_finished_job_is_deleted_with_its_result(self, client):
+        job_id = submit(client, 'revenue_by_type')
+        wait_for(client, job_id)
+        path = get_reports().result_path(get_reports().get(job_id))
+        assert os.path.exists(path)
+        client.delete(url_for('report', job_id=job_id))
+        assert not os.path.exists(path)
+        assert client.get(url_for('report', job_id=job_id)).status_code == 404
+
+    @pytest.mark.parametrize('payload', [{'kind': 'everything'}, {'kind': 'customer_export'},
+                                         {'kind': 'customer_spend', 'params': {'delivery_after': 'soon'}},
+                                         {'kind': 'customer_export', 'params': {'customer_id': 'x', 'depth': -1}}])
+    def test_invalid_jobs_result_in_400(self, client, payload):
+        assert client.post(url_for('report'), json=payload).status_code == 400
+
+    def test_unknown_customer_results_in_404(self, client):
+        response = client.post(url_for('report'), json={'kind': 'customer_export', 'params': {'customer_id': 'x'}})
+        assert response.status_code == 404
+
+    def test_full_queue_results_in_429(self, client):
+        runner = get_reports()
+        job = ReportJob('revenue_by_type', {})
+        job.future = Future()
+        runner.jobs[job.id] = job
+        runner.max_pending = 1
+        try:
+            response = client.post(url_for('report'), json={'kind': 'revenue_by_type'})
+        finally:
+            runner.max_pending = 20
+            runner.jobs.pop(job.id)
+        assert response.status_code == 429 and response.headers['Retry-After']
+
+    def test_result_of_a_pending_job_results_in_409(self, client):
+        runner = get_reports()
+        job = ReportJob('revenue_by_type', {})
+        runner.jobs[job.id] = job
+        try:
+            assert client.get(url_for('report_result', job_id=job.id)).status_code == 409
+        finally:
+            runner.jobs.pop(job.id)
+
+
+class TestRunReport:
+    def test_cancelled_job_stops_and_leaves_no_result(self, client, tmp_path):
+        init_worker(client.application.config)
+        open(tmp_path / 'job.cancel', 'w').close()
+        with pytest.raises(ReportCancelled):
+            run_report('job', 'revenue_by_type', {}, str(tmp_path), 1)
+        assert sorted(os.listdir(tmp_path)) == ['job.cancel']
+
+    def test_progress_is_written_per_batch(self, client, tmp_path):
+        init_worker(client.application.config)
+        rows = run_report('job', 'customer_export', {'customer_id': example_data.example_customer.id},
+                          str(tmp_path), 1)
+        assert rows == 3
+        assert json.loads((tmp_path / 'job.progress').read_text()) == {'done': 3, 'total': 3}
+        assert len((tmp_path / 'job.ndjson').read_text().splitlines()) == 3
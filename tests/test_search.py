@@ -0,0 +1,84 @@
+import random
+import string
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryItem
+from database.search import candidate_statement, query_words, ranked_statement, search_parameters
+from database.sql_client import db_session
+
+# A word no other test writes, so the results only hold this module's items.
+brand = 'q' + ''.join(random.choices(string.ascii_lowercase, k=10))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            for name, item_type in [(f'{brand} Skim Milk Powder', 'pantry'), (f'{brand} Milk', 'dairy'),
+                                    (f'{brand} Oat Milk', 'dairy'), (f'{brand} Millet Bread', 'bakery'),
+                                    (f'{brand} Crème Brûlée', 'frozen')]:
+                db_session.add(GroceryItem(name=name, type=item_type, price_per_unit=100, quantity=1))
+            db_session.commit()
+            yield app.test_client()
+
+
+def search(client, **args):
+    response = client.get(url_for('grocery_item_search', **args))
+    assert response.status_code == 200
+    return [record['name'] for record in response.json['data']], response.json['next_cursor']
+
+
+class TestSearch:
+    def test_prefixes_match_any_word_and_rank_the_start_of_the_name_first(self, client):
+        names, _ = search(client, q=f'{brand} mil')
+        assert names[0] == f'{brand} Milk' and names[1] == f'{brand} Millet Bread'
+        assert set(names[2:]) == {f'{brand} Oat Milk', f'{brand} Skim Milk Powder'}
+
+    def test_diacritics_and_case_are_ignored(self, client):
+        assert search(client, q=f'{brand.upper()} creme brul')[0] == [f'{brand} Crème Brûlée']
+
+    def test_type_matches_and_filters(self, client):
+        assert search(client, q=f'{brand} bak')[0] == [f'{brand} Millet Bread']
+        assert len(search(client, q=brand, type='dairy')[0]) == 2
+
+    def test_pages_follow_the_ranking(self, client):
+        first, cursor = search(client, q=f'{brand} milk', limit=2)
+        second, last = search(client, q=f'{brand} milk', limit=2, cursor=cursor)
+        assert first + second == search(client, q=f'{brand} milk')[0] and last is None
+
+    def test_matches_past_the_candidate_window_are_paged_to(self, client):
+        everything = search(client, q=brand)[0]
+        client.application.config['SEARCH_MAX_CANDIDATES'] = 2
+        try:
+            names, cursor = search(client, q=brand, limit=3)
+            while cursor:
+                page, cursor = search(client, q=brand, limit=3, cursor=cursor)
+                names.extend(page)
+        finally:
+            del client.application.config['SEARCH_MAX_CANDIDATES']
+        assert len(names) == len(everything) == 5 and set(names) == set(everything)
+
+    def test_writes_keep_the_index_in_sync(self, client):
+        response = client.post(url_for('grocery_item'), json={'name': f'{brand} Kefir', 'quantity': 1,
+                                                                 'price_per_unit': 300})
+        item_id = response.json['data'].rsplit(' ', 1)[-1]
+        assert search(client, q=f'{brand} kef')[0] == [f'{brand} Kefir']
+        client.patch(url_for('grocery_item', item_id=item_id), json={'name': f'{brand} Buttermilk'})
+        assert search(client, q=f'{brand} kef')[0] == [] and search(client, q=f'{brand} butter')[0]
+        client.delete(url_for('grocery_item', item_id=item_id))
+        assert search(client, q=f'{brand} butter')[0] == []
+
+    def test_like_fallback_matches_the_same_items(self, client):
+        words = query_words(f'{brand} mil')
+        statement = ranked_statement(candidate_statement(GroceryItem.__table__.c, len(words), False, 100), len(words))
+        names = [row.name for row in db_session.execute(statement, search_parameters(words, 50, 0))]
+        assert names == search(client, q=f'{brand} mil')[0]
+
+    def test_invalid_requests_result_in_400(self, client):
+        assert client.get(url_for('grocery_item_search')).status_code == 400
+        assert client.get(url_for('grocery_item_search', q='milk', cursor='next')).status_code == 400
+        assert client.get(url_for('grocery_item_search', q='milk', fields='colour')).status_code == 400
@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.loaders import load_grocery_list
+from database.models import GroceryItem, GroceryList
+from database.serializers import ProjectionError, serializer_for
+from database.sql_client import db_session
+from rest_api.conditional import record_response
+from tests.example_data import FakeData
+
+example_data = FakeData()
+item_type = f"projected-{uuid.uuid4()}"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            example_data.example_grocery_item.type = item_type
+            example_data.example_grocery_list.grocery_items.append(example_data.example_grocery_item)
+            db_session.add(example_data.example_grocery_list)
+            db_session.commit()
+            yield app.test_client()
+
+
+def legacy_as_dict(record):
+    data = {c.name: getattr(record, c.name) for c in record.__table__.columns}
+    if isinstance(record, GroceryList):
+        data['grocery_items'] = [legacy_as_dict(item) for item in record.grocery_items]
+    return data
+
+
+class TestSerializers:
+    def test_as_dict_matches_column_reflection(self, client):
+        grocery_list = load_grocery_list(example_data.example_grocery_list.id)
+        assert grocery_list.as_dict() == legacy_as_dict(grocery_list)
+        assert list(grocery_list.as_dict()) == list(legacy_as_dict(grocery_list))
+
+    def test_expired_records_are_reloaded(self, client):
+        item = db_session.get(GroceryItem, example_data.example_grocery_item.id)
+        db_session.expire(item)
+        assert item.as_dict()['name'] == example_data.example_grocery_item.name
+
+    def test_fields_follow_the_columns(self):
+        assert serializer_for(GroceryItem).fields == tuple(c.name for c in GroceryItem.__table__.columns)
+        assert serializer_for('grocery_list').fields[-1] == 'grocery_items'
+
+    def test_nested_projection(self, client):
+        plan = serializer_for(GroceryList).plan('id,grocery_items.name')
+        grocery_list = load_grocery_list(example_data.example_grocery_list.id)
+        assert plan.dump(grocery_list) == {'id': grocery_list.id,
+                                           'grocery_items': [{'name': example_data.example_grocery_item.name}]}
+        assert plan.project(grocery_list.as_dict()) == plan.dump(grocery_list)
+
+    def test_unknown_field_is_rejected(self):
+        with pytest.raises(ProjectionError):
+            serializer_for(GroceryItem).plan('id,colour')
+        with pytest.raises(ProjectionError):
+            serializer_for(GroceryItem).plan('name.first')
+
+    def test_collection_projection_reads_core_rows(self, client):
+        response = client.get(url_for('grocery_item', type=item_type, fields='id,name'))
+        assert response.status_code == 200
+        assert response.json['data'] == [{'id': example_data.example_grocery_item.id,
+                                          'name': example_data.example_grocery_item.name}]
+
+    def test_collection_without_fields_is_unchanged(self, client):
+        response = client.get(url_for('grocery_item', type=item_type))
+        assert response.json['data'] == [example_data.example_grocery_item.as_dict()]
+
+    def test_invalid_fields_results_in_400(self, client):
+        assert client.get(url_for('grocery_list', fields='colour')).status_code == 400
+        assert client.get(url_for('grocery_list', item_id=example_data.example_grocery_list.id,
+                                  fields='colour')).status_code == 400
+
+    def test_record_projection_has_its_own_etag(self, client):
+        item_id = example_data.example_grocery_list.id
+        full = client.get(url_for('grocery_list', item_id=item_id))
+        with client.application.test_request_context(query_string={'fields': 'id,total_price'}):
+            response = record_response('grocery_list', GroceryList, load_grocery_list, item_id)
+        total_price = example_data.example_grocery_list.total_price
+        assert response.get_json()['data'] == {'id': item_id, 'total_price': total_price}
+        assert response.headers['Last-Modified'] == full.headers['Last-Modified']
+        assert response.headers['ETag'] != full.headers['ETag']
@@ -0,0 +1,265 @@
+import time
+
+import pytest
+from flask import url_for
+from sqlalchemy import create_engine, select
+
+from app import create_app
+from database.migrations import upgrade
+from database.models import Customer, GroceryItem, GroceryList, generate_uuid, grocery_list_item_table
+from database.rebalance import RebalanceError, rebalance
+from database.sql_client import db_session, each_shard, init_shards, shard_count, shard_for, shard_of, using_shard
+from database.usernames import DEFAULT_CLAIM_TIMEOUT, claim_username, username_table
+from rest_api.reports import init_worker, run_report
+from tests.configs import file_database_config
+from tests.example_data import FakeData
+
+SHARDS = 3
+
+
+def customer_on(shard):
+    # A new customer whose id maps to the given shard.
+    while True:
+        customer = FakeData().example_customer
+        customer.id = generate_uuid()
+        if shard_of(customer.id, SHARDS) == shard:
+            return customer
+
+
+customers = [customer_on(shard) for shard in range(SHARDS)]
+# Per customer, the ids and item names seeded on its shard, read before the
+# commit expires them (a reload outside the shard would not find them).
+seeded = []
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client(tmp_path_factory):
+    app = create_app(file_database_config(str(tmp_path_factory.mktemp('sharding')), shards=SHARDS))
+    with app.test_request_context():
+        with app.app_context():
+            for customer in customers:
+                with using_shard(shard_for(customer.id)):
+                    for _ in range(2):
+                        grocery_list = FakeData().example_grocery_list
+                        grocery_list.grocery_items.append(FakeData().example_grocery_item)
+                        customer.grocery_lists.append(grocery_list)
+                    db_session.add(customer)
+                    db_session.flush()
+                    seeded.append({'id': customer.id, 'lists': [record.id for record in customer.grocery_lists],
+                                   'items': [record.grocery_items[0].id for record in customer.grocery_lists],
+                                   'names': [record.grocery_items[0].name for record in customer.grocery_lists]})
+                    db_session.commit()
+            yield app.test_client()
+    init_shards({})
+
+
+def shards_holding(model, record_id):
+    return [shard for shard in each_shard()
+            if db_session.query(model.id).filter(model.id == record_id).first() is not None]
+
+
+def customer_payload(**fields):
+    payload = FakeData().example_customer.as_dict()
+    payload.pop('id')
+    payload.update(fields)
+    return payload
+
+
+class TestRouting:
+    def test_customers_are_spread_over_the_shards(self, client):
+        assert shard_count() == SHARDS
+        assert [shards_holding(Customer, customer['id']) for customer in seeded] == [[0], [1], [2]]
+
+    def test_new_customer_is_written_with_its_lists_to_its_shard(self, client):
+        grocery_list = FakeData().example_grocery_list.as_dict()
+        grocery_list.pop('id')
+        response = client.post(url_for('customer'), json=customer_payload(grocery_lists=[grocery_list]))
+        customer_id = response.get_json()['data'].rsplit(' ', 1)[1]
+        shard = shard_for(customer_id)
+        assert shards_holding(Customer, customer_id) == [shard]
+        with using_shard(shard):
+            assert GroceryList.query.filter(GroceryList.customer_id == customer_id).count() == 1
+
+    def test_usernames_are_unique_across_shards(self, client):
+        username = generate_uuid()
+        first, second, third = (customer_on(shard).id for shard in range(SHARDS))
+        assert client.post(url_for('customer'), json=customer_payload(id=first, username=username)).status_code == 201
+        assert client.post(url_for('customer'), json=customer_payload(id=second, username=username)).status_code == 409
+        assert client.post(url_for('customer'), json=customer_payload(id=third)).status_code == 201
+        assert client.patch(url_for('customer', item_id=third), json={'username': username}).status_code == 409
+        client.patch(url_for('customer', item_id=first), json={'username': generate_uuid()})
+        assert client.patch(url_for('customer', item_id=third), json={'username': username}).status_code == 204
+        client.delete(url_for('customer', item_id=third))
+        assert client.post(url_for('customer'), json=customer_payload(id=second, username=username)).status_code == 201
+
+    def test_claims_of_customers_never_written_are_taken_over(self, client):
+        username, ghost = generate_uuid(), customer_on(1).id
+        assert claim_username(username, ghost)
+        assert not claim_username(username, customer_on(2).id)
+        assert claim_username(username, customer_on(2).id, now=time.time() + DEFAULT_CLAIM_TIMEOUT + 1)
+
+    def test_records_are_read_from_their_shard(self, client):
+        customer = seeded[2]
+        response = client.get(url_for('customer', item_id=customer['id']))
+        assert response.status_code == 200 and response.get_json()['data']['id'] == customer['id']
+        assert client.get(url_for('grocery_list', item_id=customer['lists'][0])).status_code == 200
+        assert client.get(url_for('grocery_item', item_id=customer['items'][0])).status_code == 200
+
+    def test_list_is_posted_to_its_customers_shard(self, client):
+        response = client.post(url_for('grocery_list'), json={'customer_id': seeded[1]['id'], 'desired_delivery': 1.0,
+                                                              'grocery_items': []})
+        list_id = response.get_json()['data'].rsplit(' ', 1)[1]
+        assert shards_holding(GroceryList, list_id) == [1]
+
+    def test_moving_a_list_to_another_shard_results_in_400(self, client):
+        response = client.patch(url_for('grocery_list', item_id=seeded[1]['lists'][0]),
+                                json={'customer_id': seeded[2]['id']})
+        assert response.status_code == 400
+
+    def test_bulk_lists_are_grouped_by_shard(self, client):
+        payload = [{'customer_id': seeded[shard]['id'], 'desired_delivery': 1.0} for shard in (2, 0, 1, 2)]
+        response = client.post(url_for('grocery_list_bulk'), json=payload)
+        results = response.get_json()['data']
+        assert response.status_code == 201 and [result['index'] for result in results] == [0, 1, 2, 3]
+        assert [shards_holding(GroceryList, result['id']) for result in results] == [[2], [0], [1], [2]]
+
+
+class TestReadsAcrossShards:
+    def test_collection_pages_merge_every_shard(self, client):
+        seen, args = [], {'limit': 2, 'depth': 0}
+        while True:
+            body = client.get(url_for('customer', **args)).get_json()
+            seen.extend(body['data'])
+            if not body.get('next_cursor'):
+                break
+            args['cursor'] = body['next_cursor']
+        ids = [record['id'] for record in seen]
+        assert len(ids) == len(set(ids)) and {customer['id'] for customer in seeded} <= set(ids)
+        assert [record['created_at'] for record in seen] == sorted(record['created_at'] for record in seen)
+
+    def test_multi_get_finds_records_on_every_shard(self, client):
+        ids = [customer['id'] for customer in seeded] + ['missing']
+        body = client.get(url_for('customer', ids=','.join(ids), depth=0)).get_json()
+        assert [record['id'] for record in body['data']] == ids[:-1] and body['missing'] == ['missing']
+
+    def test_customer_spend_combines_every_shard(self, client):
+        rows = client.get(url_for('customer_spend', limit=500)).get_json()['data']
+        assert {customer['id'] for customer in seeded} <= {row['customer_id'] for row in rows}
+        assert [row['total_spend'] for row in rows] == sorted((row['total_spend'] for row in rows), reverse=True)
+
+    def test_revenue_by_type_sums_every_shard(self, client):
+        rows = client.get(url_for('revenue_by_type', limit=500)).get_json()['data']
+        assert sum(row['grocery_lists'] for row in rows) >= 2 * SHARDS
+        assert len({row['type'] for row in rows}) == len(rows)
+
+    def test_search_finds_items_on_every_shard(self, client):
+        names = {customer['names'][0] for customer in seeded}
+        for name in names:
+            data = client.get(url_for('grocery_item_search', q=name, limit=100)).get_json()['data']
+            assert name in {record['name'] for record in data}
+
+    def test_search_pages_through_every_shards_windows(self, client):
+        ids = []
+        for shard in range(SHARDS):
+            with using_shard(shard):
+                rows = [{'id': generate_uuid(), 'name': f'wvy {index}', 'type': 'tea'} for index in range(2)]
+                db_session.execute(GroceryItem.__table__.insert(), rows)
+                db_session.commit()
+                ids.extend(row['id'] for row in rows)
+        client.application.config['SEARCH_MAX_CANDIDATES'] = 1
+        try:
+            seen, args = [], {'q': 'wvy', 'limit': 2}
+            while True:
+                body = client.get(url_for('grocery_item_search', **args)).get_json()
+                seen.extend(record['id'] for record in body['data'])
+                if not body['next_cursor']:
+                    break
+                args['cursor'] = body['next_cursor']
+        finally:
+            client.application.config.pop('SEARCH_MAX_CANDIDATES')
+        assert sorted(seen) == sorted(ids)
+
+    def test_search_merges_items_without_name_or_created_at(self, client):
+        names = [None, 'zqx crate', None]
+        for shard, name in enumerate(names):
+            with using_shard(shard):
+                db_session.execute(GroceryItem.__table__.insert(), [{'id': generate_uuid(), 'name': name,
+                                                                     'type': 'zqx', 'created_at': None}])
+                db_session.commit()
+        response = client.get(url_for('grocery_item_search', q='zqx'))
+        assert response.status_code == 200
+        assert [record['name'] for record in response.get_json()['data']] == ['zqx crate', None, None]
+
+    def test_change_feed_follows_every_shard(self, client):
+        cursor = client.get(url_for('changes', after='latest')).get_json()['cursor']
+        payload = [{'customer_id': seeded[shard]['id'], 'desired_delivery': 1.0} for shard in range(SHARDS)]
+        response = client.post(url_for('grocery_list_bulk'), json=payload)
+        list_ids = [result['id'] for result in response.get_json()['data']]
+        body = client.get(url_for('changes', after=cursor)).get_json()
+        assert sorted(change['id'] for change in body['data']) == sorted(list_ids)
+        assert all(int(after) > int(before) for before, after in zip(cursor.split('.'), body['cursor'].split('.')))
+
+    def test_report_workers_read_every_shard(self, client, tmp_path):
+        init_worker(client.application.config)
+        assert run_report('spend', 'customer_spend', {}, str(tmp_path), 100) >= SHARDS
+        with using_shard(2):
+            lists = GroceryList.query.filter(GroceryList.customer_id == seeded[2]['id']).count()
+        assert run_report('export', 'customer_export', {'customer_id': seeded[2]['id']}, str(tmp_path), 100) == lists
+
+
+def seed(engine, customer_id, **fields):
+    customer = FakeData().example_customer.as_dict()
+    customer.update(id=customer_id, **fields)
+    customer.pop('grocery_lists')
+    list_id, item_id = generate_uuid(), generate_uuid()
+    with engine.begin() as connection:
+        connection.execute(Customer.__table__.insert(), [customer])
+        connection.execute(GroceryList.__table__.insert(), [{'id': list_id, 'customer_id': customer_id}])
+        connection.execute(GroceryItem.__table__.insert(), [{'id': item_id, 'name': 'milk'}])
+        connection.execute(grocery_list_item_table.insert(), [{'grocery_list_id': list_id,
+                                                               'grocery_item_id': item_id}])
+    return list_id, item_id
+
+
+def count(engine, table, column, value):
+    with engine.connect() as connection:
+        return len(connection.execute(select(table).where(column == value)).all())
+
+
+class TestRebalance:
+    @pytest.fixture
+    def engines(self, tmp_path):
+        engines = [create_engine(f"sqlite:///{tmp_path / f'{index}.sqlite3'}") for index in range(3)]
+        for engine in engines:
+            upgrade(engine)
+        yield engines
+        for engine in engines:
+            engine.dispose()
+
+    def test_misplaced_customer_moves_with_its_lists_and_items(self, client, engines):
+        customer_id = generate_uuid()
+        target = shard_of(customer_id, 2)
+        list_id, item_id = seed(engines[1 - target], customer_id)
+        moved = rebalance(engines[:2])
+        assert moved['customers'] == 1 and moved['grocery_lists'] == 1 and moved['grocery_items'] == 1
+        assert count(engines[target], Customer.__table__, Customer.id, customer_id) == 1
+        assert count(engines[target], grocery_list_item_table, grocery_list_item_table.c.grocery_list_id,
+                     list_id) == 1
+        assert count(engines[1 - target], GroceryItem.__table__, GroceryItem.id, item_id) == 0
+        assert rebalance(engines[:2]) == {}
+        assert count(engines[0], username_table, username_table.c.customer_id, customer_id) == 1
+
+    def test_usernames_held_on_two_shards_are_reported(self, client, engines):
+        seed(engines[0], customer_on(0).id, username='twice')
+        seed(engines[1], customer_on(1).id, username='twice')
+        with pytest.raises(RebalanceError):
+            rebalance(engines[:2])
+
+    def test_retired_shard_is_emptied(self, client, engines):
+        customer_id = generate_uuid()
+        seed(engines[2], customer_id)
+        assert rebalance(engines[:2], engines[2:], dry_run=True)['customers'] == 1
+        assert count(engines[2], Customer.__table__, Customer.id, customer_id) == 1
+        rebalance(engines[:2], engines[2:])
+        assert count(engines[2], Customer.__table__, Customer.id, customer_id) == 0
+        assert count(engines[shard_of(customer_id, 2)], Customer.__table__, Customer.id, customer_id) == 1
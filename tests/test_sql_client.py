@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from database.sql_client import create_engine_from_config, engine_options
+
+
+class TestEngineFactory:
+    def test_file_sqlite_uses_queue_pool(self):
+        _, options = engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite:///grocery.sqlite3'})
+        assert options['poolclass'] is QueuePool and options['pool_size'] == 5
+
+    def test_memory_sqlite_uses_static_pool(self):
+        _, options = engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        assert options['poolclass'] is StaticPool and 'pool_size' not in options
+
+    def test_server_database_reads_pool_settings(self):
+        _, options = engine_options({'SQLALCHEMY_DATABASE_URI': 'postgresql://user@localhost/grocery',
+                                     'DATABASE_POOL_SIZE': 20, 'DATABASE_MAX_OVERFLOW': 40})
+        assert options['pool_size'] == 20 and options['max_overflow'] == 40 and options['pool_pre_ping']
+
+    def test_sqlite_pragmas_are_applied_on_connect(self, tmp_path):
+        engine = create_engine_from_config({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'pragmas.sqlite3'}",
+                                            'SQLITE_PRAGMAS': {'journal_mode': 'WAL', 'busy_timeout': 1234}})
+        with engine.connect() as connection:
+            assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 1234
+        engine.dispose()
+
+    def test_engine_is_only_built_on_first_use(self):
+        code = ("import database.sql_client as sql_client; assert 'engine' not in vars(sql_client); "
+                "from app import create_app; app = create_app('test_config.py'); "
+                "assert str(sql_client.engine.url) == 'sqlite://'")
+        subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__)), check=True)
@@ -0,0 +1,105 @@
+import pytest
+from flask import url_for
+
+from app import create_app
+from database.models import GroceryItem, GroceryList, generate_uuid
+from database.sql_client import db_session
+from tests.example_data import FakeData
+
+example_data = FakeData()
+CUSTOMER_ID = example_data.example_customer.id = generate_uuid()
+WINDOW_START = 4102444800
+
+
+@pytest.fixture(scope="module", autouse=True)
+def client():
+    app = create_app('test_config.py')
+    with app.test_request_context():
+        with app.app_context():
+            db_session.add(example_data.example_customer)
+            db_session.commit()
+            yield app.test_client()
+
+
+def item(price_per_unit, quantity, item_type='totals-produce'):
+    return {'name': FakeData().example_grocery_item.name, 'type': item_type, 'price_per_unit': price_per_unit,
+            'quantity': quantity}
+
+
+def create_list(client, *items, desired_delivery=WINDOW_START + 3600):
+    response = client.post(url_for('grocery_list'), json={
+        'customer_id': CUSTOMER_ID, 'desired_delivery': desired_delivery, 'total_price': 1,
+        'grocery_items': list(items)})
+    return response.json['data'].rsplit(' ', 1)[1]
+
+
+def total_of(list_id):
+    db_session.remove()
+    return GroceryList.query.filter(GroceryList.id == list_id).first().total_price
+
+
+def item_ids_of(list_id):
+    db_session.remove()
+    return [g_item.id for g_item in GroceryList.query.filter(GroceryList.id == list_id).first().grocery_items]
+
+
+class TestListTotals:
+    def test_post_computes_total_and_ignores_client_value(self, client):
+        assert total_of(create_list(client, item(250, 2), item(100, 3))) == 800
+
+    def test_patch_adding_and_removing_items_adjusts_total(self, client):
+        list_id = create_list(client, item(250, 2))
+        client.patch(url_for('grocery_list', item_id=list_id), json={'grocery_items': [item(10, 5)]})
+        assert total_of(list_id) == 550
+        removed = item_ids_of(list_id)[0]
+        price = GroceryItem.query.filter(GroceryItem.id == removed).first()
+        expected = 550 - price.price_per_unit * price.quantity
+        client.patch(url_for('grocery_list', item_id=list_id), json={'remove_grocery_items': [removed]})
+        assert total_of(list_id) == expected and removed not in item_ids_of(list_id)
+
+    def test_patch_can_not_set_total(self, client):
+        list_id = create_list(client, item(5, 5))
+        response = client.patch(url_for('grocery_list', item_id=list_id), json={'total_price': 1})
+        assert response.status_code == 404 and total_of(list_id) == 25
+
+    def test_item_patch_and_delete_adjust_total(self, client):
+        list_id = create_list(client, item(100, 1), item(7, 1))
+        item_id = next(g_item for g_item in item_ids_of(list_id)
+                       if GroceryItem.query.filter(GroceryItem.id == g_item).first().price_per_unit == 100)
+        client.patch(url_for('grocery_item', item_id=item_id), json={'quantity': 4})
+        assert total_of(list_id) == 407
+        client.delete(url_for('grocery_item', item_id=item_id))
+        assert total_of(list_id) == 7
+
+    def test_bulk_insert_computes_total(self, client):
+        response = client.post(url_for('grocery_list_bulk'), json=[
+            {'customer_id': CUSTOMER_ID, 'total_price': 1,
+             'grocery_items': [item(3, 3), item(1, 1)]}])
+        assert total_of(response.json['data'][0]['id']) == 10
+
+
+class TestAggregates:
+    def test_customer_spend_sums_totals(self, client):
+        response = client.get(url_for('customer_spend', customer_id=CUSTOMER_ID))
+        db_session.remove()
+        lists = GroceryList.query.filter(GroceryList.customer_id == CUSTOMER_ID).all()
+        assert response.status_code == 200
+        assert response.json['data'] == [{'customer_id': CUSTOMER_ID, 'grocery_lists': len(lists),
+                                          'total_spend': sum(g_list.total_price for g_list in lists)}]
+
+    def test_revenue_by_type_over_delivery_window(self, client):
+        start = WINDOW_START + 10 * 24 * 3600
+        create_list(client, item(2, 10, 'window-a'), item(3, 1, 'window-b'), desired_delivery=start + 60)
+        create_list(client, item(4, 1, 'window-a'), desired_delivery=start + 120)
+        create_list(client, item(1000, 1, 'window-a'), desired_delivery=start + 24 * 3600)
+        response = client.get(url_for('revenue_by_type', customer_id=CUSTOMER_ID, delivery_after=start,
+                                      delivery_before=start + 3600))
+        assert response.status_code == 200
+        assert response.json['data'] == [
+            {'type': 'window-a', 'revenue': 24, 'quantity': 11, 'grocery_lists': 2},
+            {'type': 'window-b', 'revenue': 3, 'quantity': 1, 'grocery_lists': 1},
+        ]
+
+    def test_invalid_window_results_in_400(self, client):
+        response = client.get(url_for('revenue_by_type', delivery_after='tomorrow'))
+        assert response.status_code == 400